@@ -0,0 +1,306 @@
+##########################################################################
+# FIREpyDAQ - Facilitated Interface for Recording Experiments,
+# a python-package for Data Acquisition.
+# Copyright (C) 2024  Dushyant M. Chaudhari
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#########################################################################
+
+"""End-to-end benchmarks of the acquisition and processing pipeline
+using simulated NI input.
+
+For every combination of channel count, sampling rate and duration,
+a new process runs, in order:
+
+- acquisition: `AcquisitionEngine` reading a `SimulatedTask` in real time
+- save: `DataSaver` writing acquired chunks with `StreamingParquetWriter`,
+  concurrently with acquisition
+- scale: `PostProcessData.ScaleData` on the saved data
+- formulae: `PostProcessData.ParseFormulae` on the scaled data
+- dashboard: `PostProcessData.ExtendData` and trace decimation for
+  every chunk, as done by dashboard refreshes
+
+and reports for each stage the sustained throughput (values per second),
+latency percentiles, and errors (for example, samples lost),
+along with the peak memory of the process and the saved file size.
+
+Usage::
+
+    python benchmarks/run_benchmarks.py --channels 8 32 128 \\
+        --rates 1000 10000 --durations 10 --output results.json
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+
+from firepydaq.acquisition.AcquisitionEngine import AcquisitionEngine
+from firepydaq.acquisition.DataSaver import DataSaver
+from firepydaq.api.EchoNIDAQTask import CreateDAQTask
+from firepydaq.api.SimulatedNIDAQ import SimulatedTask
+from firepydaq.utilities.DataWriter import (StreamingParquetWriter,
+                                            chunks_dataframe)
+from firepydaq.utilities.Decimation import decimate, points_for_width
+from firepydaq.utilities.PostProcessing import PostProcessData
+from firepydaq.utilities.RingBuffer import RingBuffer
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+dt_format = "%Y-%m-%d %H:%M:%S:%f"
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, if available."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kB on Linux
+    return max_rss/2**20 if sys.platform == "darwin" else max_rss/2**10
+
+
+def stage_report(latencies, values, elapsed, **extra):
+    """Throughput and latency percentiles of a stage."""
+    latencies = np.asarray(latencies)*1000
+    report = {"calls": len(latencies),
+              "values": int(values),
+              "elapsed_s": elapsed,
+              "throughput_values_per_s": values/elapsed if elapsed > 0 else None}  # noqa E501
+    for p in [50, 90, 99]:
+        report["latency_ms_p" + str(p)] = float(np.percentile(latencies, p)) if len(latencies) else None  # noqa E501
+    report["latency_ms_max"] = float(latencies.max()) if len(latencies) else None  # noqa E501
+    report.update(extra)
+    return report
+
+
+def timed(function, latencies):
+    """Wraps `function` to append its duration to `latencies`.
+    Calls returning `None`, such as polls of the engine
+    when no chunk is available, are not counted.
+    """
+    def wrapper(*args, **kwargs):
+        t_start = time.perf_counter()
+        result = function(*args, **kwargs)
+        if result is not None:
+            latencies.append(time.perf_counter() - t_start)
+        return result
+    return wrapper
+
+
+def write_config(path, n_channels):
+    """Writes a config file with `n_channels` simulated AI channels.
+    Every fourth channel is a thermocouple, others are voltages.
+    """
+    rows = []
+    for i in range(n_channels):
+        tc = i % 4 == 0
+        rows.append({"#": i, "Panel": 1, "Device": "SimDev" + str(i//32),
+                     "Channel": "ai" + str(i % 32),
+                     "ScaleMax": 1 if tc else 100, "ScaleMin": 0,
+                     "Label": "Ch" + str(i),
+                     "Type": "Thermocouple" if tc else "Voltage",
+                     "Chart": "Chart" + str(i//4),
+                     "AIRangeMin": 0, "AIRangeMax": 1 if tc else 5,
+                     "Layout": 4, "Position": i % 4 + 1,
+                     "Processed_Unit": "C" if tc else "V",
+                     "Legend": "Ch" + str(i), "TCType": "K" if tc else "NA"})
+    pl.DataFrame(rows).write_csv(path)
+
+
+def write_formulae(path, n_channels):
+    """Writes a formulae file with one formula per voltage channel,
+    a baseline and a formula using it.
+    """
+    rows = [{"Label": "Base", "RHS": "mean(Ch1[:min(100,len(Ch1))])",
+             "Chart": "Intermediate"},
+            {"Label": "Delta", "RHS": "Ch1 - Base", "Chart": "Delta"}]
+    for i in range(n_channels):
+        if i % 4 != 0:
+            rows.append({"Label": "F" + str(i),
+                         "RHS": "sqrt(abs(Ch" + str(i) + "))*2 + 1",
+                         "Chart": "Formulae"})
+    for row in rows:
+        row.update({"Legend": row["Label"], "Layout": 1, "Position": 1,
+                    "Processed_Unit": "-"})
+    pl.DataFrame(rows).write_csv(path)
+
+
+def run_case(n_channels, rate, duration, read_interval, workdir):
+    """Runs all stages for one combination and returns the report."""
+    configpath = os.path.join(workdir, "config.csv")
+    formulaepath = os.path.join(workdir, "formulae.csv")
+    parquet_file = os.path.join(workdir, "Benchmark.parquet")
+    write_config(configpath, n_channels)
+    write_formulae(formulaepath, n_channels)
+    report = {"channels": n_channels, "rate_hz": rate,
+              "duration_s": duration, "read_interval_s": read_interval,
+              "stages": {}}
+
+    # Acquisition and saving
+    samples_per_read = max(int(rate*read_interval), 1)
+    daq = CreateDAQTask(None, "Benchmark", SimulatedTask)
+    daq.CreateFromConfig(configpath)
+    daq.StartAIContinuousTask(rate, samples_per_read)
+    capacity = max(int(rate*60), samples_per_read)
+    engine = AcquisitionEngine(daq, RingBuffer(n_channels, capacity),
+                               RingBuffer(1, capacity))
+    read_latencies = []
+    engine.read_chunk = timed(engine.read_chunk, read_latencies)
+
+    schema = {"AbsoluteTime": pl.String, "Time": pl.Float32}
+    schema.update({label: pl.Float32 for label in daq.ailabel_map})
+    writer = StreamingParquetWriter(parquet_file, schema)
+    save_latencies = []
+    saved_rows = []
+
+    def write_batch(chunks):
+        df = chunks_dataframe(chunks, schema, dt_format)
+        writer.write(df)
+        saved_rows.append(df.height)
+        return df.height
+
+    save_queue = engine.add_consumer("save", maxsize=50, drop_oldest=False)
+    saver = DataSaver(save_queue, timed(write_batch, save_latencies),
+                      report_interval=duration + 60)
+    saver.start()
+    t_start = time.perf_counter()
+    engine.start()
+    time.sleep(duration)
+    engine.stop(timeout=10)
+    acquisition_elapsed = time.perf_counter() - t_start
+    backlog = daq.aitask.in_stream.avail_samp_per_chan
+    engine.remove_consumer("save")
+    saver.stop()
+    save_elapsed = time.perf_counter() - t_start
+    writer.close()
+    daq.aitask.close()
+
+    samples_read = engine.xdata.total_samples
+    warnings = []
+    while not engine.events.empty():
+        warnings.append(engine.events.get_nowait()[1])
+    report["stages"]["acquisition"] = stage_report(
+        read_latencies, samples_read*n_channels, acquisition_elapsed,
+        samples_per_chan=samples_read,
+        expected_samples_per_chan=int(rate*acquisition_elapsed),
+        samples_backlog=backlog, error=engine.error,
+        warnings=len(warnings))
+    report["stages"]["save"] = stage_report(
+        save_latencies, sum(saved_rows)*(n_channels + 2), save_elapsed,
+        rows=sum(saved_rows), max_queue_depth=saver.max_depth,
+        file_size_bytes=os.path.getsize(parquet_file))
+
+    # Post processing stages on the saved data
+    processed = PostProcessData(datapath=parquet_file, configpath=configpath,
+                                formulaepath=formulaepath)
+    n_values = sum(saved_rows)*n_channels
+    latencies = []
+    for i in range(5):
+        t_call = time.perf_counter()
+        processed.ScaleData()
+        latencies.append(time.perf_counter() - t_call)
+    report["stages"]["scale"] = stage_report(latencies, 5*n_values, sum(latencies))  # noqa E501
+
+    latencies = []
+    scaled = processed.df_processed
+    for i in range(5):
+        processed.df_processed = scaled
+        t_call = time.perf_counter()
+        processed.ParseFormulae()
+        latencies.append(time.perf_counter() - t_call)
+    report["stages"]["formulae"] = stage_report(
+        latencies, 5*n_values, sum(latencies),
+        errors=len(processed.Errors))
+
+    # Dashboard refreshes while data is appended chunk by chunk
+    live_file = os.path.join(workdir, "Live.parquet")
+    live_writer = StreamingParquetWriter(live_file, schema)
+    data = pl.read_parquet(parquet_file)
+    n_out = points_for_width(1000)
+    latencies = []
+    for start in range(0, data.height, samples_per_read):
+        live_writer.write(data[start:start + samples_per_read])
+        if start == 0:
+            live = PostProcessData(datapath=live_file, configpath=configpath,
+                                   formulaepath=formulaepath)
+        t_call = time.perf_counter()
+        live.ExtendData(dump_output=False)
+        time_data = live.df_processed["Time"].to_numpy()
+        for label in daq.ailabel_map:
+            decimate(time_data, live.df_processed[label].to_numpy(), n_out)
+        latencies.append(time.perf_counter() - t_call)
+    live_writer.close()
+    report["stages"]["dashboard"] = stage_report(latencies, n_values, sum(latencies))  # noqa E501
+
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def _run_case(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        return run_case(*args, workdir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FIREpyDAQ pipeline benchmarks with simulated NI input.")  # noqa E501
+    parser.add_argument("--channels", type=int, nargs="+", default=[8, 32, 128])  # noqa E501
+    parser.add_argument("--rates", type=float, nargs="+", default=[100, 1000, 10000])  # noqa E501
+    parser.add_argument("--durations", type=float, nargs="+", default=[10])
+    parser.add_argument("--read-interval", type=float, default=0.1,
+                        help="Seconds of samples read at a time. Default: 0.1")  # noqa E501
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="Path of the JSON report.")
+    args = parser.parse_args(argv)
+
+    import firepydaq
+    results = {"firepydaq_version": firepydaq.__version__,
+               "python": platform.python_version(),
+               "platform": platform.platform(),
+               "processor": platform.processor(),
+               "cpu_count": os.cpu_count(),
+               "date": datetime.now().isoformat(),
+               "results": []}
+    # Each case runs in a new process, so that peak memory is per case
+    context = mp.get_context("spawn")
+    for n_channels in args.channels:
+        for rate in args.rates:
+            for duration in args.durations:
+                case = (n_channels, rate, duration, args.read_interval)
+                print("Running", n_channels, "channels at", rate, "Hz for", duration, "s")  # noqa E501
+                with context.Pool(1) as pool:
+                    report = pool.apply(_run_case, (case,))
+                results["results"].append(report)
+                acq = report["stages"]["acquisition"]
+                print("  acquired", acq["samples_per_chan"], "/", acq["expected_samples_per_chan"],  # noqa E501
+                      "samples per channel, error:", acq["error"])
+                with open(args.output, "w") as f:
+                    json.dump(results, f, indent=2)
+    print("Results saved in", args.output)
+    return results
+
+
+if __name__ == "__main__":
+    main()
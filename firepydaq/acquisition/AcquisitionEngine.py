@@ -0,0 +1,325 @@
+##########################################################################
+# FIREpyDAQ - Facilitated Interface for Recording Experiments,
+# a python-package for Data Acquisition.
+# Copyright (C) 2024  Dushyant M. Chaudhari
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#########################################################################
+
+import sys
+import time
+import queue
+import threading
+import traceback
+from datetime import datetime
+
+import numpy as np
+
+from ..utilities.DataWriter import absolute_timestamps
+from ..utilities.StageTimer import StageTimer
+
+engine_stages = ["DAQ read", "Alicat poll", "Buffer append", "Stage write", "Queue put"]  # noqa E501
+""" list
+    Stages of `AcquisitionEngine.read_chunk` recorded in its `timings`.
+"""
+
+
+class AcquisitionEngine():
+    """Long-lived acquisition loop that reads NI data in its own thread.
+
+    The engine owns all reads from the `CreateDAQTask` object.
+    Every chunk read is appended to the live history buffers
+    and pushed into the bounded queue of every registered consumer
+    (for example, plotting and saving).
+    Consumers run in their own threads or timers,
+    so a slow consumer never delays reading from the DAQ buffer.
+
+    A chunk is a dict of the form
+
+    {
+        'Time': numpy array of relative times (s),
+        'AbsoluteTime': numpy datetime64[ns] array of absolute times,
+        'Data': numpy array of shape (AI channels, samples),
+        'MFC': dict mapping MFC names to their latest readings
+    }
+
+    Parameters
+    ----------
+        daq_device: CreateDAQTask
+            Started NI task.
+        ydata: RingBuffer
+            Live history buffer for NI data.
+        xdata: RingBuffer
+            Live history buffer for relative times.
+        mfcs: dict, optional
+            User-added Alicat MFCs, polled once for every chunk
+            if `alicat_poller` is not given.
+        poll_interval: float, optional
+            Seconds to wait before checking again when a
+            full chunk is not yet available. Default: 0.005
+        timings: StageTimer, optional
+            Timer in which the duration of every stage of a read is
+            recorded. Default: a new `StageTimer` of `engine_stages`.
+        alicat_poller: AlicatPoller, optional
+            Poller reading Alicat devices concurrently on its own loop.
+            If given, every chunk gets the latest snapshot of readings,
+            without waiting for any device.
+
+    Attributes
+    ----------
+        lock: threading.RLock
+            Lock held while the history buffers are updated.
+            Hold it while reading views of `ydata` or `xdata`.
+        events: queue.Queue
+            (type, text) notifications for the user interface.
+            `type` is one of the `NotificationPanel` message types.
+        error: str
+            Error that stopped the engine, if any.
+        staging: StagingWriter
+            If set, see `set_staging()`, every chunk is staged
+            in this memory-mapped file before it is pushed to consumers.
+        timings: StageTimer
+            Durations of `engine_stages` for every chunk,
+            and the gauges "Samples backlog", samples per channel
+            left in the NI buffer after a read, and "Cycles behind",
+            the number of full chunks among them.
+    """
+    def __init__(self, daq_device, ydata, xdata, mfcs=None, poll_interval=0.005, timings=None, alicat_poller=None):  # noqa E501
+        self.daq_device = daq_device
+        self.ydata = ydata
+        self.xdata = xdata
+        self.mfcs = mfcs if mfcs is not None else {}
+        self.alicat_poller = alicat_poller
+        self.poll_interval = poll_interval
+        self.ao_outputs = [0 for i in range(daq_device.ao_counter)]
+
+        self.lock = threading.RLock()
+        self.events = queue.Queue()
+        self.consumers = {}
+        # Chunks whose publishing started and ended, so that removing
+        # a consumer waits for chunks already taken for it.
+        self._published = threading.Condition()
+        self._publishes_started = 0
+        self._publishes_done = 0
+        self.staging = None
+        self.error = None
+        self.timings = timings if timings is not None else StageTimer(engine_stages)  # noqa E501
+        self.running = False
+        self._thread = None
+
+    def add_consumer(self, name, maxsize=10, drop_oldest=True):
+        """Method to register a consumer of acquired chunks.
+
+        Parameters
+        ----------
+            name: str
+                Name of the consumer. Example "display" or "save".
+            maxsize: int, optional
+                Maximum chunks held for the consumer. Default: 10
+            drop_oldest: bool, optional
+                Default: True
+
+                `True`: When the queue is full, the oldest chunk is
+                discarded. Use for consumers that only need recent data,
+                such as plots.
+
+                `False`: The engine waits up to one second for space
+                in the queue, and warns about data loss if there is none.
+
+        Returns
+        -------
+            queue.Queue from which the consumer gets chunks.
+        """
+        with self.lock:
+            consumer_queue = queue.Queue(maxsize=maxsize)
+            self.consumers[name] = (consumer_queue, drop_oldest)
+        return consumer_queue
+
+    def remove_consumer(self, name, timeout=2):
+        """Method to stop pushing chunks to a consumer.
+
+        Waits, up to `timeout` seconds, until chunks published
+        to the consumer before its removal are in its queue,
+        so that a consumer stopping once its queue is empty
+        does not miss the last chunk.
+        """
+        with self.lock:
+            self.consumers.pop(name, None)
+            started = self._publishes_started
+        if self._thread is threading.current_thread():
+            return
+        with self._published:
+            self._published.wait_for(lambda: self._publishes_done >= started, timeout)  # noqa E501
+
+    def set_staging(self, staging):
+        """Method to start, or stop with `None`, staging every chunk
+        in a `StagingFile.StagingWriter`.
+
+        Staging a chunk is a copy into a memory-mapped file,
+        so saved data is not held only in consumer queues,
+        and survives a crash of the program.
+        """
+        with self.lock:
+            self.staging = staging
+
+    def reset(self):
+        """Method to empty the history buffers.
+        Relative time of the next chunk restarts from zero.
+        """
+        with self.lock:
+            self.ydata.reset()
+            self.xdata.reset()
+
+    def start(self):
+        """Method to start the acquisition thread.
+        """
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="AcquisitionEngine", daemon=True)  # noqa E501
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        """Method to stop the acquisition thread and wait for it to end.
+        """
+        self.running = False
+        if self._thread is not None and self._thread is not threading.current_thread():  # noqa E501
+            self._thread.join(timeout)
+
+    def is_alive(self):
+        """Method that returns `True` while the acquisition thread runs.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def notify(self, text, type="default"):
+        """Method to post a notification for the user interface.
+        """
+        self.events.put((type, text))
+
+    def _run(self):
+        while self.running:
+            try:
+                chunk = self.read_chunk()
+            except Exception:
+                the_type, the_value, the_traceback = sys.exc_info()
+                self.error = str(the_type) + str(the_value)
+                self.notify(self.error, "error")
+                traceback.print_tb(the_traceback)
+                self.running = False
+                break
+            if chunk is None:
+                time.sleep(self.poll_interval)
+
+    def read_chunk(self):
+        """Method that reads one chunk if it is available,
+        updates history buffers, and publishes it to consumers.
+
+        Returns
+        -------
+            The chunk dict, or `None` if a full chunk
+            was not available yet.
+        """
+        daq = self.daq_device
+        no_samples = daq.numberOfSamples
+        samplesAvailable = daq.aitask._in_stream.avail_samp_per_chan
+        if samplesAvailable < no_samples:
+            return None
+        ActualSamplingRate = daq.aitask.timing.samp_clk_rate
+        timings = self.timings
+        samples_behind = samplesAvailable - no_samples
+        timings.set_gauge("Samples backlog", samples_behind)
+        timings.set_gauge("Cycles behind", samples_behind//no_samples)
+
+        t_bef_poll = time.perf_counter()
+        if self.alicat_poller is not None:
+            mfc_data = self.alicat_poller.snapshot
+        else:
+            mfc_data = {}
+            for mfcname, al_mfc in self.mfcs.items():
+                mfc_data[mfcname] = al_mfc.GetFlows()
+        if self.mfcs or self.alicat_poller is not None:
+            timings.record("Alicat poll", time.perf_counter() - t_bef_poll)
+
+        t_bef_read = time.perf_counter()
+        ydata_new = np.asarray(daq.threadaitask())
+        if daq.ao_counter > 0:
+            # AO_outputs will need user iniput.
+            # Currently only float values are accepted.
+            daq.threadaotask(self.ao_outputs)
+        t_aft_read = time.perf_counter()
+        t_now = datetime.now()
+        timings.record("DAQ read", t_aft_read - t_bef_read)
+
+        if (t_aft_read-t_bef_read) > 1/ActualSamplingRate:
+            # Read time exceeds prescribed 1/(sampling frequency)
+            self.notify("Data Loss WARNING: Time to read exceeds number of samples per seconds prescribed for acquisition.", "warning")  # noqa: E501
+
+        t_diff = no_samples/ActualSamplingRate
+        tdiff_array = np.linspace(1/ActualSamplingRate, t_diff, no_samples)
+        with self.lock:
+            t_bef_append = time.perf_counter()
+            self.ydata.append(ydata_new)
+            if self.xdata.size == 0:
+                xdata_new = np.linspace(0, t_diff, no_samples, endpoint=False)  # noqa: E501
+            else:
+                t_last = self.xdata.last()[0]
+                xdata_new = np.linspace(t_last+1/ActualSamplingRate, t_last+t_diff, no_samples)  # noqa: E501
+            self.xdata.append(xdata_new)
+            # The read buffer is reused by the next read, while
+            # consumers like saving keep chunks for longer.
+            chunk = {"Time": xdata_new,
+                     "AbsoluteTime": absolute_timestamps(t_now, tdiff_array),  # noqa: E501
+                     "Data": ydata_new.copy(),
+                     "MFC": mfc_data}
+            t_bef_stage = time.perf_counter()
+            timings.record("Buffer append", t_bef_stage - t_bef_append)
+            if self.staging is not None:
+                self.staging.append(chunk)
+            t_bef_put = time.perf_counter()
+            if self.staging is not None:
+                timings.record("Stage write", t_bef_put - t_bef_stage)
+            # Consumers registered when the chunk was appended.
+            # Chunks are put after the lock is released, so that
+            # a full queue does not block threads waiting for the lock.
+            consumers = list(self.consumers.items())
+            self._publishes_started += 1
+        try:
+            self._publish(chunk, consumers)
+        finally:
+            with self._published:
+                self._publishes_done += 1
+                self._published.notify_all()
+
+        t_aft_save = time.perf_counter()
+        timings.record("Queue put", t_aft_save - t_bef_put)
+        if (t_aft_save - t_bef_read) > 1/ActualSamplingRate:
+            # Time between read and handing over to consumers
+            # exceeds prescribed 1/(sampling frequency)
+            self.notify("Data Loss WARNING: Time to save exceeds number of samples per seconds prescribed for acquisition.", "warning")  # noqa: E501
+        return chunk
+
+    def _publish(self, chunk, consumers):
+        for name, (consumer_queue, drop_oldest) in consumers:
+            try:
+                consumer_queue.put_nowait(chunk)
+            except queue.Full:
+                if drop_oldest:
+                    try:
+                        consumer_queue.get_nowait()
+                    except queue.Empty:
+                        pass
+                    consumer_queue.put_nowait(chunk)
+                    continue
+                try:
+                    consumer_queue.put(chunk, timeout=1)
+                except queue.Full:
+                    self.notify("Data Loss WARNING: " + name + " queue is full. Chunk at " + str(round(chunk["Time"][0], 2)) + " s dropped.", "warning")  # noqa: E501
@@ -0,0 +1,231 @@
+##########################################################################
+# FIREpyDAQ - Facilitated Interface for Recording Experiments,
+# a python-package for Data Acquisition.
+# Copyright (C) 2024  Dushyant M. Chaudhari
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#########################################################################
+
+import sys
+import time
+import queue
+import threading
+import traceback
+
+from ..utilities.ErrorUtils import firepydaq_logger
+from ..utilities.StagingFile import StagingReader
+
+
+class DataSaver():
+    """Single long-lived thread that saves acquired chunks in order.
+
+    Chunks are taken from a bounded queue filled by `AcquisitionEngine`.
+    When the saver falls behind, all queued chunks (up to `max_batch`)
+    are passed to `write_batch` at once, so a slow disk is hit
+    with fewer, larger writes. If the queue is full, the engine waits
+    for space (backpressure) instead of growing memory without limit.
+
+    Queue depth and write latency are reported every
+    `report_interval` seconds to `events` and to the log.
+
+    Parameters
+    ----------
+        chunk_queue: queue.Queue
+            Bounded queue from which chunks are saved.
+        write_batch: callable
+            Function that saves a list of chunks, in acquisition order.
+        events: queue.Queue, optional
+            (type, text) notifications for the user interface.
+        max_batch: int, optional
+            Maximum chunks saved in a single write. Default: 20
+        report_interval: float, optional
+            Seconds between two reports of saving metrics. Default: 5
+
+    Attributes
+    ----------
+        chunks_saved: int
+            Number of chunks saved so far.
+        batches_saved: int
+            Number of writes done so far.
+        max_depth: int
+            Largest queue depth seen since the last report.
+        last_latency: float
+            Duration of the last write (s).
+        max_latency: float
+            Longest write duration since the last report (s).
+    """
+    def __init__(self, chunk_queue, write_batch, events=None, max_batch=20, report_interval=5):  # noqa E501
+        self.chunk_queue = chunk_queue
+        self.write_batch = write_batch
+        self.events = events if events is not None else queue.Queue()
+        self.max_batch = max(int(max_batch), 1)
+        self.report_interval = report_interval
+
+        self.chunks_saved = 0
+        self.batches_saved = 0
+        self.max_depth = 0
+        self.last_latency = 0.
+        self.max_latency = 0.
+        self.saving = False
+        self._thread = None
+        self._last_report = time.time()
+
+    def start(self):
+        """Method to start the saving thread.
+        """
+        self.saving = True
+        self._thread = threading.Thread(target=self._run, name="DataSaver", daemon=True)  # noqa E501
+        self._thread.start()
+
+    def stop(self):
+        """Method to stop saving.
+
+        Waits until all queued chunks are saved.
+        """
+        self.saving = False
+        if self._thread is not None:
+            self._thread.join()
+        self.report()
+
+    def is_alive(self):
+        """Method that returns `True` while the saving thread runs.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def next_batch(self, timeout=0.5):
+        """Method that returns the chunks to be saved in the next write.
+
+        Waits up to `timeout` seconds for a chunk, then takes
+        all other queued chunks, up to `max_batch`.
+        """
+        try:
+            chunks = [self.chunk_queue.get(block=True, timeout=timeout)]
+        except queue.Empty:
+            return []
+        self.max_depth = max(self.max_depth, self.chunk_queue.qsize() + 1)
+        while len(chunks) < self.max_batch:
+            try:
+                chunks.append(self.chunk_queue.get_nowait())
+            except queue.Empty:
+                break
+        return chunks
+
+    def pending(self):
+        """Method that returns `True` if chunks are waiting to be saved.
+        """
+        return not self.chunk_queue.empty()
+
+    def save_batch(self, chunks):
+        """Method that saves a list of chunks and records the write latency.
+        """
+        t_bef_write = time.time()
+        self.write_batch(chunks)
+        self.last_latency = time.time() - t_bef_write
+        self.max_latency = max(self.max_latency, self.last_latency)
+        self.chunks_saved += len(chunks)
+        self.batches_saved += 1
+
+    def report(self):
+        """Method to report queue depth and write latency.
+
+        A warning is posted if the queue was more than half full.
+        """
+        maxsize = self.chunk_queue.maxsize
+        text = ("Saving: " + str(self.chunks_saved) + " chunks in " +
+                str(self.batches_saved) + " writes, queue depth max " +
+                str(self.max_depth) + "/" + str(maxsize if maxsize > 0 else "inf") +  # noqa E501
+                ", write latency last " + str(round(self.last_latency*1000, 1)) +  # noqa E501
+                " ms, max " + str(round(self.max_latency*1000, 1)) + " ms")
+        if maxsize > 0 and self.max_depth > maxsize/2:
+            self.events.put(("warning", text + ".\nSaving is falling behind acquisition."))  # noqa E501
+            firepydaq_logger.warning(text)
+        else:
+            self.events.put(("default", text))
+            firepydaq_logger.info(text)
+        self.max_depth = 0
+        self.max_latency = 0.
+        self._last_report = time.time()
+
+    def _run(self):
+        while self.saving or self.pending():
+            chunks = self.next_batch()
+            if chunks:
+                try:
+                    self.save_batch(chunks)
+                except Exception:
+                    the_type, the_value, the_traceback = sys.exc_info()
+                    self.events.put(("error", str(the_type) + str(the_value)))  # noqa E501
+                    self.events.put(("error", "Error during saving operation"))  # noqa E501
+                    firepydaq_logger.error("Error during saving operation: " + str(the_value))  # noqa E501
+                    traceback.print_tb(the_traceback)
+            if time.time() - self._last_report > self.report_interval:
+                self.report()
+
+
+class StagingCompactor(DataSaver):
+    """Single long-lived thread that saves the chunks staged
+    in a staging file, see `StagingFile.StagingWriter`.
+
+    Works like `DataSaver`, except that chunks are read from the
+    staging file instead of a queue: the acquisition thread only
+    copies chunks into the memory-mapped file, and encoding them,
+    for example to Parquet, happens here.
+    After every write, staged chunks are synced to disk,
+    so that they survive a power cut.
+
+    Parameters
+    ----------
+        staging_file: str
+            Path of the staging file.
+        write_batch: callable
+            Function that saves a list of chunks, in acquisition order.
+        events: queue.Queue, optional
+            (type, text) notifications for the user interface.
+        max_batch: int, optional
+            Maximum chunks saved in a single write. Default: 20
+        report_interval: float, optional
+            Seconds between two reports of saving metrics. Default: 5
+    """
+    def __init__(self, staging_file, write_batch, events=None, max_batch=20, report_interval=5):  # noqa E501
+        super().__init__(queue.Queue(), write_batch, events, max_batch, report_interval)  # noqa E501
+        self.reader = StagingReader(staging_file)
+
+    def stop(self):
+        """Method to stop saving.
+
+        Waits until all staged chunks are saved.
+        """
+        super().stop()
+        self.reader.close()
+
+    def pending(self):
+        return self.reader.has_new()
+
+    def next_batch(self, timeout=0.5):
+        """Method that returns the chunks to be saved in the next write.
+
+        Waits up to `timeout` seconds for a chunk to be staged,
+        then takes all staged chunks, up to `max_batch`.
+        """
+        t_end = time.time() + timeout
+        while self.saving and not self.pending() and time.time() < t_end:
+            time.sleep(0.01)
+        chunks = self.reader.read_chunks(self.max_batch)
+        if chunks:
+            self.max_depth = max(self.max_depth, len(chunks))
+        return chunks
+
+    def save_batch(self, chunks):
+        super().save_batch(chunks)
+        self.reader.sync()
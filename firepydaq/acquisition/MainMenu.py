@@ -31,6 +31,7 @@ from .SaveSettingsDialog import SaveSettingsDialog
 from .LoadSettingsDialog import LoadSettingsDialog
 from .schema import schema
 from .display_data_tab import data_vis
+from .performance_tab import perf_vis
 
 from .device import alicat_mfc
 from .device import mfm
@@ -154,6 +155,11 @@ class MainMenu(QMenuBar):
         self.display_type.addAction(self.dash_display)
         self.display_type.addAction(self.no_display)
 
+        self.perf_display = QAction("Show Performance", self, checkable=True)  # noqa E501
+        self.perf_display.setObjectName("DispPerf")
+        self.perf_display.triggered.connect(self._display_performance)
+        self.display_data_menu.addAction(self.perf_display)
+
         # Mode
         self.mode_menu = self.addMenu("&Mode")
 
@@ -201,10 +207,7 @@ class MainMenu(QMenuBar):
 
     def _do_not_display(self):
         if hasattr(self.parent, "data_vis_tab"):
-            # todo: If AO tab is available, this will not always
-            # be the at index '1'. Check for bugs.
-            self.parent.input_tab_widget.removeTab(1)
-            del self.parent.data_vis_tab
+            self._remove_data_vis()
         self.parent.display = False
         self.parent.tab = False
         self.parent.dashboard = False
@@ -214,8 +217,7 @@ class MainMenu(QMenuBar):
         self.parent.tab = False
         self.parent.dashboard = True
         if hasattr(self.parent, "data_vis_tab"):
-            self.parent.input_tab_widget.removeTab(1)
-            del self.parent.data_vis_tab
+            self._remove_data_vis()
 
     def _display_tab(self):
         self.parent.display = True
@@ -224,6 +226,20 @@ class MainMenu(QMenuBar):
         if not hasattr(self.parent, "data_vis_tab"):
             self.parent.data_vis_tab = data_vis(self.parent)
 
+    def _remove_data_vis(self):
+        self.parent.data_vis_tab.stop()
+        index = self.parent.input_tab_widget.indexOf(self.parent.data_vis_tab.content)  # noqa E501
+        self.parent.input_tab_widget.removeTab(index)
+        del self.parent.data_vis_tab
+
+    def _display_performance(self):
+        if self.perf_display.isChecked():
+            if not hasattr(self.parent, "perf_tab"):
+                self.parent.perf_tab = perf_vis(self.parent)
+        elif hasattr(self.parent, "perf_tab"):
+            self.parent.perf_tab.remove()
+            del self.parent.perf_tab
+
     def _take_to_docs(self):
         webbrowser.open("https://ulfsri.github.io/firepydaq")  # todo replace
 
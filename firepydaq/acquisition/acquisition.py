@@ -35,21 +35,23 @@ from .NotificationPanel import NotificationPanel
 # Dashboard
 from ..dashboard.app import create_dash_app
 from ..utilities.PostProcessing import PostProcessData
+from ..utilities.DataWriter import (StreamingParquetWriter, chunks_dataframe,
+                                    PartitionedParquetWriter,
+                                    device_data_path, readings_dataframe,
+                                    time_zero)
+from ..utilities.RingBuffer import RingBuffer
+from ..utilities.StagingFile import StagingWriter, staging_path
+from ..utilities.StageTimer import StageTimer
 
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 
 # Threading and multiprocesses
-import queue
-import threading
-import concurrent.futures
 import multiprocessing as mp
 
 # Data related
 import polars as pl
-import pandas as pd
 import numpy as np
-import pyarrow.parquet as pq
 
 # String/Files validations
 import glob
@@ -58,7 +60,13 @@ import os
 
 # NI related
 from .NIAOtab import NIAOtab
+from .AcquisitionEngine import AcquisitionEngine, engine_stages
+from .DataSaver import DataSaver, StagingCompactor
 from ..api.EchoNIDAQTask import CreateDAQTask
+from ..api.SimulatedNIDAQ import SimulatedTask
+
+# Alicat related
+from ..api.AlicatPoller import AlicatPoller
 
 # Error handling
 import traceback
@@ -164,6 +172,52 @@ class application(QMainWindow):
                 Alphanumeric with underscores, no spaces allowed.
             - dt_format = "%Y-%m-%d %H:%M:%S:%f"
                 Format for how Absolute time is saved during acquisition
+                when `abs_time_type` is "String"
+            - display_interval = 100
+                Interval in ms at which plots and notifications
+                are updated during acquisition.
+            - abs_time_type = "String"
+                Type of the `AbsoluteTime` column in the saved data.
+                "String": formatted using `dt_format`,
+                "Datetime": saved as a `polars.Datetime` column
+                (nanoseconds), which is smaller and faster to save.
+            - history_window = 600
+                Duration in seconds of acquired data shown in live plots,
+                reduced to min-max buckets. Older data is only available
+                in saved files.
+            - history_max_mb = 256
+                Maximum memory in MB of the raw samples kept for
+                live plots, and plotted when zooming in. At high rates,
+                raw samples of only the latest part of `history_window`
+                are kept.
+            - save_queue_size = 50
+                Maximum chunks waiting to be saved. When full,
+                acquisition waits for saving to catch up.
+            - save_batch_size = 20
+                Maximum chunks saved in a single write
+                when saving falls behind acquisition.
+            - staging = False
+                If `True`, saved chunks are staged by the acquisition
+                thread in a memory-mapped `.staging` file, and converted
+                to Parquet by a `StagingCompactor` thread, so that data
+                is not lost if the program crashes, and nothing
+                but a copy is done per chunk in the acquisition thread.
+                The staging file is removed once the `.parquet` file
+                is finalized.
+            - partition_seconds = None
+                If set, NI data is saved in a `.parquet` directory
+                by a `PartitionedParquetWriter`, with a new partition
+                file every `partition_seconds` of acquisition,
+                so that readers of a time window of a long test
+                only open the partitions they need.
+            - partition_mb = None
+                If set, NI data is saved in a `.parquet` directory,
+                with a new partition file every `partition_mb`
+                megabytes. Can be combined with `partition_seconds`.
+            - simulate_daq = False
+                If `True`, NI tasks are simulated with
+                :py:class:`firepydaq.api.SimulatedNIDAQ.SimulatedTask`
+                instead of using NI hardware.
             - fext = ".parquet"
                 File format for collected NI data
             - curr_mode = "Light"
@@ -186,6 +240,16 @@ class application(QMainWindow):
 
         self.re_strAllowable = r'^[A-Za-z0-9_]+$'
         self.dt_format = "%Y-%m-%d %H:%M:%S:%f"
+        self.abs_time_type = "String"
+        self.display_interval = 100
+        self.history_window = 600
+        self.history_max_mb = 256
+        self.save_queue_size = 50
+        self.save_batch_size = 20
+        self.staging = False
+        self.partition_seconds = None
+        self.partition_mb = None
+        self.simulate_daq = False
         self.fext = '.parquet'
         self.curr_mode = "Light"
 
@@ -716,8 +780,9 @@ class application(QMainWindow):
         fpath = inp_text + self.fext
         if self.is_valid_path(fpath):
             # If the user selected a custom path to save the data
-            if os.path.isfile(fpath):
-                # If there is already a file by that name
+            if os.path.exists(fpath):
+                # If there is already a file, or partitioned
+                # data directory, by that name
                 test_name = f"{fname}"
 
                 files = glob.glob(f"{fname}*{self.fext}")
@@ -871,43 +936,37 @@ class application(QMainWindow):
         CheckPP.UpdateData(dump_output=False)
 
     def initiate_dataArrays(self):
-        """A method to initiate empty numpy data array for
+        """A method to allocate the data buffers for
         storing NI data during acquisition.
 
-        If the number of Analog Inputs (AI)
-        in the config file is 1,
-        an empty `ydata` numpy array of shape (1,) is created.
-
-        If the number of AIs are greater than one (example 4),
-        an empty `ydata` numpy array of shape (4,) is created
-
-        If there are both AIs and Analog Outputs (AO)
-        in the config file, empty `ydata` array with
-        shape equal to total AI (say 3) and AOs (say 1),
-        (4,) is created.
-
-        An empty `xdata` array of shape (1,)
-        for storing relative times
-        is created with a single element `0`.
-
-        An empty 1D numpy array of name `abs_timestamp`
-        is created to store corresponding
-        absolute times during acquisition.
+        `ydata` is a channel-major `RingBuffer`
+        with one row for each Analog Input (AI)
+        in the config file. If there are no AIs,
+        one row for each Analog Output (AO) is created instead.
+
+        `xdata` is a single row `RingBuffer`
+        for storing relative times.
+
+        Both buffers hold the latest `history_window` seconds
+        of data, or less if they would use more than
+        `history_max_mb`, so memory used during acquisition
+        depends neither on the test duration nor on the rate.
+        Data is held as float32, like saved data.
+        `history_samples`, the number of samples
+        of `history_window`, are plotted by the data tab.
         """
+        sample_rate = float(self.settings["Sampling Rate"])
         if self.NIDAQ_Device.ai_counter > 0:
-            if len(self.NIDAQ_Device.ailabel_map) == 1:
-                self.ydata = np.empty(0)
-            else:
-                self.ydata = np.empty((len(self.NIDAQ_Device.ailabel_map), 0))
+            n_channels = len(self.NIDAQ_Device.ailabel_map)
         else:  # Todo: check for bugs with AO module
-            self.ydata = np.empty((len(self.settings["Label"]), 0))
-        if self.mfcs != {}:
-            self.all_mfcData = {}
-            for mfcname in self.mfcs:
-                self.all_mfcData[mfcname] = pl.DataFrame()
-        self.xdata = np.array([0])
-        self.abs_timestamp = np.array([])
-        self.timing_np = np.empty((0, 3))
+            n_channels = len(self.NIDAQ_Device.aolabel_map)
+        self.history_samples = max(int(self.history_window*sample_rate),
+                                   int(sample_rate), 1)
+        # Samples are held twice by a RingBuffer, with 8 bytes for times
+        max_samples = int(self.history_max_mb*2**20/(2*(4*n_channels + 8)))
+        capacity = max(min(self.history_samples, max_samples), 1)
+        self.ydata = RingBuffer(n_channels, capacity, dtype=np.float32)
+        self.xdata = RingBuffer(1, capacity)
 
     def acquisition_begins(self):
         """Method to begin acquisition for all devices.
@@ -939,17 +998,19 @@ class application(QMainWindow):
                 self.acquisition_button.nextCheckState()
                 return
             self.run_counter = 0
+            self.stop_engine()
             if hasattr(self, 'NIDAQ_Device'):
                 self.NIDAQ_Device.aitask.stop()
                 self.NIDAQ_Device.aitask.close()
                 if hasattr(self.NIDAQ_Device, "aotask"):
-                    self.input_tab_widget.removeTab(1)
+                    self.input_tab_widget.removeTab(self.input_tab_widget.indexOf(self.niaotab.aocontent))  # noqa: E501
                     self.NIDAQ_Device.aotask.stop()
                     self.NIDAQ_Device.aotask.close()
                 del self.NIDAQ_Device
 
             try:
-                self.NIDAQ_Device = CreateDAQTask(self, "NI Task")
+                task_class = SimulatedTask if self.simulate_daq else None
+                self.NIDAQ_Device = CreateDAQTask(self, "NI Task", task_class)  # noqa: E501
                 self.NIDAQ_Device.CreateFromConfig(self.settings["Config File"])  # noqa: E501
 
                 if self.NIDAQ_Device.ai_counter > 0:
@@ -987,168 +1048,178 @@ class application(QMainWindow):
             self.runpyDAQ()
             self.notify("Acquiring Data . . .", "info")
         else:
-            self.ContinueAcquisition = False
-            time.sleep(1)
-            self.save_bool = False
-            self.run_counter = 0
-            self.save_button.setEnabled(False)
-            self.notify("Acquisition stopped.", "info")
-            self.acquisition_button.setText("Start Acquisition")
+            self.acquisition_stopped()
 
-    def save_data_thread(self):
-        """Method that saves acquired NI data in a
+    def save_chunks(self, chunks):
+        """Method that saves acquired chunks of NI data in a
         `.parquet` file in path created as per `Create_SavePath()`.
-        """
-        time_data = np.array(self.xdata_new)
-        abs_time = np.array(self.abs_timestamp)
-        time_data = time_data[np.newaxis, :]
-        abs_time = abs_time[np.newaxis, :]
-        ydata_new = self._queue.get(block=True, timeout=1)
 
-        if len(ydata_new.shape) == 1:
-            # If a single channel, a list is returned by nidaqmx
-            ydata_new = ydata_new[np.newaxis, :]
-        temp_data = np.append(time_data, np.array(ydata_new), axis=0)
+        Called by the `DataSaver` thread started in `save_data()`.
+        All chunks are appended as a single row group using the
+        `StreamingParquetWriter` created in `save_data()`.
+        If `abs_time_type` is "String", absolute times are
+        formatted here, outside of the acquisition loop.
 
-        temp_data = np.append(abs_time, temp_data, axis=0)
-        save_dataframe = pl.DataFrame(schema=self.pl_schema_dict, data=temp_data, orient='col')  # noqa: E501
-        self.parquet_file = self.common_path + ".parquet"
+        Readings of Alicat devices are saved by `save_device_readings()`.
 
-        try:
-            if os.path.isfile(self.parquet_file):
-                table = pq.read_table(self.parquet_file)
-                old_pq = pl.from_arrow(table)
-                new_df = pl.concat([old_pq, save_dataframe])
-            else:
-                new_df = save_dataframe
-            new_df.write_parquet(self.parquet_file)
+        Parameters
+        ----------
+            chunks: list
+                Chunks pushed by `AcquisitionEngine`, in acquisition order.
+        """
+        dt_format = self.dt_format if self.abs_time_type == "String" else None
+        save_dataframe = chunks_dataframe(chunks, self.pl_schema_dict, dt_format)  # noqa: E501
+        # Appends only the new chunks as a row group.
+        self.pq_writer.write(save_dataframe)
+        self.save_device_readings(chunks[0])
 
-            if self.mfcs != {}:
-                for mfcname, data in self.all_mfcData.items():
-                    MFC_filename = self.parquet_file.split(".parquet")[0] + '_' + mfcname + '.csv'  # noqa E501
-                    data_df = pd.DataFrame(data, index=[self.xdata_new[0]])
-                    data_df.to_csv(MFC_filename, mode="a", header=not os.path.isfile(MFC_filename))  # noqa E501
-
-        except Exception as e:
-            self.notify(str(e), "error")
-            self.notify("Error during saving operation", "error")
-        return
+    def save_device_readings(self, chunk=None):
+        """Method that appends all readings of Alicat devices,
+        buffered by `alicat_poller` since the last call,
+        to a `.parquet` file per device, see `device_data_path()`.
 
-    def runpyDAQ(self):
-        '''Method that continuously runs the Data acquisition system
-        until "Stop Acquisition" is clicked.
+        Readings are saved at the polling rate, with a `Time` column
+        on the same axis as the `Time` of NI data.
 
+        Parameters
+        ----------
+            chunk: dict, optional
+                A chunk saved since saving started, used to align
+                device times with NI times. Readings are kept buffered
+                until it is available.
+        """
+        if getattr(self, "alicat_poller", None) is None:
+            return
+        if self.device_time_zero is None:
+            if chunk is None:
+                return
+            self.device_time_zero = time_zero(chunk)
+        for mfcname, (times, columns) in self.alicat_poller.drain().items():
+            if not times:
+                continue
+            data_df = readings_dataframe(times, columns, self.device_time_zero)  # noqa E501
+            if mfcname not in self.device_writers:
+                self.device_writers[mfcname] = StreamingParquetWriter(device_data_path(self.parquet_file, mfcname), data_df.schema)  # noqa E501
+            self.device_writers[mfcname].write(data_df)
+
+    def runpyDAQ(self):
+        '''Method that starts the data acquisition system,
+        which runs until "Stop Acquisition" is clicked.
+
+        An `AcquisitionEngine` reads NI data in its own thread
+        and pushes every chunk to consumer queues.
+        Notifications are updated by `update_display()`
+        on the GUI thread every `display_interval` ms, and plots by
+        the Data Visualizer tab at its own frame rate,
+        so they never delay reading from the DAQ.
+
+        Alicat MFCs are polled concurrently by an `AlicatPoller`
+        on the shared device loop, and every chunk gets their
+        latest readings without waiting for the serial round trips.
+
+        Durations of every stage, from the DAQ read to plotting,
+        are recorded in `stage_timer`, shown in the Performance tab.
         '''
-        # AO debug in process
-        no_samples = self.NIDAQ_Device.numberOfSamples
         self.ActualSamplingRate = self.NIDAQ_Device.aitask.timing.samp_clk_rate  # noqa E501
-        samplesAvailable = self.NIDAQ_Device.aitask._in_stream.avail_samp_per_chan  # noqa: E501
-        if self.mfcs != {}:
-            self.alicat_locks = {}
-            for mfcname, al_mfc in self.mfcs.items():
-                # Lock Alicat thread for release only
-                # when NI data is available
-                self.alicat_locks[mfcname] = threading.Lock()
-                self.alicat_locks[mfcname].acquire()
-                self.all_mfcData[mfcname] = al_mfc.GetFlows()
-
-        if (samplesAvailable >= no_samples):
-            try:
-                t_bef_read = time.time()
-                # parallels_bef = time.time()
-                # Executor waits for the threads to complete their task.
-                # Pauses other buttons or creates delays.
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    # Threading AI, AO , and Device tasks
-                    aithread = executor.submit(self.NIDAQ_Device.threadaitask)
-                    self.ydata_new = aithread.result()
-                    self.ydata_new = np.array(self.ydata_new)
-                    if self.NIDAQ_Device.ao_counter > 0:
-                        AO_outputs = [0 for i in range(self.NIDAQ_Device.ao_counter)]  # noqa: E501
-                        # AO_outputs will need user iniput.
-                        # Currently only float values are accepted.
-                        aothread = executor.submit(self.NIDAQ_Device.threadaotask, AO_initials=AO_outputs)  # noqa: E501
-                        self.written_data = aothread.result()
-
-                if self.mfcs != {}:
-                    for mfcname, _ in self.mfcs.items():
-                        # Release alicat threads once the data is acquired.
-                        self.alicat_locks[mfcname].release()
-                # self.alicat_locks[mfcname].acquire()
-                t_aft_read = time.time()
-                t_now = datetime.now()
-
-                if (t_aft_read-t_bef_read) > 1/self.ActualSamplingRate:
-                    # Read time exceeds prescribed 1/(sampling frequency)
-                    self.notify("Data Loss WARNING: Time to read exceeds number of samples per seconds prescribed for acquisition.", "warning")  # noqa: E501
-
-                if len(self.ydata.shape) == 1:
-                    self.ydata = np.append(self.ydata, self.ydata_new, axis=0)
-                else:
-                    self.ydata = np.append(self.ydata, self.ydata_new, axis=1)
-                t_diff = no_samples/self.ActualSamplingRate
-                tdiff_array = np.linspace(1/self.ActualSamplingRate, t_diff, no_samples)  # noqa: E501
-                if self.xdata[-1] == 0:
-                    self.xdata_new = np.linspace(self.xdata[-1], self.xdata[-1] + t_diff, no_samples, endpoint=False)  # noqa: E501
-                    if len(self.ydata.shape) == 1 and len(self.xdata_new) == 1:  # noqa: E501
-                        # For 1 Hz sampling frequency
-                        self.xdata_new = [no_samples/self.ActualSamplingRate]
-                    self.xdata = self.xdata_new
-                    self.abs_timestamp = [(t_now+timedelta(seconds=sec)).strftime(self.dt_format) for sec in tdiff_array]  # noqa: E501
-                else:
-                    self.xdata_new = np.linspace(self.xdata[-1]+1/self.ActualSamplingRate, self.xdata[-1]+t_diff, no_samples)  # noqa: E501
-                    self.abs_timestamp = [(t_now+timedelta(seconds=sec)).strftime(self.dt_format) for sec in tdiff_array]  # noqa: E501
-                    self.xdata = np.append(self.xdata, self.xdata_new)
-
-                if self.save_bool:
-                    self._queue.put(self.ydata_new, block=True, timeout=1)
-                    # As long as save does not take more than 1 s,
-                    # there should be no conflict with acquisition.
-                    save_thread = threading.Thread(target=self.save_data_thread)  # noqa E501
-                    save_thread.start()
-
-                t_aft_save = time.time()
-                if (t_aft_save - t_bef_read) > 1/self.ActualSamplingRate:
-                    # Time between read and save time exceeds
-                    # prescribed 1/(sampling frequency)
-                    self.notify("Data Loss WARNING: Time to save exceeds number of samples per seconds prescribed for acquisition.", "warning")  # noqa: E501
+        self.stage_timer = StageTimer(engine_stages + ["Plot", "Notify"])
+        self.alicat_poller = None
+        if self.mfcs:
+            self.alicat_poller = AlicatPoller({mfcname: mfc.MFC.get_MFC_val for mfcname, mfc in self.mfcs.items()})  # noqa E501
+            self.alicat_poller.start()
+        self.acq_engine = AcquisitionEngine(self.NIDAQ_Device, self.ydata, self.xdata, mfcs=self.mfcs, timings=self.stage_timer, alicat_poller=self.alicat_poller)  # noqa E501
+        self.engine_events = self.acq_engine.events
+        self._display_queue = self.acq_engine.add_consumer("display", maxsize=2)  # noqa E501
+        self.acq_engine.start()
+
+        self.display_timer = QTimer()
+        self.display_timer.timeout.connect(self.update_display)
+        self.display_timer.start(self.display_interval)
+
+    def update_display(self):
+        '''Method that consumes the latest acquired chunks on the GUI thread.
+
+        - Posts notifications from the acquisition engine and saver.
+        - Starts feeding the Data Visualizer tab, which then
+        plots at its own frame rate.
+        - Updates the Performance tab.
+        - Stops acquisition when "Stop Acquisition" is clicked,
+        the GUI is closed, or the acquisition engine stops due to an error.
+        '''
+        t_bef_notify = time.perf_counter()
+        while not self.engine_events.empty():
+            type, text = self.engine_events.get_nowait()
+            self.notify(text, type)
+            if type == "error" and self.acq_engine.error == text:
+                self.ContinueAcquisition = False
+                self.inform_user(text)
+        self.stage_timer.record("Notify", time.perf_counter() - t_bef_notify)  # noqa E501
 
+        chunks = []
+        while not self._display_queue.empty():
+            chunks.append(self._display_queue.get_nowait())
+
+        if chunks:
+            try:
+                self.ActualSamplingRate = self.NIDAQ_Device.aitask.timing.samp_clk_rate  # noqa E501
                 # Plots
                 if hasattr(self, "data_vis_tab"):
                     if not hasattr(self.data_vis_tab, "dev_edit"):
                         self.data_vis_tab.set_labels(self.config_file)
-                    self.vis_lock = threading.Lock()
-                    self.vis_lock.acquire(timeout=0.5)
-                    if len(self.ydata.shape) == 1:
-                        self.data_vis_tab.set_data_and_plot(self.xdata, self.ydata)  # noqa: E501
-                    else:
-                        self.data_vis_tab.set_data_and_plot(self.xdata, self.ydata[self.data_vis_tab.get_curr_selection()])  # noqa: E501
-
-                if (self.xdata[-1] % 5) <= 1/self.ActualSamplingRate:
-                    text_update = ("Last time entry:" +
-                                   str(round(self.xdata[-1], 2)) +
-                                   ", Total samples/chan:" +
-                                   str(self.NIDAQ_Device.aitask.in_stream.total_samp_per_chan_acquired) +  # noqa: E501
-                                   ",\n Actual Hz:" +
-                                   str(round(self.NIDAQ_Device.aitask.timing.samp_clk_rate, 2)))  # noqa: E501
-                    self.notify(text_update)
+                    if not self.data_vis_tab.is_feeding():
+                        # Plots are drawn by the tab's own frame timer
+                        self.data_vis_tab.start(self.xdata, self.ydata, self.acq_engine.lock, self.stage_timer, self.history_samples)  # noqa: E501
+
+                for chunk in chunks:
+                    t_last = chunk["Time"][-1]
+                    if (t_last % 5) <= 1/self.ActualSamplingRate:
+                        text_update = ("Last time entry:" +
+                                       str(round(t_last, 2)) +
+                                       ", Total samples/chan:" +
+                                       str(self.NIDAQ_Device.aitask.in_stream.total_samp_per_chan_acquired) +  # noqa: E501
+                                       ",\n Actual Hz:" +
+                                       str(round(self.ActualSamplingRate, 2)))  # noqa: E501
+                        self.notify(text_update)
             except Exception:
                 the_type, the_value, the_traceback = sys.exc_info()
                 self.ContinueAcquisition = False
-                # print(the_type, the_value, the_traceback)
                 self.inform_user(str(the_type) + str(the_value))
                 traceback.print_tb(the_traceback)  # noqa: E501
 
-        if self.ContinueAcquisition and self.running:
-            QTimer.singleShot(1, self.runpyDAQ)
-        else:
-            self.run_counter = 0
-            self.notify("Acquisition stopped.", "info")
-            self.acquisition_button.setText("Start Acquisition")
-            self.save_button.setEnabled(False)
-            if hasattr(self, "dash_thread"):
-                self.dash_thread.terminate()
-                self.notify("Dashboard closed.", "info")
+        if hasattr(self, "perf_tab"):
+            self.perf_tab.update_stats(self.stage_timer)
+
+        if not (self.ContinueAcquisition and self.running and self.acq_engine.is_alive()):  # noqa: E501
+            self.acquisition_stopped()
+
+    def acquisition_stopped(self):
+        """Method that stops the acquisition engine and saving,
+        and resets the acquisition and save buttons.
+        """
+        self.ContinueAcquisition = False
+        self.stop_engine()
+        self.run_counter = 0
+        self.notify("Acquisition stopped.", "info")
+        self.acquisition_button.setText("Start Acquisition")
+        self.save_button.setEnabled(False)
+        if hasattr(self, "dash_thread"):
+            self.stop_dashboard()
+            self.notify("Dashboard closed.", "info")
+        self.stop_saving()
+
+    def stop_engine(self):
+        """Method that stops the acquisition engine,
+        the display timer and the plot feed, if they are running.
+        """
+        if hasattr(self, "display_timer"):
+            self.display_timer.stop()
+            del self.display_timer
+        if hasattr(self, "data_vis_tab"):
+            self.data_vis_tab.stop()
+        if hasattr(self, "acq_engine"):
+            self.acq_engine.stop()
+        if getattr(self, "alicat_poller", None) is not None:
+            # Kept, so that readings buffered while saving are saved
+            self.alicat_poller.stop()
 
     @error_logger("SaveData")
     def save_data(self):
@@ -1156,9 +1227,7 @@ class application(QMainWindow):
         """
         if self.save_button.isChecked():
             self.save_button.setText("Stop")
-            self.save_bool = True
             self.run_counter = 0
-            self._queue = queue.Queue(maxsize=0)  # infinite queue size
 
             # This will call Create_save path also based on updated fields.
             self.set_up()
@@ -1171,7 +1240,6 @@ class application(QMainWindow):
                 self.common_path = self.save_dir + self.common_path
             assert self.is_valid_path(self.common_path)
 
-            self.initiate_dataArrays()
             firepydaq_logger.info("Saving initiated properly.")
             self.save_begin_time = time.time()
             self.notify("Saving Data in " + self.settings["Test Name"], "info")
@@ -1183,25 +1251,126 @@ class application(QMainWindow):
             for col in pl_cols:
                 if 'AbsoluteTime' not in col:
                     self.pl_schema_dict[col] = pl.Float32
+                elif self.abs_time_type == "Datetime":
+                    self.pl_schema_dict[col] = pl.Datetime("ns")
                 else:
                     self.pl_schema_dict[col] = pl.String
+            self.parquet_file = self.common_path + ".parquet"
+            if self.partition_seconds is not None or self.partition_mb is not None:  # noqa: E501
+                partition_bytes = None if self.partition_mb is None else int(self.partition_mb*2**20)  # noqa: E501
+                self.pq_writer = PartitionedParquetWriter(self.parquet_file, self.pl_schema_dict,  # noqa: E501
+                                                          self.partition_seconds, partition_bytes)  # noqa: E501
+            else:
+                self.pq_writer = StreamingParquetWriter(self.parquet_file, self.pl_schema_dict)  # noqa: E501
+
+            # Saved time restarts from zero. Buffers are reset and the
+            # saving consumer is added at once, so no chunk is missed.
+            with self.acq_engine.lock:
+                self.acq_engine.reset()
+                if self.staging:
+                    dt_format = self.dt_format if self.abs_time_type == "String" else None  # noqa: E501
+                    self.staging_writer = StagingWriter(staging_path(self.parquet_file), list(self.pl_schema_dict), dt_format)  # noqa: E501
+                    self.acq_engine.set_staging(self.staging_writer)
+                else:
+                    self._queue = self.acq_engine.add_consumer("save", maxsize=self.save_queue_size, drop_oldest=False)  # noqa: E501
+            self.device_time_zero = None
+            self.device_writers = {}
+            if getattr(self, "alicat_poller", None) is not None:
+                self.alicat_poller.start_recording()
+            self.save_bool = True
+            if self.staging:
+                self.data_saver = StagingCompactor(self.staging_writer.path, self.save_chunks,  # noqa: E501
+                                                   events=self.engine_events,
+                                                   max_batch=self.save_batch_size)  # noqa: E501
+            else:
+                self.data_saver = DataSaver(self._queue, self.save_chunks,
+                                            events=self.engine_events,
+                                            max_batch=self.save_batch_size)  # noqa: E501
+            self.data_saver.start()
 
             if self.dashboard:
                 firepydaq_logger.info("Dash app Process initiated after saving initiations")  # noqa: E501
                 self.notify("Launching Dashboard on https://127.0.0.1:1222", "info")  # noqa E501
                 mp.freeze_support()
-                self.dash_thread = mp.Process(target=create_dash_app, kwargs={"jsonpath": self.json_file})  # noqa: E501
+                self.dash_stop = mp.Event()
+                self.dash_thread = mp.Process(target=create_dash_app, kwargs={"jsonpath": self.json_file, "stop_event": self.dash_stop})  # noqa: E501
                 self.dash_thread.start()
         else:
             self.save_button.setText("Save")
             self.notify("Saving Stopped", "info")
-            if hasattr(self, "dash_thread"):
-                self.dash_thread.terminate()
-            self.save_bool = False
+            self.stop_dashboard()
+            self.stop_saving()
+
+    def stop_dashboard(self, timeout=10):
+        """Method that closes the dashboard process, if it is running.
+
+        The dashboard is asked to stop, so that it finalizes the
+        `_PostProcessed.parquet` file it writes, and is terminated
+        if it did not end within `timeout` seconds.
+        """
+        if not hasattr(self, "dash_thread"):
+            return
+        if hasattr(self, "dash_stop"):
+            self.dash_stop.set()
+            self.dash_thread.join(timeout)
+            del self.dash_stop
+        if self.dash_thread.is_alive():
+            self.dash_thread.terminate()
+        del self.dash_thread
+
+    def stop_saving(self):
+        """Method that stops saving.
+
+        The `DataSaver` thread saves all queued,
+        or staged, chunks before the `.parquet` file is finalized.
+        """
+        self.save_bool = False
+        if hasattr(self, "acq_engine"):
+            self.acq_engine.remove_consumer("save")
+            self.acq_engine.set_staging(None)
+        if hasattr(self, "staging_writer"):
+            self.staging_writer.close()
+        if hasattr(self, "data_saver"):
+            self.data_saver.stop()
+            del self.data_saver
+        if getattr(self, "alicat_poller", None) is not None:
+            self.alicat_poller.stop_recording()
+            if hasattr(self, "device_writers"):
+                self.save_device_readings()
+        self.close_data_file()
+
+    def close_data_file(self):
+        """Method that finalizes the `.parquet` files
+        being written during saving, if any.
+
+        The staging file, if any, is removed once all its
+        rows are in the finalized `.parquet` file.
+        """
+        if hasattr(self, "pq_writer"):
+            try:
+                self.pq_writer.close()
+                firepydaq_logger.info("Data file finalized: " + self.pq_writer.parquet_file)  # noqa: E501
+                if hasattr(self, "staging_writer"):
+                    if self.pq_writer.rows_written >= self.staging_writer.rows_written:  # noqa: E501
+                        os.remove(self.staging_writer.path)
+                    else:
+                        self.notify("Not all staged data was saved. Staged data is kept in " + self.staging_writer.path, "warning")  # noqa: E501
+            except Exception as e:
+                self.notify("Error finalizing data file: " + str(e), "error")  # noqa: E501
+            del self.pq_writer
+        if hasattr(self, "staging_writer"):
+            del self.staging_writer
+        for device_writer in getattr(self, "device_writers", {}).values():
+            try:
+                device_writer.close()
+            except Exception as e:
+                self.notify("Error finalizing data file: " + str(e), "error")  # noqa: E501
+        self.device_writers = {}
 
     def safe_exit(self):
         """Method that stops and closes NI AI and AO tasks.
         """
+        self.stop_engine()
         if hasattr(self, 'NIDAQ_Device'):
             self.NIDAQ_Device.aitask.stop()
             self.NIDAQ_Device.aitask.close()
@@ -1215,16 +1384,16 @@ class application(QMainWindow):
         """Method that gracefully closes the GUI
 
         In the following order:
-        - Terminates the dash thread if it is running
+        - Closes the dash process if it is running
         - Closes AITask
         - Closes AOTask
         - Closes Connection to Other devices
         - Closes the GUI.
         """
         self.running = False
-        time.sleep(1)
-        if hasattr(self, "dash_thread"):
-            self.dash_thread.terminate()
+        self.stop_engine()
+        self.stop_dashboard()
+        self.stop_saving()
         if hasattr(self, 'NIDAQ_Device'):
             if hasattr(self.NIDAQ_Device, 'aitask'):
                 self.NIDAQ_Device.aitask.stop()
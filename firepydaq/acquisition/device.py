@@ -27,10 +27,10 @@ from ..utilities.DAQUtils import COMports, AlicatGases
 
 # APIs
 from ..api.EchoAlicat import EchoController
+from ..api.AlicatPoller import device_loop
 from ..api.EchoThorLabsCLD101X import EchoThor
 
 # Communication related
-import asyncio
 import time
 
 
@@ -446,37 +446,39 @@ class alicat_mfc(QWidget):
         to the value input `dil_rate_input`.
         """
         new_flow = float(self.dil_rate_input.text())
-        self.loop.run_until_complete(self.MFC.set_MFC_val(flow_rate=new_flow))
+        self.loop.run(self.MFC.set_MFC_val(flow_rate=new_flow))
         self.parent.notify(str(self.dev_id) + " flow set to " + str(new_flow), "success") # noqa E501
 
     def stop_flow_rate(self):
         """Method that sets the flow-rate of the Alicat MFC
         to zero
         """
-        self.loop.run_until_complete(self.MFC.set_MFC_val(flow_rate=0))
+        self.loop.run(self.MFC.set_MFC_val(flow_rate=0))
         self.parent.notify(str(self.dev_id) + " flow set to zero", "success")
         self.dil_rate_input.setText('0.0')
         return
 
     def GetMFCFlow(self):
-        MFC_Vals = self.loop.run_until_complete(self.MFC.get_MFC_val())
+        MFC_Vals = self.loop.run(self.MFC.get_MFC_val())
         return MFC_Vals
 
     def establish_connection(self):
         """Method that establishes connection with
         Alicat device at `comport_input`
         and sets the gas type to gas_input.
+
+        The connection is made on the `DeviceLoop` shared by all
+        Alicat devices, on which they are polled during acquisition.
         """
         if self.mfc_connection_btn.isChecked():
             try:
                 self.MFC = EchoController()
-                self.loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(self.loop)
+                self.loop = device_loop()
                 com = self.comport_input.currentText()
                 gas = self.gas_input.currentText()
                 gas = [gastxt for gastxt, gasunicode in AlicatGases.items() if bytes(gasunicode, "utf-8") == bytes(gas, "utf-8")][0]  # noqa E501
                 time.sleep(0.1)
-                self.loop.run_until_complete(self.MFC.set_params(com, gas=gas))
+                self.loop.run(self.MFC.set_params(com, gas=gas))
                 self.parent.notify(self.dev_id + " connected successfully", "success")  # noqa E501
 
                 self.mfc_connection_btn.setText("Stop Connection")
@@ -485,7 +487,7 @@ class alicat_mfc(QWidget):
             except Exception as e:
                 self.parent.notify(self.dev_id + " connection error" +str(e), "error")  # noqa E501
         else:
-            self.loop.run_until_complete(self.MFC.end_connection())
+            self.loop.run(self.MFC.end_connection())
             self.parent.notify("Connection to " + self.dev_id + " ended successfully", "success")  # noqa E501
             self.mfc_connection_btn.setText("Establish Connection")
 
@@ -540,7 +542,7 @@ class alicat_mfc(QWidget):
 
     def GetFlows(self):
         # self.parent.all_mfcData[mfcname] = self.loop.run_until_complete(self.MFC.get_MFC_val())  # noqa E501
-        return self.loop.run_until_complete(self.MFC.get_MFC_val())
+        return self.loop.run(self.MFC.get_MFC_val())
 
 
 class mfm(QWidget):
@@ -17,10 +17,17 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #########################################################################
 
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QComboBox
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QLabel,
+                               QComboBox, QCheckBox)
 
 import pyqtgraph as pg
 import polars as pl
+import numpy as np
+import math
+import time
+
+from ..utilities.Decimation import decimate, points_for_width, MinMaxHistory
 
 
 class data_vis(QWidget):
@@ -30,12 +37,60 @@ class data_vis(QWidget):
     For this to be initiated, dsiplay in tab or display all
     must be selected.
 
+    The tab either shows the channel picked in `dev_edit`,
+    or, if "Show all charts" is checked, a grid of all channels
+    grouped by the `Chart`, `Layout` and `Position` columns
+    of the config file, like the dashboard.
+
+    During acquisition, the plots are fed by their own `QTimer`
+    at `frame_rate` frames per second, see `start()`.
+    Every frame copies only the samples acquired since the last
+    frame, for all channels at once, and appends them to a
+    `MinMaxHistory`. Each visible curve is then decimated to the
+    width of its own plot, and to its own x range if zoomed in,
+    and updated in place with `setData`, so no plot items
+    are created or destroyed while acquiring.
+
     Attributes
     ----------
         plot_graph: PlotWidget
             pyqtgraph PlotWidget that plots
             the acquired raw data during acquisition
+        curve: PlotDataItem
+            The curve of the selected channel, reused for every frame.
+        grid_graph: GraphicsLayoutWidget
+            Grid of plots of all channels, one column per chart
+            and one row per position, see `create_grid()`.
+        grid_curves: list
+            (channel index, PlotItem, PlotDataItem) of every
+            channel in `grid_graph`.
+        frame_rate: float
+            Frames per second of the plots during acquisition.
+            Default: 20
+        history_points: int
+            Number of min-max buckets per channel
+            kept for plotting the whole history. Default: 4096
+        zoom_samples: int
+            A plot zoomed in on at most this number of samples
+            is plotted from the raw samples instead of
+            the min-max history. Default: 65536
+        catchup_samples: int
+            Maximum number of samples per channel copied in one frame,
+            when plotting starts with samples already in the buffers.
+            Default: 65536
+        cpu_budget: float
+            Fraction of the GUI thread time that plotting may use.
+            Frames are skipped after a frame that took longer
+            than this fraction of the time since the last frame,
+            so that many channels lower the frame rate instead of
+            slowing down the GUI. Default: 0.2
     """
+    frame_rate = 20
+    history_points = 4096
+    zoom_samples = 2**16
+    catchup_samples = 2**16
+    cpu_budget = 0.2
+
     def __init__(self, parent):
         super().__init__()
         self._makeinit(parent)
@@ -45,23 +100,237 @@ class data_vis(QWidget):
         self.parent = parent
         self.content = self.create_data_vis_content()
         self.parent.input_tab_widget.addTab(self.content, "Data Visualizer")
+        self.frame_timer = QTimer()
+        self.frame_timer.timeout.connect(self.refresh)
+        self._source = None
+        self._last_frame = None
 
     def create_data_vis_content(self):
         """Method that creates the raw data visualizer.
-        Creates `plot_graph` widget
+        Creates `plot_graph` widget and its `curve`,
+        and the empty `grid_graph` widget.
         """
         self.widget = QWidget()
         self.data_layout = QVBoxLayout()
         self.plot_graph = pg.PlotWidget()
-        self.plot_graph.plot([], [])
+        self.curve = self.plot_graph.plot([], [])
         self.plot_graph.setLabel('bottom', "Time (s)")
         self.data_layout.addWidget(self.plot_graph)
+        self.grid_graph = pg.GraphicsLayoutWidget()
+        self.grid_graph.setVisible(False)
+        self.grid_curves = []
+        self.data_layout.addWidget(self.grid_graph)
         self.widget.setLayout(self.data_layout)
         return self.widget
 
+    def create_grid(self, config_df):
+        """Method that creates a plot for every position of every chart
+        in `grid_graph`, with a curve for every channel.
+
+        Charts are laid out in a grid of about as many
+        columns as rows. Within a chart, plots are stacked
+        by `Position` and share their x axis.
+        Channels with `Chart` "None" are not plotted.
+
+        Parameters
+        ----------
+            config_df: polars.DataFrame
+                Config file, with `Label`, `Chart`, `Layout`,
+                `Position` and `Legend` columns. The row of a label is
+                the index of its channel in the acquisition buffers.
+        """
+        self.grid_graph.clear()
+        self.grid_curves = []
+        chart_df = config_df.with_row_index("Index").with_columns(
+            pl.col("Chart").cast(pl.String).str.strip_chars(),
+            pl.col("Position").cast(pl.String).str.strip_chars().cast(pl.Int64))  # noqa E501
+        chart_df = chart_df.filter(pl.col("Chart") != "None")
+        charts = chart_df["Chart"].unique(maintain_order=True).to_list()
+        n_cols = max(math.ceil(math.sqrt(len(charts))), 1)
+        for n, chart in enumerate(charts):
+            rows = chart_df.filter(pl.col("Chart") == chart)
+            chart_layout = self.grid_graph.addLayout(row=n//n_cols, col=n % n_cols)  # noqa E501
+            plots = {}
+            for position in sorted(rows["Position"].unique().to_list()):
+                plot = chart_layout.addPlot(row=len(plots), col=0)
+                plot.addLegend()
+                if plots:
+                    plot.setXLink(plots[min(plots)])
+                else:
+                    plot.setTitle(chart)
+                plots[position] = plot
+            plots[max(plots)].setLabel('bottom', "Time (s)")
+            for i, row in enumerate(rows.iter_rows(named=True)):
+                curve = plots[row["Position"]].plot([], [], pen=pg.intColor(i, hues=rows.height), name=str(row["Legend"]).strip())  # noqa E501
+                self.grid_curves.append((row["Index"], plots[row["Position"]], curve))  # noqa E501
+
+    def show_grid(self, checked):
+        """Method that switches between the plot of the selected
+        channel and the grid of all channels.
+        """
+        self.grid_graph.setVisible(checked)
+        self.plot_graph.setVisible(not checked)
+        self.dev_edit.setEnabled(not checked)
+        self._last_frame = None
+
+    def start(self, xdata, ydata, lock, timings=None, history_samples=None):
+        """Method that starts updating the plots from the
+        acquisition ring buffers, at `frame_rate` frames per second.
+
+        Parameters
+        ----------
+            xdata: RingBuffer
+                Relative time, in its first channel.
+            ydata: RingBuffer
+                Raw data, one channel per label of `dev_edit`.
+            lock: threading.Lock or threading.RLock
+                Lock held by the acquisition thread while it appends
+                to the buffers. It is never waited for: a frame is
+                skipped if the lock is busy.
+            timings: StageTimer, optional
+                If given, the duration of every frame
+                is recorded as the "Plot" stage.
+            history_samples: int, optional
+                Number of latest samples per channel plotted
+                from the min-max history, which may be more than
+                the raw samples held in the buffers.
+                Default: capacity of `ydata`
+        """
+        if history_samples is None:
+            history_samples = ydata.capacity
+        self._source = (xdata, ydata, lock, timings)
+        self.history = MinMaxHistory(ydata.n_channels, self.history_points,
+                                     math.ceil(history_samples/self.history_points))  # noqa E501
+        self._read_samples = 0
+        self._last_frame = None
+        self._next_frame_time = 0
+        self.frame_timer.start(int(1000/self.frame_rate))
+
+    def stop(self):
+        """Method that stops updating the plots.
+        The last frame stays displayed.
+        """
+        self.frame_timer.stop()
+        self._source = None
+
+    def is_feeding(self):
+        """Method that returns `True` while the plots
+        are updated from the acquisition ring buffers.
+        """
+        return self._source is not None and self.frame_timer.isActive()
+
+    def _views(self, n_channels):
+        # (channel index, PlotItem, PlotDataItem) of the shown curves
+        if self.grid_check.isChecked():
+            views = self.grid_curves
+        else:
+            views = [(self.get_curr_selection(), self.plot_graph.getPlotItem(), self.curve)]  # noqa E501
+        return [view for view in views if 0 <= view[0] < n_channels]
+
+    def _zoom(self, plot):
+        # x range of a plot zoomed in by the user, else None
+        view_box = plot.getViewBox()
+        linked = view_box.linkedView(view_box.XAxis)
+        if linked is not None:
+            # Plots below the first of a chart follow its x range
+            view_box = linked
+        if view_box.autoRangeEnabled()[0]:
+            return None
+        return tuple(view_box.viewRange()[0])
+
+    def _new_samples(self, xdata, ydata):
+        # Copies samples acquired since the last frame
+        total = xdata.total_samples
+        if total < self._read_samples:
+            # Buffers were reset
+            self.history.reset()
+            self._read_samples = 0
+        start = max(self._read_samples, total - xdata.size)
+        n = min(total - start, self.catchup_samples)
+        self._read_samples = start + n
+        if n <= 0:
+            return None
+        return (xdata.channel(0, total - start)[:n].copy(),
+                ydata.window(total - start)[:, :n].copy())
+
+    def refresh(self):
+        """Method that draws one frame from the acquisition ring buffers.
+
+        Called by the frame timer. New samples of all channels
+        are copied at once while holding the acquisition lock,
+        and decimated and drawn after releasing it.
+        Nothing is drawn if the tab is hidden, if the last frame
+        used more than `cpu_budget`, or if no new samples
+        were acquired and the shown plots did not change.
+        """
+        if self._source is None or not hasattr(self, "dev_edit"):
+            return
+        if not self.widget.isVisible():
+            return
+        xdata, ydata, lock, timings = self._source
+        t_start = time.perf_counter()
+        if t_start < self._next_frame_time:
+            return
+        views = self._views(ydata.n_channels)
+        if not views:
+            return
+        zoom = [self._zoom(plot) for _, plot, _ in views]
+        frame = (xdata.total_samples, tuple((index, id(plot), plot.getViewBox().width(), x_range) for (index, plot, _), x_range in zip(views, zoom)))  # noqa E501
+        if not lock.acquire(blocking=False):
+            # The acquisition thread is appending, the next frame will plot
+            return
+        try:
+            if frame == self._last_frame and self._read_samples == xdata.total_samples:  # noqa E501
+                return
+            new_samples = self._new_samples(xdata, ydata)
+            raw = {}
+            if self.history.bucket_size > 1:
+                times = xdata.channel(0)
+                for n, ((index, _, _), x_range) in enumerate(zip(views, zoom)):  # noqa E501
+                    if x_range is None:
+                        continue
+                    if xdata.size < xdata.total_samples and x_range[0] < times[0]:  # noqa E501
+                        # Raw samples of the range are no longer held
+                        continue
+                    i_start, i_end = np.searchsorted(times, x_range)
+                    i_start, i_end = max(i_start - 1, 0), min(i_end + 1, len(times))  # noqa E501
+                    if i_end - i_start <= self.zoom_samples:
+                        raw[n] = (times[i_start:i_end].copy(),
+                                  ydata.window()[index, i_start:i_end].copy())  # noqa E501
+        finally:
+            lock.release()
+        self._last_frame = frame
+        if new_samples is not None:
+            self.history.append(*new_samples)
+
+        graph = self.grid_graph if self.grid_check.isChecked() else self.plot_graph  # noqa E501
+        # One repaint for all curves of the frame
+        graph.setUpdatesEnabled(False)
+        try:
+            for n, ((index, plot, curve), x_range) in enumerate(zip(views, zoom)):  # noqa E501
+                if n in raw:
+                    x, y = raw[n]
+                else:
+                    x, y = self.history.channel(index)
+                    if x_range is not None:
+                        i_start, i_end = np.searchsorted(x, x_range)
+                        x, y = x[max(i_start - 1, 0):i_end + 1], y[max(i_start - 1, 0):i_end + 1]  # noqa E501
+                x, y = decimate(x, y, points_for_width(plot.getViewBox().width()))  # noqa E501
+                curve.setData(x, y, skipFiniteCheck=True)
+        finally:
+            graph.setUpdatesEnabled(True)
+        duration = time.perf_counter() - t_start
+        self._next_frame_time = t_start + duration/self.cpu_budget
+        if timings is not None:
+            timings.record("Plot", duration)
+
     def set_data_and_plot(self, xdata, ydata):
         """Method that plots the x and y data
-        in a separate thread without affecting acquisition.
+        by updating `curve` in place.
+
+        Data is decimated to about two points per pixel of the
+        plot width, keeping peaks, so plotting time does not
+        grow with the length of the data.
 
         Parameters
         ----------
@@ -71,14 +340,13 @@ class data_vis(QWidget):
                 Raw data selected from a drop down
                 `dev_edit` that lists available columns for plotting.
         """
-        self.plot_graph.clear()
-        self.plot_graph.plot(xdata, ydata)
+        xdata, ydata = decimate(xdata, ydata, points_for_width(self.plot_graph.width()))  # noqa E501
+        self.curve.setData(xdata, ydata)
         self.plot_graph.setLabel('left', self.dev_edit.currentText())
-        self.parent.vis_lock.release()
 
     def set_labels(self, config_file):
         """Method that creates dropdown for letting user select
-        from available channel labels
+        from available channel labels, and the grid of all channels
         """
         if not hasattr(self, "label") and not hasattr(self, "dev_edit"):
             self.label = QLabel("Select Channel to View:")
@@ -86,8 +354,15 @@ class data_vis(QWidget):
             self.dev_edit = QComboBox()
             self.data_layout.addWidget(self.dev_edit)
             df = pl.read_csv(config_file)
+            df = df.rename({col: col.strip() for col in df.columns})
             for dev in df["Label"]:
                 self.dev_edit.addItem(dev)
+            self.dev_edit.currentTextChanged.connect(lambda text: self.plot_graph.setLabel('left', text))  # noqa E501
+            self.plot_graph.setLabel('left', self.dev_edit.currentText())
+            self.create_grid(df)
+            self.grid_check = QCheckBox("Show all charts")
+            self.grid_check.toggled.connect(self.show_grid)
+            self.data_layout.addWidget(self.grid_check)
 
     def get_curr_selection(self):
         """Method to get user selected """
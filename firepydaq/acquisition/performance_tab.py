@@ -0,0 +1,111 @@
+##########################################################################
+# FIREpyDAQ - Facilitated Interface for Recording Experiments,
+# a python-package for Data Acquisition.
+# Copyright (C) 2024  Dushyant M. Chaudhari
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#########################################################################
+
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QFormLayout, QLabel,
+                               QTableWidget, QTableWidgetItem, QHeaderView)
+
+
+class perf_vis(QWidget):
+    """Object that creates a Performance tab
+    next to the Data Visualizer tab, or next to Input Settings.
+
+    Shows, for each stage of the acquisition loop,
+    the number of cycles and the median (p50), 99th percentile (p99),
+    and maximum durations, along with how far reading lags
+    behind acquisition. Use it to find the stage that delays reads.
+
+    Attributes
+    ----------
+        stats_table: QTableWidget
+            Table with a row for each stage.
+        cycles_behind: QLabel
+            Number of full chunks waiting in the NI buffer
+            after the last read.
+        samples_backlog: QLabel
+            Samples per channel waiting in the NI buffer
+            after the last read.
+    """
+    columns = ["Cycles", "p50 (ms)", "p99 (ms)", "Max (ms)"]
+
+    def __init__(self, parent):
+        super().__init__()
+        self._makeinit(parent)
+
+    def _makeinit(self, parent):
+        self.parent = parent
+        self.content = self.create_perf_content()
+        index = parent.input_tab_widget.count()
+        if hasattr(parent, "data_vis_tab"):
+            index = parent.input_tab_widget.indexOf(parent.data_vis_tab.content) + 1  # noqa E501
+        parent.input_tab_widget.insertTab(index, self.content, "Performance")
+
+    def create_perf_content(self):
+        """Method that creates the stage table and backlog labels.
+        """
+        self.widget = QWidget()
+        self.perf_layout = QVBoxLayout()
+        self.stats_table = QTableWidget(0, len(self.columns))
+        self.stats_table.setHorizontalHeaderLabels(self.columns)
+        self.stats_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)  # noqa E501
+        self.perf_layout.addWidget(self.stats_table)
+
+        self.backlog_layout = QFormLayout()
+        self.cycles_behind = QLabel("-")
+        self.samples_backlog = QLabel("-")
+        self.backlog_layout.addRow("Cycles behind:", self.cycles_behind)
+        self.backlog_layout.addRow("Samples backlog (per channel):", self.samples_backlog)  # noqa E501
+        self.perf_layout.addLayout(self.backlog_layout)
+        self.widget.setLayout(self.perf_layout)
+        return self.widget
+
+    def update_stats(self, timings):
+        """Method that shows the latest statistics of a `StageTimer`.
+
+        Parameters
+        ----------
+            timings: StageTimer
+                Timings of the acquisition loop,
+                `AcquisitionEngine.timings`
+        """
+        summary = timings.summary()
+        if self.stats_table.rowCount() != len(summary):
+            self.stats_table.setRowCount(len(summary))
+            self.stats_table.setVerticalHeaderLabels(list(summary.keys()))
+        for row, stats in enumerate(summary.values()):
+            values = [str(stats["count"])]
+            for key in ["p50", "p99", "max"]:
+                if stats["count"] == 0 or stats[key] is None:
+                    values.append("-")
+                else:
+                    values.append(format(stats[key]*1000, ".3g"))
+            for col, value in enumerate(values):
+                item = self.stats_table.item(row, col)
+                if item is None:
+                    self.stats_table.setItem(row, col, QTableWidgetItem(value))  # noqa E501
+                else:
+                    item.setText(value)
+        self.cycles_behind.setText(str(timings.gauges.get("Cycles behind", "-")))  # noqa E501
+        self.samples_backlog.setText(str(timings.gauges.get("Samples backlog", "-")))  # noqa E501
+
+    def remove(self):
+        """Method that removes the Performance tab.
+        """
+        index = self.parent.input_tab_widget.indexOf(self.content)
+        if index >= 0:
+            self.parent.input_tab_widget.removeTab(index)
@@ -0,0 +1,279 @@
+##########################################################################
+# FIREpyDAQ - Facilitated Interface for Recording Experiments,
+# a python-package for Data Acquisition.
+# Copyright (C) 2024  Dushyant M. Chaudhari
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#########################################################################
+
+# Polling of Alicat devices on a shared event loop
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+from ..utilities.ErrorUtils import firepydaq_logger
+
+
+class DeviceLoop():
+    """An asyncio event loop running in its own daemon thread.
+
+    All `EchoController` and `EchoMeter` objects are connected,
+    set and read on this loop, so that serial round trips of
+    several devices overlap and never block the GUI or the
+    acquisition thread. Use `device_loop()` to get the shared loop.
+
+    Attributes
+    ----------
+        loop: asyncio.AbstractEventLoop
+            The event loop.
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="DeviceLoop", daemon=True)  # noqa E501
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Method to schedule a coroutine on the loop from any thread.
+
+        Returns
+        -------
+            concurrent.futures.Future of the coroutine result.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Method to run a coroutine on the loop and wait for its result.
+
+        Must not be called from the loop thread itself.
+
+        Parameters
+        ----------
+            coro: coroutine
+                Example, `controller.set_MFC_val(flow_rate=1)`
+            timeout: float, optional
+                Seconds to wait for the result. Default: None, no limit.
+        """
+        return self.submit(coro).result(timeout)
+
+
+_device_loop = None
+_device_loop_lock = threading.Lock()
+
+
+def device_loop():
+    """Function that returns the `DeviceLoop` shared by all devices,
+    starting it on first use.
+    """
+    global _device_loop
+    with _device_loop_lock:
+        if _device_loop is None:
+            _device_loop = DeviceLoop()
+        return _device_loop
+
+
+class ReadingsBuffer():
+    """Columnar buffer of the readings of one device.
+
+    Readings are appended by the polling loop and taken in batches by
+    `drain()`, for example, by the saving thread, so that a file is
+    written once per batch instead of once per reading.
+
+    Attributes
+    ----------
+        size: int
+            Number of buffered readings.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.size = 0
+        self._times = []
+        self._columns = {}
+
+    def append(self, reading, time_ns):
+        """Method to buffer a reading.
+
+        Parameters
+        ----------
+            reading: dict
+                Values of the reading. Keys missing in some readings
+                are buffered as `None`.
+            time_ns: int
+                Time of the reading, as returned by `time.time_ns()`.
+        """
+        with self._lock:
+            for key in reading:
+                if key not in self._columns:
+                    self._columns[key] = [None]*self.size
+            for key, column in self._columns.items():
+                column.append(reading.get(key))
+            self._times.append(time_ns)
+            self.size += 1
+
+    def drain(self):
+        """Method that returns all buffered readings and empties the buffer.
+
+        Returns
+        -------
+            (times, columns), where `times` is a list of
+            `time.time_ns()` times, and `columns` maps
+            each key of the readings to a list of values.
+        """
+        with self._lock:
+            times, columns = self._times, self._columns
+            self._clear()
+        return times, columns
+
+
+class AlicatPoller():
+    """Concurrent polling of Alicat devices on the shared `DeviceLoop`.
+
+    Every `interval` seconds all devices are read together with
+    `asyncio.gather`, so a polling cycle takes as long as the slowest
+    device instead of the sum of all round trips.
+    After every cycle, a new dict of the latest readings is published
+    by replacing `snapshot`. The published dict is never modified,
+    so other threads, like the acquisition loop, read it without locks.
+    Every reading can also be buffered, to be saved at the full polling
+    rate, see `start_recording()` and `drain()`.
+
+    Example
+
+    ```
+    poller = AlicatPoller({"MFC-Propane": controller.get_MFC_val})
+    poller.start()
+    poller.snapshot["MFC-Propane"]["mass_flow"]
+    poller.stop()
+    ```
+
+    Parameters
+    ----------
+        readers: dict
+            Maps device names to coroutine functions returning
+            a dict of readings, for example
+            `EchoController.get_MFC_val` or `EchoMeter.get_MFM_val`.
+        interval: float, optional
+            Seconds between the start of polling cycles. Default: 0.1
+        loop: DeviceLoop, optional
+            Default: the shared `device_loop()`
+
+    Attributes
+    ----------
+        snapshot: dict
+            Maps device names to their latest readings, with a
+            "Timestamp" (`datetime.datetime`) of when they were received.
+            Devices not read successfully yet are missing.
+            Do not modify.
+        cycles: int
+            Number of completed polling cycles.
+        errors: dict
+            Maps device names to the last error of a failed read.
+        buffers: dict
+            Maps device names to the `ReadingsBuffer` of their readings
+            since the last `drain()`, while recording.
+    """
+    def __init__(self, readers, interval=0.1, loop=None):
+        self.readers = dict(readers)
+        self.interval = interval
+        self.device_loop = loop if loop is not None else device_loop()
+        self.snapshot = {}
+        self.cycles = 0
+        self.errors = {}
+        self.buffers = {name: ReadingsBuffer() for name in self.readers}
+        self.recording = False
+        self._future = None
+
+    def start(self):
+        """Method to start polling on the device loop.
+        """
+        if self._future is None or self._future.done():
+            self._future = self.device_loop.submit(self._poll_forever())
+
+    def stop(self, timeout=2):
+        """Method to stop polling and wait for the current cycle to end.
+        """
+        if self._future is None:
+            return
+        self._future.cancel()
+        try:
+            self._future.result(timeout)
+        except BaseException:
+            # Cancelled, or errors already logged
+            pass
+        self._future = None
+
+    def is_running(self):
+        """Method that returns `True` while polling.
+        """
+        return self._future is not None and not self._future.done()
+
+    def start_recording(self):
+        """Method to discard buffered readings and buffer every new one.
+        """
+        self.drain()
+        self.recording = True
+
+    def stop_recording(self):
+        """Method to stop buffering readings.
+        Buffered readings are kept until the next `drain()`.
+        """
+        self.recording = False
+
+    def drain(self):
+        """Method that returns the readings buffered
+        since the last call, see `ReadingsBuffer.drain()`.
+
+        Returns
+        -------
+            dict mapping device names to (times, columns).
+        """
+        return {name: buffer.drain() for name, buffer in self.buffers.items()}  # noqa E501
+
+    async def _read(self, name):
+        values = await self.readers[name]()
+        if self.recording:
+            self.buffers[name].append(values, time.time_ns())
+        return dict(values, Timestamp=datetime.now())
+
+    async def poll_once(self):
+        """Coroutine that reads all devices concurrently
+        and publishes a new `snapshot`.
+        """
+        names = list(self.readers)
+        results = await asyncio.gather(*[self._read(name) for name in names], return_exceptions=True)  # noqa E501
+        snapshot = dict(self.snapshot)
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                if name not in self.errors:
+                    firepydaq_logger.warning("Reading " + name + " failed: " + repr(result))  # noqa E501
+                self.errors[name] = repr(result)
+            else:
+                snapshot[name] = result
+                self.errors.pop(name, None)
+        # Replaced, not updated, so that readers never see a partial cycle
+        self.snapshot = snapshot
+        self.cycles += 1
+
+    async def _poll_forever(self):
+        while True:
+            t_start = time.perf_counter()
+            await self.poll_once()
+            await asyncio.sleep(max(0, self.interval - (time.perf_counter() - t_start)))  # noqa E501
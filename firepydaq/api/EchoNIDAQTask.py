@@ -20,19 +20,35 @@
 import nidaqmx
 import nidaqmx.constants
 import nidaqmx.stream_writers
+import nidaqmx.stream_readers
+import numpy as np
 import pandas as pd
 import time
 
 
 class CreateDAQTask:
-    def __init__(self, parent, name):
+    def __init__(self, parent, name, task_class=None):
         """Initiate a DAQ task.
 
         AI: Temp, V, Current
         AO : Only Voltage
+
+        Parameters
+        ----------
+            parent: object
+                Object creating the task, for example the application.
+            name: str
+                Name of the task
+            task_class: class, optional
+                Class used to create AI and AO tasks.
+                It must implement the methods of `nidaqmx.Task`
+                used here. Default: `nidaqmx.Task`.
+                Use :py:class:`firepydaq.api.SimulatedNIDAQ.SimulatedTask`
+                to run without NI hardware.
         """
         self.parent = parent
         self.name = name
+        self.task_class = nidaqmx.Task if task_class is None else task_class
 
     def CreateFromConfig(self, cpath):
         """Method to add AI and AO tasks using a config file.
@@ -42,9 +58,9 @@ class CreateDAQTask:
         """
         self.initialize_config(cpath)
         if self.ailabel_map:
-            self.aitask = nidaqmx.Task(new_task_name=self.name+"_AI")
+            self.aitask = self.task_class(new_task_name=self.name+"_AI")
         if self.aolabel_map:
-            self.aotask = nidaqmx.Task(new_task_name=self.name+'_AO')
+            self.aotask = self.task_class(new_task_name=self.name+'_AO')
         self.ChanConfig = self.ChanConfig.astype(str)
         for n in self.ChanConfig.index:
             devname = self.ChanConfig.loc[n, 'Device'].strip()
@@ -137,6 +153,10 @@ class CreateDAQTask:
         """Method to  start a continous AI task once the `aitask`
         is configured to open up communication with the NI hardware.
 
+        Creates `ai_reader`, an `AnalogMultiChannelReader` of `aitask`,
+        and `ai_buffer`, a float64 numpy array of shape
+        (AI channels, `HowManySample`) in which every read is done.
+
         Keyword Arguments
         ----------------
             SamplingRate: float
@@ -159,6 +179,10 @@ class CreateDAQTask:
             self.aitask.in_stream.configure_logging(save_tdms_path, logging_mode=log_mode)  # noqa E501
 
         self.aitask.start()
+        # Simulated tasks provide their own reader
+        reader_class = getattr(self.aitask, "reader_class", nidaqmx.stream_readers.AnalogMultiChannelReader)  # noqa E501
+        self.ai_reader = reader_class(self.aitask.in_stream)
+        self.ai_buffer = np.zeros((self.ai_counter, self.numberOfSamples), dtype=np.float64)  # noqa E501
 
     def StartAOContinuousTask(self, AO_initials=None, save_tdms=False, save_tdms_path="PreSavedData_AO.tdms"):  # noqa E501
         """Method to start a continous AO task once
@@ -224,11 +248,17 @@ class CreateDAQTask:
     def threadaitask(self):
         """Method to read the `aitask` data
 
+        Samples are read by `ai_reader` directly in `ai_buffer`,
+        without creating python lists or new arrays.
+
         Returns
         -------
-            NI AI data as a numpy array
+            `ai_buffer`, NI AI data as a numpy array
+            of shape (AI channels, samples).
+            It is overwritten by the next read, copy it to keep it.
         """
-        return self.aitask.read(number_of_samples_per_channel=self.numberOfSamples)  # noqa E501
+        self.ai_reader.read_many_sample(self.ai_buffer, number_of_samples_per_channel=self.numberOfSamples, timeout=10.0)  # noqa E501
+        return self.ai_buffer
 
     # Method to output AO task data
     def threadaotask(self, AO_Outputs):
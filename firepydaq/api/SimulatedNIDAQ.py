@@ -0,0 +1,276 @@
+##########################################################################
+# FIREpyDAQ - Facilitated Interface for Recording Experiments,
+# a python-package for Data Acquisition.
+# Copyright (C) 2024  Dushyant M. Chaudhari
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#########################################################################
+
+import time
+
+import numpy as np
+
+
+class SimulatedDAQError(RuntimeError):
+    """Error raised by a `SimulatedTask`, for example when
+    acquired samples are overwritten before they are read.
+    """
+    pass
+
+
+class _SimulatedChannels():
+    """Collection of channels of a `SimulatedTask`,
+    with the `add_*_chan` methods of nidaqmx channel collections.
+    """
+    def __init__(self, task):
+        self._task = task
+
+    def _add(self, physical_channel, measurement):
+        self._task._channels.append((physical_channel, measurement))
+
+    def add_ai_thrmcpl_chan(self, physical_channel, **kwargs):
+        self._add(physical_channel, "Thermocouple")
+
+    def add_ai_voltage_chan(self, physical_channel, **kwargs):
+        self._add(physical_channel, "Voltage")
+
+    def add_ai_current_chan(self, physical_channel, **kwargs):
+        self._add(physical_channel, "Current")
+
+    def add_ao_voltage_chan(self, physical_channel, **kwargs):
+        self._add(physical_channel, "Voltage")
+
+
+class _SimulatedTiming():
+    """Sample clock timing of a `SimulatedTask`.
+    """
+    def __init__(self):
+        self.samp_clk_rate = 1.
+        self.samp_quant_samp_per_chan = 1
+
+    def cfg_samp_clk_timing(self, rate, sample_mode=None, samps_per_chan=1000, **kwargs):  # noqa E501
+        self.samp_clk_rate = float(rate)
+        self.samp_quant_samp_per_chan = int(samps_per_chan)
+
+
+class _SimulatedStream():
+    """Input or output stream of a `SimulatedTask`.
+    """
+    def __init__(self, task):
+        self._task = task
+        self.regen_mode = None
+        self.curr_write_pos = 0
+        self.logging_file_path = None
+
+    @property
+    def avail_samp_per_chan(self):
+        return self._task._acquired() - self._task._samples_read
+
+    @property
+    def total_samp_per_chan_acquired(self):
+        return self._task._acquired()
+
+    @property
+    def input_buf_size(self):
+        return self._task.buffer_size
+
+    def configure_logging(self, file_path, **kwargs):
+        # TDMS logging is not simulated
+        self.logging_file_path = file_path
+
+
+class SimulatedMultiChannelReader():
+    """Reader of a `SimulatedTask`, with the `read_many_sample` method
+    of `nidaqmx.stream_readers.AnalogMultiChannelReader`.
+
+    Parameters
+    ----------
+        task_in_stream: `SimulatedTask.in_stream`
+    """
+    def __init__(self, task_in_stream):
+        self._task = task_in_stream._task
+
+    def read_many_sample(self, data, number_of_samples_per_channel=1, timeout=10.0):  # noqa E501
+        """Method that reads acquired samples in the preallocated
+        float64 array `data` of shape (channels, samples).
+
+        Returns
+        -------
+            Number of samples read per channel.
+        """
+        n = int(number_of_samples_per_channel)
+        if data.dtype != np.float64 or data.shape != (self._task.number_of_channels, n):  # noqa E501
+            raise SimulatedDAQError("Read array of shape " + str(data.shape) + " and type " + str(data.dtype) + " does not match " + str(n) + " float64 samples of " + str(self._task.number_of_channels) + " channels.")  # noqa E501
+        self._task.read_array(n, timeout, out=data)
+        return n
+
+
+class SimulatedTask():
+    """A hardware-free stand-in for `nidaqmx.Task`,
+    to run and load-test acquisition without NI hardware or drivers.
+
+    Implements the part of `nidaqmx.Task` used by
+    :py:class:`firepydaq.api.EchoNIDAQTask.CreateDAQTask`.
+    Pass it as `task_class` to `CreateDAQTask`,
+    which adds channels from the same config file as for NI hardware.
+
+    Once started, samples are acquired at `timing.samp_clk_rate`
+    following the clock. `read()` returns deterministic waveforms
+    for each channel, depending only on the channel index and sample number:
+
+    - Thermocouple (deg C): 25 + 2*index + 5*sin(2*pi*0.1*t + index)
+    - Voltage (V): 2.5 + 2*sin(2*pi*(1 + index%10)*t)
+    - Current (A): 0.012 + 0.008*sin(2*pi*0.5*t + index)
+
+    Like NI hardware, acquired samples are kept in a buffer of
+    `buffer_size` samples per channel, and `read()` raises
+    `SimulatedDAQError` if samples were overwritten before being read.
+
+    Parameters
+    ----------
+        new_task_name: str, optional
+            Name of the task
+        clock: callable, optional
+            Function returning the time in seconds.
+            Default: `time.monotonic`
+
+    Attributes
+    ----------
+        buffer_size: int
+            Buffer size in samples per channel,
+            set as per the NI default for the sampling rate when started.
+        reader_class: class
+            `SimulatedMultiChannelReader`, used instead of
+            `nidaqmx.stream_readers.AnalogMultiChannelReader`.
+    """
+    reader_class = SimulatedMultiChannelReader
+
+    def __init__(self, new_task_name="", clock=time.monotonic):
+        self.name = new_task_name
+        self._clock = clock
+        self._channels = []
+        self._t_start = None
+        self._samples_read = 0
+        self.buffer_size = 0
+        self.ai_channels = _SimulatedChannels(self)
+        self.ao_channels = _SimulatedChannels(self)
+        self.timing = _SimulatedTiming()
+        self.in_stream = _SimulatedStream(self)
+        self._in_stream = self.in_stream
+        self.out_stream = self.in_stream
+        self.last_written = None
+
+    @property
+    def channel_names(self):
+        return [channel for channel, measurement in self._channels]
+
+    @property
+    def number_of_channels(self):
+        return len(self._channels)
+
+    def start(self):
+        rate = self.timing.samp_clk_rate
+        # NI default input buffer sizes for continuous acquisition
+        if rate <= 100:
+            default_size = 1000
+        elif rate <= 10000:
+            default_size = 10000
+        elif rate <= 1000000:
+            default_size = 100000
+        else:
+            default_size = 1000000
+        self.buffer_size = max(default_size, self.timing.samp_quant_samp_per_chan)  # noqa E501
+        self._samples_read = 0
+        self._t_start = self._clock()
+
+    def stop(self):
+        self._t_start = None
+
+    def close(self):
+        self.stop()
+
+    def is_task_done(self):
+        return self._t_start is None
+
+    def _acquired(self):
+        if self._t_start is None:
+            return self._samples_read
+        return int((self._clock() - self._t_start)*self.timing.samp_clk_rate)
+
+    def waveforms(self, first_sample, n_samples, out=None):
+        """Method that returns the simulated samples
+        `first_sample` to `first_sample + n_samples`
+        as a numpy array of shape (channels, `n_samples`).
+
+        If given, samples are written in the array `out`.
+        """
+        t = (first_sample + np.arange(n_samples))/self.timing.samp_clk_rate
+        data = np.empty((len(self._channels), n_samples)) if out is None else out  # noqa E501
+        for index, (channel, measurement) in enumerate(self._channels):
+            if measurement == "Thermocouple":
+                data[index] = 25 + 2*index + 5*np.sin(2*np.pi*0.1*t + index)
+            elif measurement == "Current":
+                data[index] = 0.012 + 0.008*np.sin(2*np.pi*0.5*t + index)
+            else:
+                data[index] = 2.5 + 2*np.sin(2*np.pi*(1 + index % 10)*t)
+        return data
+
+    def read(self, number_of_samples_per_channel=1, timeout=10.0):
+        """Method that reads acquired samples, as `nidaqmx.Task.read()`.
+
+        Waits until `number_of_samples_per_channel` samples are acquired.
+
+        Returns
+        -------
+            List of samples for a single channel,
+            or a list of lists for multiple channels.
+        """
+        data = self.read_array(number_of_samples_per_channel, timeout)
+        if len(self._channels) == 1:
+            return data[0].tolist()
+        return data.tolist()
+
+    def read_array(self, number_of_samples_per_channel=1, timeout=10.0, out=None):  # noqa E501
+        """Method that reads acquired samples as a numpy array
+        of shape (channels, `number_of_samples_per_channel`).
+
+        If given, samples are written in the array `out`.
+        """
+        if self._t_start is None:
+            raise SimulatedDAQError("Task " + self.name + " is not running.")  # noqa E501
+        n = int(number_of_samples_per_channel)
+        t_end = self._clock() + timeout
+        while self.in_stream.avail_samp_per_chan < n:
+            if self._clock() > t_end:
+                raise SimulatedDAQError("Timeout reading " + str(n) + " samples from task " + self.name)  # noqa E501
+            time.sleep(min((n - self.in_stream.avail_samp_per_chan)/self.timing.samp_clk_rate, 0.01))  # noqa E501
+        if self._acquired() - self._samples_read > self.buffer_size:
+            raise SimulatedDAQError("The application is not able to keep up with the acquisition of samples. Samples were overwritten before they could be read. Task: " + self.name)  # noqa E501
+        data = self.waveforms(self._samples_read, n, out)
+        self._samples_read += n
+        return data
+
+    def write(self, data, auto_start=False, timeout=10.0):
+        """Method that writes output samples, as `nidaqmx.Task.write()`.
+
+        The last written samples are kept in `last_written`.
+
+        Returns
+        -------
+            Number of samples written per channel.
+        """
+        self.last_written = np.asarray(data, dtype=np.float64)
+        n_samples = 1 if self.last_written.ndim <= 1 else self.last_written.shape[-1]  # noqa E501
+        self.out_stream.curr_write_pos += n_samples
+        return n_samples
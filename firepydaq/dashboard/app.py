@@ -17,31 +17,71 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #########################################################################
 
-from dash import dcc, html, Input, Output, Dash, ctx, ALL
+from dash import dcc, html, Input, Output, State, Dash, ctx, ALL, no_update
 import dash_daq as daq
 import plotly.graph_objects as go
 import json
 from plotly.subplots import make_subplots
 import numpy as np
+import polars as pl
 import os
 from ..utilities.PostProcessing import PostProcessData
-from threading import Timer
+from ..utilities.Decimation import decimate, points_for_width
+from threading import Timer, Lock, Thread
 import webbrowser
 import logging
 from logging.handlers import RotatingFileHandler
 from contextlib import redirect_stdout
 
+max_points = 20000
+""" int
+    Maximum number of points in each trace of the dashboard.
+    When reached, traces are decimated again from all processed data.
+"""
 
-def create_dash_app(**kwargs):
+plot_width = 1000
+""" int
+    Width in pixels used to decimate dashboard traces.
+    Graphs take half of the browser width.
+"""
+
+
+def stop_on_event(processed_obj, stop_event, refresh_lock):
+    """Function that waits for `stop_event`, then finalizes the
+    `_PostProcessed.parquet` file written by dashboard refreshes,
+    and ends the dashboard process.
+
+    Run in a thread of the dashboard process, so that the
+    processed file is complete when acquisition closes the dashboard.
+    """
+    stop_event.wait()
+    with refresh_lock:
+        try:
+            processed_obj.FinalizeData()
+        finally:
+            # The web server does not return, the process is ended
+            os._exit(0)
+
+
+def create_dash_app(stop_event=None, **kwargs):
     """ Method to post process and visualise data on a dashboard
     hosted on a web server.
 
     Uses the same keyword argument/s as
     :py:class:`firepydaq.utilities.PostProcessing.PostProcessData`
 
-
+    Parameters
+    ----------
+        stop_event: multiprocessing.Event, optional
+            When set, the processed file is finalized and the
+            dashboard process ends, see `stop_on_event()`.
+            Default: None, the dashboard runs until it is terminated.
     """
     processed_obj = PostProcessData(**kwargs)
+    # Refreshes only process rows saved since the previous refresh
+    refresh_lock = Lock()
+    if stop_event is not None:
+        Thread(target=stop_on_event, args=(processed_obj, stop_event, refresh_lock), daemon=True).start()  # noqa E501
     app = Dash(__name__, suppress_callback_exceptions=True)
     log = logging.getLogger('werkzeug')
     open("DashboardError.log", "w").close()
@@ -231,7 +271,9 @@ def create_dash_app(**kwargs):
         title_bar = make_title()
         interval = dcc.Interval(id="refresh", interval=1 * 3000, n_intervals=0)
         para_div = html.Div(id='para', style={'display': 'none'})
-        return title_bar, sidebar, main_layout, interval, para_div  # noqa E501
+        # Processed rows already sent to the browser
+        sent_rows = dcc.Store(id='sent-rows')
+        return title_bar, sidebar, main_layout, interval, para_div, sent_rows  # noqa E501
 
     app.layout = serve_layout
 
@@ -286,10 +328,16 @@ def create_dash_app(**kwargs):
         Output: Style of Para Div
         """
         if ctx.triggered_id == "snapshot":
+            # Snapshots have all processed data, not only
+            # the latest points displayed in the browser
+            with refresh_lock:
+                processed_data = processed_obj.df_processed
+            df = processed_obj.All_chart_info.sort("Chart")
             for plot in plots:
                 plot_name = plot[0].get('props', {}).get('id').get('index')
-                graph = plot[0].get('props', {}).get('figure')
-                fig = go.Figure(graph)
+                if plot[0].get('props', {}).get('figure') is None:
+                    continue
+                fig = make_figure(plot_name, df.filter(pl.col("Chart") == plot_name), processed_data)  # noqa E501
                 dir = processed_obj.path_dict["datapath"].split(".parquet")[0]
                 fig.write_html(dir + "_" + plot_name + ".html")
 
@@ -340,79 +388,119 @@ def create_dash_app(**kwargs):
 
         return display
 
+    def make_figure(chart, chart_df, processed_data, n_out=None):
+        """ Method that creates the figure of a chart
+        with all its traces, from processed data.
+
+        Parameters
+        ----------
+        chart: str
+            Name of the chart
+        chart_df: polars.DataFrame
+            Rows of `All_chart_info` for the chart.
+            One trace is added for each row, in the same order.
+        processed_data: polars.DataFrame
+            Processed data to plot
+        n_out: int, optional
+            Maximum points in each trace, see `trace_data()`.
+        """
+        graph = make_subplots(chart_df["Layout"][0], 1)
+        # Add chart and axes titles
+        graph.update_layout(title_text=chart + " Graphs")
+        graph.update_xaxes(title_text="Time (s)", row=chart_df["Layout"][0])
+        for row in chart_df.iter_rows(named=True):
+            x, y = trace_data(str(row["Label"]), processed_data, n_out)
+            graph.add_trace(go.Scatter(x=x, y=y, name=row["Legend"]),
+                            row=row["Position"], col=1)
+            graph.update_yaxes(title_text=row["Processed_Unit"],
+                               row=row["Position"])
+        return graph
+
+    def trace_data(label, processed_data, n_out=None):
+        """ Method that returns x and y arrays of a trace.
+        Empty if the label is not in processed data.
+
+        If `n_out` is given, the trace is decimated to
+        at most `n_out` points, keeping peaks.
+        """
+        if label not in processed_data.columns:
+            return [], []
+        x = processed_data["Time"].to_numpy()
+        y = processed_data[label].to_numpy()
+        if n_out is not None:
+            x, y = decimate(x, y, n_out)
+        return x, y
+
     @app.callback(
         Output({'type': 'graphs', 'index': ALL}, "figure"),
+        Output({'type': 'graphs', 'index': ALL}, "extendData"),
+        Output('sent-rows', 'data'),
         Input('refresh', 'n_intervals'),
-        Input({'type': 'plot-layout', 'index': ALL}, "children")
+        Input({'type': 'plot-layout', 'index': ALL}, "children"),
+        State('sent-rows', 'data')
     )
-    def refresh_graphs(intervals, plots):
+    def refresh_graphs(intervals, plots, sent_rows):
         """
         Callback to update plots at a specified interval
-        Output: Updated plots with data appended at each interval
+        Output: Full figures, when the page is loaded,
+        when traces reach `max_points`,
+        or when processed data was processed again
+        Output: Points appended since the last update, for existing traces
+        Output: Processed rows and points sent to the browser
         Input: Interval time period to reload the site
         Input: Children of plot layouts that are graphs
+        State: Processed rows and points sent to the browser
+
+        Full figures show all processed data decimated to about
+        two points per pixel of `plot_width`, in buckets of `bucket` rows.
+        New rows are decimated with the same bucket size and appended.
+        Once traces reach `max_points`, full figures are decimated again,
+        so the data sent and rendered stays bounded
+        whichever the duration of the test.
         """
-        # Hold graphs and plot layouts intermediately
-        updates = {}
-        processed_obj = PostProcessData(**kwargs)
         print("Refresh")
-        # Obtain and load live data
-        processed_obj.ScaleData()
-        processed_obj.UpdateData()
-        processed_data = processed_obj.df_processed
+        # Obtain and process new live data
+        with refresh_lock:
+            processed_obj.ExtendData()
+            processed_data = processed_obj.df_processed
+            n_rows = processed_data.height
+            version = processed_obj.reprocess_count
         df = processed_obj.All_chart_info.sort("Chart")
-        # Plotting for corresponding charts
-        for i in range(len(df.select("Chart"))):
-            for plot in plots:
-                plot_name = plot[0].get('props', {}).get('id').get('index')
-                if plot_name == df["Chart"][i]:
-
-                    # If graph not updated before, generate its layout and plot
-                    if df["Chart"][i] not in updates:
-
-                        # Create graph Object
-                        graph = plot[0].get('props', {}).get('figure')
-                        graph = go.Figure(graph)
-                        graph = make_subplots(df["Layout"][i], 1)
-                        label = str(df["Label"][i])
-                        # Add chart and axes titles
-                        graph.update_layout(
-                            title_text=df["Chart"][i] + " Graphs"
-                        )
-                        graph.update_xaxes(title_text="Time (s)",
-                                           row=df["Layout"][i])
-                        graph.update_yaxes(title_text=df["Processed_Unit"][i],
-                                           row=df["Position"][i])
-                        # Plot points on graph
-                        graph.add_trace(
-                            go.Scatter(x=processed_data["Time"],
-                                       y=processed_data[label],
-                                       name=df["Legend"][i]
-                                       ),
-                            row=df["Position"][i],
-                            col=1
-                        )
-
-                    # If graph updated before, get updated graph and add traces
-                    else:
-
-                        # Add relevant plot data and axes
-                        label = str(df["Label"][i])
-                        graph = updates.get(df["Chart"][i])
-                        graph.add_trace(
-                                go.Scatter(x=processed_data["Time"],
-                                           y=processed_data[label],
-                                           name=df["Legend"][i]
-                                           ),
-                                row=df["Position"][i],
-                                col=1
-                        )
-                        graph.update_yaxes(title_text=df["Processed_Unit"][i],
-                                           row=df["Position"][i]
-                                           )
-                    # Store new layout
-                    updates[plot_name] = graph
-        return list(updates.values())
+        charts = [output["id"]["index"] for output in ctx.outputs_list[0]]
+        no_updates = [no_update for chart in charts]
+
+        if (ctx.triggered_id == "refresh" and sent_rows is not None
+                and sent_rows["version"] == version):
+            n_new = n_rows - sent_rows["rows"]
+            if n_new == 0:
+                return no_updates, no_updates, no_update
+            n_out = 2*int(np.ceil(n_new/sent_rows["bucket"]))
+            if sent_rows["points"] + min(n_new, n_out) <= max_points:
+                # Only rows appended since the last update are sent
+                new_data = processed_data[sent_rows["rows"]:]
+                extensions = []
+                for chart in charts:
+                    chart_df = df.filter(pl.col("Chart") == chart)
+                    new_points = {"x": [], "y": []}
+                    for label in chart_df["Label"]:
+                        x, y = trace_data(str(label), new_data, n_out)
+                        new_points["x"].append(x)
+                        new_points["y"].append(y)
+                    extensions.append([new_points, list(range(chart_df.height)), max_points])  # noqa E501
+                sent = dict(sent_rows, rows=n_rows,
+                            points=sent_rows["points"] + min(n_new, n_out))
+                return no_updates, extensions, sent
+
+        # Page loaded, traces full, or all rows were processed again
+        n_out = points_for_width(plot_width)
+        figures = []
+        for chart in charts:
+            chart_df = df.filter(pl.col("Chart") == chart)
+            figures.append(make_figure(chart, chart_df, processed_data, n_out))  # noqa E501
+        sent = {"rows": n_rows, "version": version,
+                "points": min(n_rows, n_out),
+                "bucket": max(int(np.ceil(2*n_rows/n_out)), 1)}
+        return figures, no_updates, sent
 
     def open_browser():
         """
@@ -0,0 +1,336 @@
+##########################################################################
+# FIREpyDAQ - Facilitated Interface for Recording Experiments,
+# a python-package for Data Acquisition.
+# Copyright (C) 2024  Dushyant M. Chaudhari
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#########################################################################
+
+"""Post processing of many tests in parallel, from the command line.
+
+Example, to process all tests of a project with 4 processes::
+
+    firepydaq-postprocess "02_ExperimentData/2024Project/**/*.json" --workers 4
+
+Tests are found from the `.json` files saved with the data.
+A test is processed again only if its data, device, config or formulae
+files changed since it was last processed, as recorded in the manifest.
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pyarrow.parquet as pq
+
+from .DataWriter import saved_data_files, device_data_files, file_hash
+
+manifest_name = "postprocess_manifest.json"
+""" str
+    Default name of the manifest file written in the working directory.
+"""
+
+
+def _resolve(path, json_dir):
+    # Paths saved in the json are relative to where acquisition ran.
+    # Files moved along with the json are found next to it.
+    if path and not os.path.exists(path):
+        moved = os.path.join(json_dir, os.path.basename(path))
+        if os.path.exists(moved):
+            return moved
+    return path
+
+
+def inputs_of_test(json_path):
+    """Function that returns the data, config and formulae file paths
+    of a test from its `.json` file.
+
+    Returns
+    -------
+        dict with `datapath`, `configpath` and `formulaepath` keys.
+        `formulaepath` is an empty string if the test has no formulae.
+    """
+    with open(json_path) as f:
+        settings = json.load(f)
+    json_dir = os.path.dirname(json_path)
+    return {"datapath": _resolve(settings["Test Name"], json_dir),
+            "configpath": _resolve(settings["Config File"], json_dir),
+            "formulaepath": _resolve(settings.get("Formulae File", "").strip(), json_dir)}  # noqa E501
+
+
+def _input_files(inputs):
+    # Data saved in row group files, while saving is in progress,
+    # is checked file by file.
+    data_files = saved_data_files(inputs["datapath"])
+    if not data_files:
+        raise FileNotFoundError("No data found for " + inputs["datapath"])
+    device_files = []
+    for path in device_data_files(inputs["datapath"]).values():
+        device_files += saved_data_files(path) if path.endswith(".parquet") else [path]  # noqa E501
+    return data_files, device_files
+
+
+def _file_stat(path):
+    stat = os.stat(path)
+    return [os.path.basename(path), stat.st_size, stat.st_mtime_ns]
+
+
+def input_state(inputs):
+    """Function that returns the sizes and modification times
+    of the input files of a test, as returned by `inputs_of_test()`,
+    and the number of rows of its data.
+
+    Read from file system and parquet metadata only,
+    to find unchanged tests without reading their data.
+    Files of user-added devices, see `device_data_files()`,
+    are inputs too.
+    """
+    data_files, device_files = _input_files(inputs)
+    state = {"data": [_file_stat(f) for f in data_files],
+             "rows": sum(pq.ParquetFile(f).metadata.num_rows for f in data_files),  # noqa E501
+             "devices": [_file_stat(f) for f in device_files],
+             "config": _file_stat(inputs["configpath"])}
+    if inputs["formulaepath"]:
+        state["formulae"] = _file_stat(inputs["formulaepath"])
+    return state
+
+
+def input_hashes(inputs):
+    """Function that returns the content hashes of the input files
+    of a test, as returned by `inputs_of_test()`,
+    including files of user-added devices.
+    """
+    data_files, device_files = _input_files(inputs)
+    hashes = {"data": ",".join(file_hash(f) for f in data_files),
+              "devices": ",".join(os.path.basename(f) + ":" + file_hash(f) for f in device_files),  # noqa E501
+              "config": file_hash(inputs["configpath"])}
+    if inputs["formulaepath"]:
+        hashes["formulae"] = file_hash(inputs["formulaepath"])
+    return hashes
+
+
+def discover_tests(patterns):
+    """Function that returns the sorted `.json` files of tests
+    matching glob `patterns`. `**` matches any number of folders.
+
+    `.json` files that are not test settings,
+    like the manifest, are ignored.
+    """
+    json_paths = set()
+    for pattern in patterns:
+        for path in glob.glob(pattern, recursive=True):
+            if os.path.isdir(path):
+                path_list = glob.glob(os.path.join(path, "**", "*.json"), recursive=True)  # noqa E501
+            else:
+                path_list = [path]
+            for json_path in path_list:
+                try:
+                    with open(json_path) as f:
+                        settings = json.load(f)
+                    if "Test Name" in settings and "Config File" in settings:
+                        json_paths.add(os.path.abspath(json_path))
+                except (ValueError, TypeError, OSError):
+                    continue
+    return sorted(json_paths)
+
+
+def process_test(json_path, lazy=False, previous=None):
+    """Function that post processes one test and saves
+    its `_PostProcessed.parquet` file. Runs in a worker process.
+
+    Parameters
+    ----------
+        json_path: str
+            Path to the `.json` file of the test.
+        lazy: bool, optional
+            If `True`, uses `LazyPostProcessData`, so that memory
+            does not depend on the test duration. Default: False
+        previous: dict, optional
+            Result of the test in the manifest. If given, the test is
+            skipped if the content of its input files did not change,
+            for example, if they were only copied. Default: None
+
+    Returns
+    -------
+        dict with `status` ("processed", "skipped" or "failed"),
+        `inputs`, `hashes`, `duration_s`, `output`, `rows`,
+        `formulae_errors` and `error`.
+    """
+    from .PostProcessing import PostProcessData, LazyPostProcessData
+    t_start = time.perf_counter()
+    result = {"status": "failed", "inputs": {}, "hashes": {}, "output": None,
+              "rows": None, "formulae_errors": [], "error": None}
+    try:
+        inputs = inputs_of_test(json_path)
+        # Checked before processing, so that data changed
+        # while processing is processed again on the next run.
+        result["inputs"] = input_state(inputs)
+        result["hashes"] = input_hashes(inputs)
+        if is_unchanged(json_path, previous, result["hashes"]):
+            return dict(previous, status="skipped", inputs=result["inputs"],
+                        duration_s=time.perf_counter() - t_start)
+        files = {key: value for key, value in inputs.items() if value}
+        processor_class = LazyPostProcessData if lazy else PostProcessData
+        processed = processor_class(**files)
+        processed.UpdateData(dump_output=True)
+        result["output"] = processed._ProcessedPath()
+        if lazy:
+            import polars as pl
+            result["rows"] = pl.scan_parquet(result["output"]).select(pl.len()).collect().item()  # noqa E501
+        else:
+            result["rows"] = processed.df_processed.height
+        result["formulae_errors"] = [label + " : " + error + " :: " + error_type for (label, error), error_type in processed.Errors.items()]  # noqa E501
+        result["status"] = "processed"
+    except Exception as e:
+        result["error"] = str(type(e).__name__) + ": " + str(e)
+    result["duration_s"] = time.perf_counter() - t_start
+    return result
+
+
+def load_manifest(manifest_path):
+    """Function that reads a manifest,
+    or returns an empty one if it does not exist or is invalid.
+    """
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get("tests"), dict):
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"tests": {}}
+
+
+def is_unchanged(json_path, previous, hashes=None):
+    """Function that returns `True` if a test was processed
+    with the same input files as now, and its output still exists.
+
+    Files are compared with `input_state()`, without reading them,
+    or, if `hashes` of their content are given, see `input_hashes()`,
+    with the hashes recorded when the test was processed.
+    """
+    if not previous or previous.get("status") not in ["processed", "skipped"]:
+        return False
+    if not previous.get("output") or not os.path.isfile(previous["output"]):
+        return False
+    if hashes is not None:
+        return hashes == previous.get("hashes")
+    try:
+        return input_state(inputs_of_test(json_path)) == previous.get("inputs")
+    except Exception:
+        return False
+
+
+def run_batch(json_paths, manifest_path=manifest_name, workers=None, force=False, lazy=False):  # noqa E501
+    """Function that post processes tests in parallel
+    and writes the manifest.
+
+    Parameters
+    ----------
+        json_paths: list
+            `.json` files of the tests, see `discover_tests()`.
+        manifest_path: str, optional
+            Path to the manifest, also read to skip unchanged tests.
+            Default: `manifest_name`
+        workers: int, optional
+            Number of processes. Default: number of CPUs.
+        force: bool, optional
+            If `True`, unchanged tests are processed too. Default: False
+        lazy: bool, optional
+            See `process_test()`. Default: False
+
+    Returns
+    -------
+        The manifest dict, mapping each test in `tests` to its result,
+        with a `summary` of the counts of tests per status.
+    """
+    manifest = load_manifest(manifest_path)
+    previous_tests = manifest["tests"]
+    results = {}
+    to_process = []
+    for json_path in json_paths:
+        previous = None if force else previous_tests.get(json_path)
+        if is_unchanged(json_path, previous):
+            results[json_path] = dict(previous, status="skipped", duration_s=0.)  # noqa E501
+        else:
+            # Input files are hashed by the workers, and tests
+            # whose files changed on disk only are skipped then.
+            to_process.append((json_path, previous))
+
+    t_start = time.perf_counter()
+    if to_process:
+        # Processes are spawned as on Windows, also on other platforms,
+        # since forking a process running Qt threads can deadlock.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as executor:  # noqa E501
+            futures = {executor.submit(process_test, json_path, lazy, previous): json_path for json_path, previous in to_process}  # noqa E501
+            for future in as_completed(futures):
+                json_path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # For example, a worker process that crashed
+                    result = {"status": "failed", "error": str(type(e).__name__) + ": " + str(e)}  # noqa E501
+                if result["status"] != "skipped":
+                    result["processed_at"] = datetime.now().isoformat()
+                results[json_path] = result
+                print(result["status"].capitalize() + ": " + json_path + " (" + str(round(result.get("duration_s", 0), 2)) + " s)" + ("" if result.get("error") is None else "\n    " + result["error"]))  # noqa E501
+
+    # Tests of earlier runs that were not found this time are kept
+    previous_tests.update(results)
+    statuses = [results[json_path]["status"] for json_path in json_paths]
+    manifest["summary"] = {"date": datetime.now().isoformat(),
+                           "tests": len(json_paths),
+                           "processed": statuses.count("processed"),
+                           "skipped": statuses.count("skipped"),
+                           "failed": statuses.count("failed"),
+                           "duration_s": time.perf_counter() - t_start}
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    """Entry point of the `firepydaq-postprocess` command."""
+    parser = argparse.ArgumentParser(prog="firepydaq-postprocess",
+                                     description="Post process FIREpyDAQ tests in parallel. Tests are found from their .json files, and are skipped if their data, device, config and formulae files did not change since they were last processed.")  # noqa E501
+    parser.add_argument("patterns", nargs="+",
+                        help="Glob patterns or folders of test .json files. Use ** to match any number of folders.")  # noqa E501
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of processes. Default: number of CPUs.")  # noqa E501
+    parser.add_argument("--manifest", default=manifest_name,
+                        help="Path to the manifest. Default: " + manifest_name)  # noqa E501
+    parser.add_argument("--force", action="store_true",
+                        help="Process unchanged tests too.")
+    parser.add_argument("--lazy", action="store_true",
+                        help="Process out of core, for tests that do not fit in memory.")  # noqa E501
+    args = parser.parse_args(argv)
+
+    json_paths = discover_tests(args.patterns)
+    if not json_paths:
+        print("No tests found for " + " ".join(args.patterns))
+        return 1
+    manifest = run_batch(json_paths, args.manifest, args.workers, args.force, args.lazy)  # noqa E501
+    summary = manifest["summary"]
+    print(str(summary["processed"]) + " processed, " + str(summary["skipped"]) + " skipped, " + str(summary["failed"]) + " failed. Manifest: " + args.manifest)  # noqa E501
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
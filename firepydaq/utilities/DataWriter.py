@@ -0,0 +1,763 @@
+##########################################################################
+# FIREpyDAQ - Facilitated Interface for Recording Experiments,
+# a python-package for Data Acquisition.
+# Copyright (C) 2024  Dushyant M. Chaudhari
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#########################################################################
+
+# Data saving related utilities
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pyarrow.parquet as pq
+
+parts_suffix = "_parts"
+""" str
+    Suffix of the directory that holds the row group files of a
+    `.parquet` data file while it is being saved.
+
+    For example, data saved in `Exp1.parquet` is written to
+    `Exp1_parts/part-00000000.parquet`, `Exp1_parts/part-00000001.parquet`,
+    and so on, until saving stops.
+"""
+
+manifest_name = "_manifest.json"
+""" str
+    Name of the manifest file of a `.parquet` directory saved by
+    `PartitionedParquetWriter`.
+
+    The manifest lists the partition files of the directory in order,
+    with their rows and first and last `Time`, see `partition_manifest()`.
+"""
+
+
+def absolute_timestamps(t_start, rel_times):
+    """Function that returns absolute times of samples
+    as a `numpy.datetime64[ns]` array.
+
+    Computed with a single vectorized operation,
+    instead of creating a `datetime` object for every sample.
+
+    Parameters
+    ----------
+        t_start: datetime.datetime
+            Absolute time to which `rel_times` are added.
+        rel_times: numpy array
+            Times in seconds relative to `t_start`.
+    """
+    rel_ns = np.rint(np.asarray(rel_times)*1e9).astype(np.int64)
+    return np.datetime64(t_start, "ns") + rel_ns.astype("timedelta64[ns]")
+
+
+def polars_dt_format(dt_format):
+    """Function that converts a python `strftime` format
+    to the equivalent format for polars.
+
+    Python `%f` (microseconds) is `%6f` for polars,
+    where `%f` would be nanoseconds.
+    """
+    return dt_format.replace("%f", "%6f")
+
+
+def parts_path(parquet_file):
+    """Function that returns the directory where the row group files
+    of `parquet_file` are saved during acquisition.
+    """
+    return parquet_file.split(".parquet")[0] + parts_suffix
+
+
+def chunks_dataframe(chunks, schema, dt_format=None):
+    """Function that converts chunks acquired by
+    `AcquisitionEngine` to a single `polars.DataFrame` to be saved.
+
+    Parameters
+    ----------
+        chunks: list
+            Chunks in acquisition order.
+        schema: dict
+            polars schema of the saved data. Columns are,
+            in order, absolute time, relative time, and NI channels.
+        dt_format: str, optional
+            If given, absolute times are saved as strings in this
+            python `strftime` format. Default: None
+    """
+    frames = []
+    for chunk in chunks:
+        ydata_new = chunk["Data"]
+        if len(ydata_new.shape) == 1:
+            # If a single channel, a list is returned by nidaqmx
+            ydata_new = ydata_new[np.newaxis, :]
+        columns = [pl.Series(chunk["AbsoluteTime"]), chunk["Time"], *ydata_new]  # noqa E501
+        frames.append(pl.DataFrame(dict(zip(schema, columns))))
+    df = pl.concat(frames)
+    if dt_format is not None:
+        abs_col = df.columns[0]
+        df = df.with_columns(pl.col(abs_col).dt.strftime(polars_dt_format(dt_format)))  # noqa E501
+    return df.cast(schema)
+
+
+def device_data_path(parquet_file, device_name):
+    """Function that returns the `.parquet` file where readings of
+    a user-added device are saved along with `parquet_file`.
+
+    Example, readings of `MFC-Propane` for `Exp1.parquet`
+    are saved in `Exp1_MFC-Propane.parquet`.
+    """
+    return parquet_file.split(".parquet")[0] + "_" + device_name + ".parquet"
+
+
+def device_data_files(parquet_file, device_names=None):
+    """Function that returns the files holding readings of
+    user-added devices saved along with `parquet_file`.
+
+    Parameters
+    ----------
+        parquet_file: str
+            Path to the `.parquet` file of NI data.
+        device_names: list, optional
+            Names of the devices, for example from the `Devices`
+            of the test `.json` file. Default: None, devices are found
+            from files named as in `device_data_path()`, except
+            processed data and data of other tests having a `.json` file,
+            like `Exp1_01.parquet` for `Exp1.parquet`.
+
+    Returns
+    -------
+        dict mapping device names to their `.parquet` file,
+        whether saving is finalized or in progress,
+        or to their `.csv` file for tests saved by earlier versions.
+    """
+    stem = parquet_file.split(".parquet")[0]
+    if device_names is None:
+        device_names = set()
+        pattern = glob.escape(stem) + "_*"
+        for path in glob.glob(pattern + ".parquet") + glob.glob(pattern + ".csv") + glob.glob(pattern + parts_suffix):  # noqa E501
+            name = path[len(stem) + 1:]
+            for ext in [".parquet", ".csv", parts_suffix]:
+                if name.endswith(ext):
+                    name = name[:-len(ext)]
+                    break
+            if name and "PostProcessed" not in name and not os.path.isfile(stem + "_" + name + ".json"):  # noqa E501
+                device_names.add(name)
+    files = {}
+    for name in sorted(device_names):
+        path = device_data_path(parquet_file, name)
+        if saved_data_files(path):
+            files[name] = path
+        elif os.path.isfile(path.split(".parquet")[0] + ".csv"):
+            files[name] = path.split(".parquet")[0] + ".csv"
+    return files
+
+
+def read_device_data(path):
+    """Function that reads the readings of a device
+    saved in a file returned by `device_data_files()`.
+
+    Returns
+    -------
+        polars.DataFrame with a `Time` column (`polars.Float64`),
+        on the `Time` axis of NI data, followed by the readings.
+        For `.csv` files of earlier versions, `Time` is the time
+        of the first sample of the NI chunk of each reading.
+    """
+    if path.endswith(".csv"):
+        df = pl.read_csv(path)
+        # Unnamed index written by pandas
+        if "Time" in df.columns:
+            df = df.drop(df.columns[0])
+            df = df.select(["Time"] + [col for col in df.columns if col != "Time"])  # noqa E501
+        else:
+            df = df.rename({df.columns[0]: "Time"})
+    else:
+        df = read_saved_data(path).drop("AbsoluteTime", strict=False)
+    return df.with_columns(pl.col("Time").cast(pl.Float64))
+
+
+def time_zero(chunk):
+    """Function that returns the absolute time at which
+    the relative `Time` of NI data is zero, as `numpy.datetime64[ns]`.
+
+    Parameters
+    ----------
+        chunk: dict
+            Any chunk acquired by `AcquisitionEngine`
+            since relative time was last reset.
+    """
+    return chunk["AbsoluteTime"][0] - np.timedelta64(int(round(chunk["Time"][0]*1e9)), "ns")  # noqa E501
+
+
+def readings_dataframe(times, columns, t_zero):
+    """Function that converts device readings, buffered by an
+    `AlicatPoller`, to a `polars.DataFrame` to be saved.
+
+    Columns are, in order, `AbsoluteTime` (`polars.Datetime("ns")`,
+    local time like NI absolute times), `Time` (`polars.Float64`),
+    in seconds on the same axis as the `Time` of NI data,
+    and values of the readings. Integer values and values that are
+    all missing are saved as `polars.Float64`, so that all batches
+    of a device have the same schema.
+
+    Parameters
+    ----------
+        times: list
+            Times of the readings, as returned by `time.time_ns()`.
+        columns: dict
+            Maps keys of the readings to lists of values.
+        t_zero: numpy.datetime64
+            Absolute time at which NI `Time` is zero, see `time_zero()`.
+    """
+    utc_offset = datetime.now().astimezone().utcoffset() // timedelta(microseconds=1) * 1000  # noqa E501
+    abs_times = (np.asarray(times, dtype=np.int64) + utc_offset).astype("datetime64[ns]")  # noqa E501
+    rel_times = (abs_times - np.datetime64(t_zero, "ns")).astype(np.int64)/1e9  # noqa E501
+    df = pl.DataFrame([pl.Series("AbsoluteTime", abs_times), pl.Series("Time", rel_times)] +  # noqa E501
+                      [pl.Series(key, column, strict=False) for key, column in columns.items()])  # noqa E501
+    return df.with_columns(pl.col(pl.Int64, pl.Null).cast(pl.Float64))
+
+
+def part_file(parts_dir, n):
+    """Function that returns the path of the `n`th row group file
+    in `parts_dir`.
+    """
+    return parts_dir + os.sep + "part-" + str(n).rjust(8, "0") + ".parquet"
+
+
+def _part_index(path):
+    # Chunk index of a row group file named by `part_file()`
+    return int(os.path.basename(path)[5:13])
+
+
+def partition_manifest(parquet_file):
+    """Function that returns the partitions of a `.parquet` directory
+    saved by `PartitionedParquetWriter`, as listed in its manifest.
+
+    Returns
+    -------
+        List of dicts, in order, with `file` (name in the directory),
+        `first_chunk` and `chunks` (chunk indices saved in the partition,
+        one row group per chunk), `rows`, `bytes`, `time_min` and
+        `time_max` (smallest and largest `Time`, in s, None if no rows),
+        and `absolute_time_start` and `absolute_time_end`
+        (absolute time of the first and last rows, as strings).
+        An empty list if `parquet_file` is not partitioned.
+    """
+    path = os.path.join(parquet_file, manifest_name)
+    if not os.path.isfile(path):
+        return []
+    with open(path) as f:
+        return json.load(f)["partitions"]
+
+
+def _in_time_range(partitions, time_range):
+    # Partitions having rows with `Time` in `time_range`
+    if time_range is None:
+        return partitions
+    t_start, t_end = time_range
+    selected = []
+    for partition in partitions:
+        if partition["time_min"] is not None:
+            if t_start is not None and partition["time_max"] < t_start:
+                continue
+            if t_end is not None and partition["time_min"] > t_end:
+                continue
+        selected.append(partition)
+    return selected
+
+
+def _filter_time(frame, time_range):
+    # Rows of a DataFrame or LazyFrame with `Time` in `time_range`
+    if time_range is None:
+        return frame
+    t_start, t_end = time_range
+    if t_start is not None:
+        frame = frame.filter(pl.col("Time") >= t_start)
+    if t_end is not None:
+        frame = frame.filter(pl.col("Time") <= t_end)
+    return frame
+
+
+def saved_data_files(parquet_file, time_range=None):
+    """Function that returns the list of files that
+    hold the data saved for `parquet_file`.
+
+    Parameters
+    ----------
+        parquet_file: str
+            Path to the `.parquet` data file, or directory.
+        time_range: tuple, optional
+            (start, end) relative times (s), either can be None.
+            Partitions of a `.parquet` directory having no rows
+            in this range are left out. Default: None, all files.
+
+    Returns
+    -------
+        [`parquet_file`] if saving has been finalized in a single file,
+        partition files of a `.parquet` directory, see
+        `PartitionedParquetWriter`, followed by sorted row group files
+        not yet in a partition if saving is in progress,
+        or an empty list if no data has been saved yet.
+    """
+    if os.path.isfile(parquet_file):
+        return [parquet_file]
+    # Listed before the manifest is read, so that row group files
+    # rolled into a partition meanwhile are left out below.
+    parts = sorted(glob.glob(parts_path(parquet_file) + os.sep + "part-*.parquet"))  # noqa E501
+    partitions = partition_manifest(parquet_file)
+    files = [os.path.join(parquet_file, p["file"]) for p in _in_time_range(partitions, time_range)]  # noqa E501
+    first_chunk = sum(p["chunks"] for p in partitions)
+    return files + [part for part in parts if _part_index(part) >= first_chunk]  # noqa E501
+
+
+def read_saved_data(parquet_file, time_range=None):
+    """Function that reads the data saved for `parquet_file`
+    as a `polars.DataFrame`, whether saving is finalized or in progress.
+
+    If `time_range` is given, only rows with `Time` in the range
+    are returned, see `saved_data_files()`.
+
+    If no data is found, `polars.read_parquet` is called on
+    `parquet_file` to raise the usual error.
+    """
+    files = saved_data_files(parquet_file, time_range)
+    if not files:
+        return pl.read_parquet(parquet_file)
+    return _filter_time(pl.concat([pl.read_parquet(f) for f in files]), time_range)  # noqa E501
+
+
+def file_hash(path):
+    """Function that returns the sha256 hash of the content of a file,
+    read in blocks so that large data files are not held in memory.
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def scan_saved_data(parquet_file, time_range=None):
+    """Function that lazily scans the data saved for `parquet_file`
+    as a `polars.LazyFrame`, whether saving is finalized or in progress.
+
+    Nothing is read until the query is collected or sunk,
+    and only the columns and row groups needed by the query are read.
+    If `time_range` is given, only rows with `Time` in the range
+    are kept, and partitions of a `.parquet` directory outside
+    the range are not opened at all, see `saved_data_files()`.
+    """
+    files = saved_data_files(parquet_file, time_range)
+    return _filter_time(pl.scan_parquet(files if files else parquet_file), time_range)  # noqa E501
+
+
+class SavedDataReader():
+    """A reader that returns only the rows of a `.parquet` file
+    saved since it was last read.
+
+    Works whether saving is in progress (row group files)
+    or finalized (single `.parquet` file), and across the switch
+    from one to the other when saving stops.
+    While saving is in progress, only new row group files are read,
+    so the cost of a read depends only on the number of new rows.
+
+    Also works for a `.parquet` directory saved by
+    `PartitionedParquetWriter`, where rows are read from
+    row group files, or from the partition they were rolled into.
+
+    Parameters
+    ----------
+        parquet_file: str
+            Path to the `.parquet` file where the data is saved.
+        rows_read: int, optional
+            Number of first rows to skip, for example,
+            rows already processed. Default: 0
+
+    Attributes
+    ----------
+        rows_read: int
+            Number of rows read so far.
+    """
+    def __init__(self, parquet_file, rows_read=0):
+        self.parquet_file = parquet_file
+        self.parts_dir = parts_path(parquet_file)
+        self.rows_read = rows_read
+        self._chunks_read = 0
+        self._skip_rows = 0
+        self._partitions = []
+        if rows_read and not os.path.isfile(parquet_file):
+            # Partitions and row group files holding
+            # only skipped rows are not read
+            rows = 0
+            for partition in partition_manifest(parquet_file):
+                if rows + partition["rows"] > rows_read:
+                    break
+                rows += partition["rows"]
+                self._chunks_read += partition["chunks"]
+            part = part_file(self.parts_dir, self._chunks_read)
+            while os.path.isfile(part):
+                try:
+                    part_rows = pq.ParquetFile(part).metadata.num_rows
+                except OSError:
+                    break
+                if rows + part_rows > rows_read:
+                    break
+                rows += part_rows
+                self._chunks_read += 1
+                part = part_file(self.parts_dir, self._chunks_read)
+            self._skip_rows = rows_read - rows
+
+    def _find_partition(self):
+        # Partition holding the next chunk, the manifest
+        # is read again only if it is not known yet
+        for reload in [False, True]:
+            if reload:
+                self._partitions = partition_manifest(self.parquet_file)
+            for partition in self._partitions:
+                first_chunk = partition["first_chunk"]
+                if first_chunk <= self._chunks_read < first_chunk + partition["chunks"]:  # noqa E501
+                    return partition
+        return None
+
+    def _read_chunks(self):
+        # Rows of the next chunks, and the number of chunks read
+        part = part_file(self.parts_dir, self._chunks_read)
+        if os.path.isfile(part):
+            return pl.read_parquet(part), 1
+        partition = self._find_partition()
+        if partition is None:
+            return None, 0
+        # One row group per chunk
+        first_group = self._chunks_read - partition["first_chunk"]
+        parquet = pq.ParquetFile(os.path.join(self.parquet_file, partition["file"]))  # noqa E501
+        table = parquet.read_row_groups(range(first_group, parquet.num_row_groups))  # noqa E501
+        return pl.from_arrow(table), partition["chunks"] - first_group
+
+    def read_new(self):
+        """Method that returns the rows saved since the last call.
+
+        Returns
+        -------
+            polars.DataFrame, which has no rows if nothing new was saved.
+        """
+        new_frames = []
+        if os.path.isfile(self.parquet_file):
+            n_rows = pq.ParquetFile(self.parquet_file).metadata.num_rows
+            if n_rows > self.rows_read:
+                new_frames.append(pl.scan_parquet(self.parquet_file).slice(self.rows_read).collect())  # noqa E501
+        else:
+            while True:
+                try:
+                    new_data, n_chunks = self._read_chunks()
+                except OSError:
+                    # Saving was finalized, or row group files were
+                    # rolled into a partition, while reading.
+                    # Remaining rows are read next time.
+                    break
+                if new_data is None:
+                    break
+                new_frames.append(new_data.slice(self._skip_rows))
+                self._skip_rows = max(self._skip_rows - new_data.height, 0)
+                self._chunks_read += n_chunks
+        if not new_frames:
+            return pl.DataFrame()
+        new_data = pl.concat(new_frames)
+        self.rows_read += new_data.height
+        return new_data
+
+
+class StreamingParquetWriter():
+    """An append-only writer that saves NI data chunks
+    to a `.parquet` file during acquisition.
+
+    Each chunk passed to `write()` is saved as a single row group file
+    under `parts_path(parquet_file)`, so the cost of saving
+    a chunk depends only on the chunk size and not on the test duration.
+    Row group files are written atomically, so they can be read
+    by the dashboard while acquisition is running.
+
+    `close()` merges all row group files into `parquet_file`
+    (one row group per chunk) and removes the row group directory.
+
+    Parameters
+    ----------
+        parquet_file: str
+            Path to the `.parquet` file where the data is finally saved.
+        schema: dict
+            polars schema of the saved data.
+            Example, {"AbsoluteTime": pl.String, "Time": pl.Float32, ...}
+
+    Attributes
+    ----------
+        chunks_written: int
+            Number of chunks (row groups) written so far.
+        rows_written: int
+            Number of rows written so far.
+    """
+    def __init__(self, parquet_file, schema):
+        self.parquet_file = parquet_file
+        self.parts_dir = parts_path(parquet_file)
+        self.schema = schema
+        self.chunks_written = 0
+        self.rows_written = 0
+        self.closed = False
+        self._lock = threading.Lock()
+
+        os.makedirs(self.parts_dir, exist_ok=True)
+        existing_parts = saved_data_files(parquet_file)
+        if os.path.isfile(parquet_file):
+            # Data saved previously in the same file is kept as first part.
+            os.replace(parquet_file, self._part_name(0))
+            existing_parts = [self._part_name(0)]
+        for part in existing_parts:
+            self.rows_written += pq.ParquetFile(part).metadata.num_rows
+        self.chunks_written = len(existing_parts)
+
+    def _part_name(self, n):
+        return part_file(self.parts_dir, n)
+
+    def write(self, df):
+        """Method to append a chunk of data as a row group
+
+        Parameters
+        ----------
+            df: polars.DataFrame
+                Chunk of data having the writer `schema`.
+        """
+        with self._lock:
+            if self.closed:
+                raise ValueError("Cannot write to a closed file: " + self.parquet_file)  # noqa E501
+            part = self._part_name(self.chunks_written)
+            df.cast(self.schema).write_parquet(part + ".tmp")
+            os.replace(part + ".tmp", part)
+            self.chunks_written += 1
+            self.rows_written += df.height
+
+    def close(self):
+        """Method to finalize the `.parquet` file.
+
+        Row group files are streamed one at a time into `parquet_file`,
+        so the whole dataset is never held in memory.
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            parts = saved_data_files(self.parquet_file)
+            if parts:
+                arrow_schema = pl.DataFrame(schema=self.schema).to_arrow().schema  # noqa E501
+                tmp_file = self.parquet_file + ".tmp"
+                with pq.ParquetWriter(tmp_file, arrow_schema) as writer:
+                    for part in parts:
+                        writer.write_table(pq.read_table(part).cast(arrow_schema))  # noqa E501
+                os.replace(tmp_file, self.parquet_file)
+            shutil.rmtree(self.parts_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def write_partition(parquet_file, partitions, tables, first_chunk, arrow_schema=None):  # noqa E501
+    """Function that saves row groups as the next partition of
+    a `.parquet` directory, and adds it to the manifest.
+
+    The partition file and the manifest are written atomically,
+    the manifest last, so readers only see complete partitions.
+
+    Parameters
+    ----------
+        parquet_file: str
+            Path to the `.parquet` directory.
+        partitions: list
+            Partitions already in the manifest, see
+            `partition_manifest()`. The new partition is appended.
+        tables: iterable
+            `pyarrow.Table` of each chunk, in order,
+            saved as one row group each.
+        first_chunk: int
+            Index of the first chunk of `tables`.
+        arrow_schema: pyarrow.Schema, optional
+            Schema of the saved data. Default: schema of the first table.
+
+    Returns
+    -------
+        dict, the manifest entry of the partition.
+    """
+    path = part_file(parquet_file, len(partitions))
+    entry = {"file": os.path.basename(path), "first_chunk": first_chunk,
+             "chunks": 0, "rows": 0, "bytes": 0,
+             "time_min": None, "time_max": None,
+             "absolute_time_start": None, "absolute_time_end": None}
+    writer = None
+    try:
+        for table in tables:
+            if writer is None:
+                arrow_schema = arrow_schema or table.schema
+                writer = pq.ParquetWriter(path + ".tmp", arrow_schema)
+            table = table.cast(arrow_schema)
+            # One row group per chunk, so that `SavedDataReader`
+            # finds chunks by their index
+            writer.write_table(table, row_group_size=max(table.num_rows, 1))  # noqa E501
+            entry["chunks"] += 1
+            entry["rows"] += table.num_rows
+            if table.num_rows:
+                times = pl.from_arrow(table["Time"])
+                t_min, t_max = float(times.min()), float(times.max())
+                abs_times = table[table.column_names[0]]
+                if entry["time_min"] is None:
+                    entry.update(time_min=t_min, time_max=t_max,
+                                 absolute_time_start=str(abs_times[0].as_py()))  # noqa E501
+                entry["time_min"] = min(entry["time_min"], t_min)
+                entry["time_max"] = max(entry["time_max"], t_max)
+                entry["absolute_time_end"] = str(abs_times[-1].as_py())
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        return None
+    os.replace(path + ".tmp", path)
+    entry["bytes"] = os.path.getsize(path)
+    partitions.append(entry)
+    manifest = os.path.join(parquet_file, manifest_name)
+    with open(manifest + ".tmp", "w") as f:
+        json.dump({"partitions": partitions}, f, indent=1)
+    os.replace(manifest + ".tmp", manifest)
+    return entry
+
+
+class PartitionedParquetWriter(StreamingParquetWriter):
+    """A `StreamingParquetWriter` that saves the data of a test
+    in a `.parquet` directory of partition files, for very long tests.
+
+    Chunks are written to row group files as by
+    `StreamingParquetWriter`. Once the row group files span
+    `partition_seconds` of `Time`, or `partition_bytes` on disk,
+    they are rolled into the next partition file,
+    `<test>.parquet/part-00000000.parquet`,
+    `<test>.parquet/part-00000001.parquet`, and so on.
+    `close()` rolls the remaining row group files,
+    so the cost of finalizing does not depend on the test duration.
+
+    Partitions are listed in `<test>.parquet/_manifest.json`
+    with their first and last `Time`, so that readers only open the
+    partitions of the time range they need, see `scan_saved_data()`.
+    The directory can also be read by other Parquet readers,
+    like `polars.scan_parquet("<test>.parquet/*.parquet")`
+    or `pyarrow.dataset`, which ignores the manifest.
+
+    Parameters
+    ----------
+        parquet_file: str
+            Path to the `.parquet` directory where the data is saved.
+        schema: dict
+            polars schema of the saved data.
+        partition_seconds: float, optional
+            Duration of `Time` saved in each partition. Default: None
+        partition_bytes: int, optional
+            Approximate size of each partition. Default: None.
+            If neither is given, all data is saved in a single partition.
+
+    Attributes
+    ----------
+        partitions: list
+            Manifest entries of the partitions saved so far,
+            see `partition_manifest()`.
+    """
+    def __init__(self, parquet_file, schema, partition_seconds=None, partition_bytes=None):  # noqa E501
+        self.parquet_file = parquet_file
+        self.parts_dir = parts_path(parquet_file)
+        self.schema = schema
+        self.partition_seconds = partition_seconds
+        self.partition_bytes = partition_bytes
+        self.closed = False
+        self._lock = threading.Lock()
+        self._arrow_schema = pl.DataFrame(schema=schema).to_arrow().schema
+
+        os.makedirs(self.parts_dir, exist_ok=True)
+        if os.path.isfile(parquet_file):
+            # Data saved previously in a single file is kept as first part.
+            os.replace(parquet_file, self._part_name(0))
+        os.makedirs(parquet_file, exist_ok=True)
+        self.partitions = partition_manifest(parquet_file)
+        self._first_pending = sum(p["chunks"] for p in self.partitions)
+        self.rows_written = sum(p["rows"] for p in self.partitions)
+        self.chunks_written = self._first_pending
+        self._pending_bytes = 0
+        self._pending_time_min = None
+        for part in sorted(glob.glob(self.parts_dir + os.sep + "part-*.parquet")):  # noqa E501
+            if _part_index(part) < self._first_pending:
+                # Already rolled into a partition
+                os.remove(part)
+                continue
+            df = pl.read_parquet(part, columns=["Time"])
+            self._add_pending(part, df)
+            self.rows_written += df.height
+            self.chunks_written += 1
+
+    def _add_pending(self, part, df):
+        self._pending_bytes += os.path.getsize(part)
+        if df.height and self._pending_time_min is None:
+            self._pending_time_min = df["Time"].min()
+
+    def write(self, df):
+        """Method to append a chunk of data as a row group,
+        and roll row group files into a partition when it is full.
+
+        Parameters
+        ----------
+            df: polars.DataFrame
+                Chunk of data having the writer `schema`.
+        """
+        super().write(df)
+        with self._lock:
+            self._add_pending(self._part_name(self.chunks_written - 1), df)
+            if self._pending_time_min is not None and self.partition_seconds is not None:  # noqa E501
+                if df["Time"].max() - self._pending_time_min >= self.partition_seconds:  # noqa E501
+                    self._roll()
+                    return
+            if self.partition_bytes is not None and self._pending_bytes >= self.partition_bytes:  # noqa E501
+                self._roll()
+
+    def _roll(self):
+        # Rolls row group files into a partition, then removes them
+        parts = [self._part_name(n) for n in range(self._first_pending, self.chunks_written)]  # noqa E501
+        if not parts:
+            return
+        write_partition(self.parquet_file, self.partitions,
+                        (pq.read_table(part) for part in parts),
+                        self._first_pending, self._arrow_schema)
+        for part in parts:
+            os.remove(part)
+        self._first_pending = self.chunks_written
+        self._pending_bytes = 0
+        self._pending_time_min = None
+
+    def close(self):
+        """Method to roll the remaining row group files
+        into a partition, and remove the row group directory.
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._roll()
+            shutil.rmtree(self.parts_dir, ignore_errors=True)
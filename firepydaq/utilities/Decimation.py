@@ -0,0 +1,232 @@
+##########################################################################
+# FIREpyDAQ - Facilitated Interface for Recording Experiments,
+# a python-package for Data Acquisition.
+# Copyright (C) 2024  Dushyant M. Chaudhari
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#########################################################################
+
+# Downsampling of series for plotting
+import numpy as np
+
+from .RingBuffer import RingBuffer
+
+points_per_pixel = 2
+""" int
+    Number of points kept per horizontal screen pixel
+    when a series is decimated for plotting.
+"""
+
+
+def points_for_width(width):
+    """Function that returns the number of points to plot
+    on a plot `width` pixels wide.
+    """
+    return points_per_pixel*max(int(width), 1)
+
+
+def minmax_decimate(x, y, n_out):
+    """Function that reduces a series to at most `n_out` points,
+    keeping the minimum and maximum of each bucket of samples.
+
+    Peaks and dips are therefore always plotted,
+    whichever the number of samples in the series.
+
+    Parameters
+    ----------
+        x: numpy array
+            x values, for example, relative time
+        y: numpy array
+            y values
+        n_out: int
+            Maximum number of points returned.
+
+    Returns
+    -------
+        (x, y) numpy arrays of the decimated series, in the original order.
+        The original arrays are returned if they have `n_out`
+        points or fewer.
+    """
+    y = np.asarray(y)
+    n = len(y)
+    if n <= n_out or n_out < 2:
+        return x, y
+    n_buckets = n_out//2
+    bucket_size = int(np.ceil(n/n_buckets))
+    n_full = n//bucket_size
+    buckets = y[:n_full*bucket_size].reshape(n_full, bucket_size)
+    offsets = np.arange(n_full)*bucket_size
+    i_min = buckets.argmin(axis=1) + offsets
+    i_max = buckets.argmax(axis=1) + offsets
+    if n_full*bucket_size < n:
+        # Last bucket with fewer samples
+        last = y[n_full*bucket_size:]
+        i_min = np.append(i_min, last.argmin() + n_full*bucket_size)
+        i_max = np.append(i_max, last.argmax() + n_full*bucket_size)
+    indices = np.sort(np.stack([i_min, i_max], axis=1), axis=1).ravel()
+    return np.asarray(x)[indices], y[indices]
+
+
+def lttb_decimate(x, y, n_out):
+    """Function that reduces a series to `n_out` points
+    using the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are kept. For each bucket of samples,
+    the point forming the largest triangle with the point kept
+    in the previous bucket and the mean of the next bucket is kept.
+    This preserves the visual shape of the series with fewer
+    points than `minmax_decimate`, at a higher computational cost.
+
+    Parameters
+    ----------
+        x: numpy array
+            x values, for example, relative time
+        y: numpy array
+            y values
+        n_out: int
+            Number of points returned.
+
+    Returns
+    -------
+        (x, y) numpy arrays of the decimated series.
+        The original arrays are returned if they have `n_out`
+        points or fewer.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    edges = np.append(edges, n)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i+1]
+        next_start, next_end = edges[i+1], edges[i+2]
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x)*(y[start:end] - y[a]) -
+                      (x[a] - x[start:end])*(avg_y - y[a]))
+        a = start + int(area.argmax())
+        indices[i+1] = a
+    return x[indices], y[indices]
+
+
+def decimate(x, y, n_out, method="minmax"):
+    """Function that reduces a series to about `n_out` points for plotting.
+
+    Parameters
+    ----------
+        x: numpy array
+            x values
+        y: numpy array
+            y values
+        n_out: int
+            Maximum number of points returned.
+            Use `points_for_width()` to get it from the plot width.
+        method: str, optional
+            "minmax" (Default): `minmax_decimate()`
+            "lttb": `lttb_decimate()`
+    """
+    if method == "minmax":
+        return minmax_decimate(x, y, n_out)
+    elif method == "lttb":
+        return lttb_decimate(x, y, n_out)
+    raise ValueError("Unknown decimation method: " + str(method))
+
+
+class MinMaxHistory():
+    """Running min-max decimation of a multichannel series.
+
+    Samples are reduced as they are appended, in buckets of
+    `bucket_size` samples of which the minimum and maximum are kept,
+    so that a long history is plotted from at most `2 x n_buckets`
+    points per channel without reading the raw samples again.
+    Samples of the last, incomplete bucket are kept as they are
+    until the bucket is full.
+
+    Parameters
+    ----------
+        n_channels: int
+            Number of channels.
+        n_buckets: int
+            Number of buckets held. Older buckets are overwritten.
+        bucket_size: int
+            Number of samples per bucket.
+            With 1, samples are kept without reduction.
+
+    Attributes
+    ----------
+        total_samples: int
+            Number of samples per channel appended since
+            the history was created or reset.
+    """
+    def __init__(self, n_channels, n_buckets, bucket_size):
+        self.n_channels = n_channels
+        self.bucket_size = max(int(bucket_size), 1)
+        points = n_buckets if self.bucket_size == 1 else 2*n_buckets
+        self.x = RingBuffer(n_channels, points)
+        self.y = RingBuffer(n_channels, points)
+        self.reset()
+
+    def reset(self):
+        """Method to empty the history.
+        """
+        self.x.reset()
+        self.y.reset()
+        self._x_pending = np.empty(0)
+        self._y_pending = np.empty((self.n_channels, 0))
+        self.total_samples = 0
+
+    def append(self, x, y):
+        """Method to reduce and append samples.
+
+        Parameters
+        ----------
+            x: numpy array
+                x values of shape (n,), for example, relative time
+            y: numpy array
+                y values of shape (`n_channels`, n)
+        """
+        x = np.concatenate([self._x_pending, x])
+        y = np.concatenate([self._y_pending, np.asarray(y).reshape(self.n_channels, -1)], axis=1)  # noqa E501
+        self.total_samples += len(x) - len(self._x_pending)
+        size = self.bucket_size
+        n_full = len(x)//size
+        if size == 1:
+            self.x.append(np.broadcast_to(x, y.shape))
+            self.y.append(y)
+        elif n_full:
+            buckets = y[:, :n_full*size].reshape(self.n_channels, n_full, size)  # noqa E501
+            offsets = (np.arange(n_full)*size)[None, :, None]
+            indices = np.sort(np.stack([buckets.argmin(axis=2), buckets.argmax(axis=2)], axis=2), axis=2) + offsets  # noqa E501
+            indices = indices.reshape(self.n_channels, 2*n_full)
+            self.x.append(x[indices])
+            self.y.append(np.take_along_axis(y, indices, axis=1))
+        self._x_pending = x[n_full*size:]
+        self._y_pending = y[:, n_full*size:]
+
+    def channel(self, index):
+        """Method that returns the reduced history of one channel,
+        followed by the samples of the incomplete bucket.
+
+        Returns
+        -------
+            (x, y) numpy arrays, in the order of the samples.
+        """
+        return (np.concatenate([self.x.channel(index), self._x_pending]),
+                np.concatenate([self.y.channel(index), self._y_pending[index]]))  # noqa E501
@@ -0,0 +1,346 @@
+##########################################################################
+# FIREpyDAQ - Facilitated Interface for Recording Experiments,
+# a python-package for Data Acquisition.
+# Copyright (C) 2024  Dushyant M. Chaudhari
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#########################################################################
+
+import ast
+import builtins
+
+import numpy as np
+import polars as pl
+
+from .DAQUtils import Formulae_dict
+from .ErrorUtils import firepydaq_logger
+
+skip_charts = ["Intermediate", "Constant", "None"]
+""" list
+    Values of the `Chart` column in the formulae file
+    for which results are not added to the processed data.
+"""
+
+lazy_functions = {"sqrt", "exp", "log", "log10", "log1p", "abs", "sign",
+                  "cbrt", "floor", "ceil", "sin", "cos", "tan", "arcsin",
+                  "arccos", "arctan", "sinh", "cosh", "tanh"}
+""" set
+    Names of element-wise functions that, applied to a column
+    in a formula, are evaluated by the native `polars.Expr` method
+    of the same name in lazy queries.
+"""
+
+lazy_combinations = {"maximum": pl.max_horizontal, "fmax": pl.max_horizontal,
+                     "minimum": pl.min_horizontal, "fmin": pl.min_horizontal,
+                     "where": lambda condition, x, y: pl.when(condition).then(x).otherwise(y),  # noqa E501
+                     "clip": lambda x, lower, upper: x.clip(lower, upper),
+                     "power": lambda x, y: x.pow(y)}
+""" dict
+    Maps names of element-wise numpy functions of several arguments,
+    like `np.maximum(HRR, 0)`, to the equivalent polars expressions,
+    used when any argument is a column in lazy queries.
+"""
+
+
+def _lazy_function(function):
+    """Wraps a function of the formulae namespace for lazy queries.
+
+    Applied to a `polars.Expr`, functions in `lazy_functions` and
+    `lazy_combinations` return the native polars expression.
+    Other functions raise `TypeError`,
+    so that the formula is evaluated on data instead.
+    """
+    name = getattr(function, "__name__", "")
+    name = "abs" if name == "absolute" else name
+
+    def wrapper(*args, **kwargs):
+        if not any(isinstance(arg, pl.Expr) for arg in args):
+            return function(*args, **kwargs)
+        if name in lazy_functions and len(args) == 1 and not kwargs:
+            return getattr(args[0], name)()
+        if name in lazy_combinations and not kwargs:
+            return lazy_combinations[name](*[arg if isinstance(arg, pl.Expr) else pl.lit(arg) for arg in args])  # noqa E501
+        raise TypeError(name + " of a column cannot be added to a lazy query")  # noqa E501
+    return wrapper
+
+
+class _LazyNumpy():
+    """`np` in the namespace of formulae of lazy queries,
+    so that formulae using `np.` functions directly
+    get native polars expressions.
+    """
+    def __getattr__(self, name):
+        attribute = getattr(np, name)
+        return _lazy_function(attribute) if callable(attribute) else attribute
+
+
+class CompiledFormulae():
+    """Formulae of a formulae file, parsed and compiled once
+    for repeated evaluation.
+
+    Each formula (`Label` = `RHS`) is parsed with `ast`
+    and compiled to a code object. Variables are resolved
+    to data columns, to other formulae, or to functions of
+    `Formulae_dict`, and formulae are ordered so that each one
+    is evaluated after the formulae it uses.
+    Unknown variables, syntax errors and circular definitions
+    are reported in `errors` at compile time,
+    and formulae having errors, or using formulae with errors,
+    are not evaluated.
+
+    Parameters
+    ----------
+        formulae: polars.DataFrame
+            Formulae file with `Label`, `RHS` and `Chart` columns.
+        columns: list
+            Names of the data columns available to the formulae.
+        functions: dict, optional
+            Map of function names used in formulae to numpy functions.
+            Default: `Formulae_dict`
+
+    Attributes
+    ----------
+        errors: dict
+            Maps (label, error) to the error type,
+            as in `PostProcessData.Errors`.
+        order: list
+            Labels in the order in which formulae are evaluated.
+        values: dict
+            Maps each label to its value from the last evaluation.
+        aggregates: set
+            Labels of formulae that give a single value computed from
+            data columns, for example, a baseline `mean(DuctO2[:500])`.
+    """
+    def __init__(self, formulae, columns, functions=None):
+        self.columns = list(columns)
+        self.errors = {}
+        self.values = {}
+        self.aggregates = set()
+        self._namespace = {"np": np}
+        for name, function in (Formulae_dict if functions is None else functions).items():  # noqa E501
+            try:
+                self._namespace[name] = eval(function, {"np": np})
+            except Exception:
+                continue
+
+        self._formulae = []
+        for row in formulae.iter_rows(named=True):
+            self._formulae.append(self._compile(row["Label"].strip(),
+                                                row["RHS"].strip(),
+                                                str(row["Chart"]).strip()))
+        self._resolve()
+        self.order = []
+        state = {}
+        for i in range(len(self._formulae)):
+            self._visit(i, state)
+
+    def _compile(self, label, rhs, chart):
+        formula = {"label": label, "rhs": rhs, "chart": chart,
+                   "code": None, "names": set(), "deps": [],
+                   "columns": set(), "uses_data": False, "failed": False}
+        try:
+            tree = ast.parse(rhs, mode="eval")
+            formula["code"] = compile(tree, "<" + label + ">", "eval")
+        except SyntaxError as e:
+            self._error(formula, rhs, e)
+            return formula
+        formula["names"] = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}  # noqa E501
+        return formula
+
+    def _error(self, formula, error, error_type):
+        formula["failed"] = True
+        if isinstance(error_type, Exception):
+            error_type = type(error_type)
+        self.errors[(formula["label"], str(error))] = str(error_type)
+
+    def _resolve(self):
+        # Variables are resolved to the latest preceding formula
+        # with that label, else to the first following one.
+        definitions = {}
+        for i, formula in enumerate(self._formulae):
+            definitions.setdefault(formula["label"], []).append(i)
+        for i, formula in enumerate(self._formulae):
+            for name in sorted(formula["names"]):
+                if name in definitions:
+                    before = [j for j in definitions[name] if j < i]
+                    after = [j for j in definitions[name] if j > i]
+                    if before or after:
+                        formula["deps"].append(before[-1] if before else after[0])  # noqa E501
+                        continue
+                if name in self.columns:
+                    formula["columns"].add(name)
+                elif name not in self._namespace and not hasattr(builtins, name):  # noqa E501
+                    self._error(formula, "Variable " + name + " does not exist in the data or formulae", NameError)  # noqa E501
+
+    def _visit(self, i, state):
+        """Depth first ordering of formula `i` after its dependencies.
+        Returns `False` if the formula cannot be evaluated.
+        """
+        formula = self._formulae[i]
+        if state.get(i) == "done":
+            return not formula["failed"]
+        if state.get(i) == "visiting":
+            self._error(formula, "Circular definition of " + formula["label"], RecursionError)  # noqa E501
+            return False
+        state[i] = "visiting"
+        uses_data = bool(formula["columns"])
+        for j in formula["deps"]:
+            if not self._visit(j, state) and not formula["failed"]:
+                self._error(formula, "Uses " + self._formulae[j]["label"] + " which has errors", NameError)  # noqa E501
+            uses_data = uses_data or self._formulae[j]["uses_data"]
+        formula["uses_data"] = uses_data
+        state[i] = "done"
+        if not formula["failed"]:
+            self.order.append(i)
+        return not formula["failed"]
+
+    @property
+    def labels(self):
+        """Labels of formulae without errors, in evaluation order."""
+        return [self._formulae[i]["label"] for i in self.order]
+
+    def evaluate(self, df, labels=None):
+        """Method that evaluates the formulae on a data frame.
+
+        Data columns are passed to formulae as numpy arrays,
+        without copying when possible.
+
+        Parameters
+        ----------
+            df: polars.DataFrame
+                Scaled data
+            labels: list, optional
+                Labels of the formulae to evaluate.
+                Other formulae keep their value from the last evaluation.
+                Default: None, all formulae are evaluated.
+
+        Returns
+        -------
+            `df` with a column added for each formula that gives an array,
+            unless its `Chart` is in `skip_charts`.
+        """
+        namespace = dict(self._namespace)
+        namespace.update(self.values)
+        new_columns = []
+        for i in self.order:
+            formula = self._formulae[i]
+            label = formula["label"]
+            if labels is not None and label not in labels:
+                continue
+            try:
+                for col in formula["columns"]:
+                    if col not in namespace:
+                        namespace[col] = df[col].to_numpy()
+                value = eval(formula["code"], namespace)
+            except Exception as e:
+                self.errors[(label, str(e))] = str(type(e))
+                namespace.pop(label, None)
+                self.values.pop(label, None)
+                continue
+            namespace[label] = value
+            self.values[label] = value
+            if not isinstance(value, np.ndarray):
+                if formula["uses_data"]:
+                    self.aggregates.add(label)
+                continue
+            if formula["chart"] in skip_charts:
+                continue
+            if len(value) != df.height:
+                self.errors[(label, "Length " + str(len(value)) + " differs from data length " + str(df.height))] = str(ValueError)  # noqa E501
+                continue
+            new_columns.append(pl.Series(label, value))
+        return df.with_columns(new_columns)
+
+    def evaluate_lazy(self, lf):
+        """Method that adds the formulae to a lazy query.
+
+        Formulae are evaluated with `polars.Expr` in place of data columns,
+        so that those giving a value per row become expressions of the
+        query plan, evaluated in batches when the query runs.
+        Formulae that cannot be expressed this way, like the
+        baseline `mean(DuctO2[:500])`, are evaluated with numpy
+        on the columns they use only, read when this method is called.
+        If such a formula gives a value per row, like `np.cumsum(HRR)`,
+        its values for all rows are held in memory, and a warning
+        is logged.
+        Values of formulae that give a single value are in `values`.
+
+        Parameters
+        ----------
+            lf: polars.LazyFrame
+                Scaled data
+
+        Returns
+        -------
+            `lf` with a column added for each formula that gives a value
+            per row, unless its `Chart` is in `skip_charts`.
+        """
+        namespace = {name: _lazy_function(function) if callable(function) else function  # noqa E501
+                     for name, function in self._namespace.items()}
+        namespace["np"] = _LazyNumpy()
+        namespace.update({col: pl.col(col) for col in self.columns})
+        columns = lf.collect_schema().names()
+        new_columns = []
+        for i in self.order:
+            formula = self._formulae[i]
+            label = formula["label"]
+            try:
+                try:
+                    value = eval(formula["code"], namespace)
+                except TypeError:
+                    value = self._evaluate_on_data(lf, formula, namespace)
+                    if isinstance(value, np.ndarray):
+                        firepydaq_logger.warning("Formula " + label + " cannot be added to a lazy query. Its columns are read, and its values held, in memory for all rows.")  # noqa E501
+                        lf = pl.concat([lf, pl.LazyFrame({label: value})], how="horizontal")  # noqa E501
+                        value = pl.col(label)
+            except Exception as e:
+                self.errors[(label, str(e))] = str(type(e))
+                namespace.pop(label, None)
+                self.values.pop(label, None)
+                continue
+            if isinstance(value, np.generic):
+                # numpy scalars do not combine with polars expressions
+                value = value.item()
+            namespace[label] = value
+            if not isinstance(value, pl.Expr):
+                self.values[label] = value
+                if formula["uses_data"]:
+                    self.aggregates.add(label)
+            elif formula["chart"] not in skip_charts:
+                new_columns.append(value.alias(label))
+        labels = [expr.meta.output_name() for expr in new_columns]
+        lf = lf.with_columns(new_columns).select(columns + labels)
+        # Like numpy on Float32 data in `evaluate`, results are Float32,
+        # while polars may promote some operations to Float64.
+        schema = lf.collect_schema()
+        return lf.cast({label: pl.Float32 for label in labels if schema[label].is_float()})  # noqa E501
+
+    def _evaluate_on_data(self, lf, formula, namespace):
+        """Method that evaluates a formula with numpy,
+        reading the columns and formulae it uses from `lf`.
+
+        :meta private:
+        """
+        used = {name: namespace[name] for name in formula["names"]
+                if isinstance(namespace.get(name), pl.Expr)}
+        data = lf.select([expr.alias(name) for name, expr in used.items()]).collect()  # noqa E501
+        eager_namespace = dict(self._namespace)
+        eager_namespace.update({name: value for name, value in namespace.items() if name in formula["names"] and name not in used})  # noqa E501
+        eager_namespace.update({name: data[name].to_numpy() for name in used})
+        value = eval(formula["code"], eager_namespace)
+        if isinstance(value, np.ndarray) and value.ndim == 0:
+            value = value.item()
+        if isinstance(value, np.ndarray) and len(value) != data.height:
+            raise ValueError("Length " + str(len(value)) + " differs from data length " + str(data.height))  # noqa E501
+        return value
@@ -18,11 +18,21 @@
 #########################################################################
 
 import polars as pl
-import re
+import os
+import shutil
 import numpy as np
 import sys
 import json
+import hashlib
+import re
 from .DAQUtils import Formulae_dict
+from .FormulaeEngine import CompiledFormulae
+from .DataWriter import (read_saved_data, scan_saved_data, polars_dt_format,
+                         parts_path, saved_data_files, file_hash,
+                         device_data_files, read_device_data,
+                         SavedDataReader, StreamingParquetWriter)
+import pyarrow.parquet as pq
+from .ErrorUtils import firepydaq_logger
 
 
 class PostProcessData():
@@ -89,10 +99,24 @@ class PostProcessData():
             in config or formulae file
             that contains either "Intermediate" or "Constant".
 
+        device_names: list
+            Names of user-added devices, like Alicat MFCs, from the
+            `Devices` of the `.json` file. `None` if the data was
+            not read from a `.json` file, in which case devices are
+            found from their files, see `JoinDeviceData()`.
+
+        interpolate_devices: bool
+            Default: False. Set to `True` before updating the data to
+            interpolate device readings linearly at NI times,
+            see `JoinDeviceData()`.
+
     """
+    interpolate_devices = False
+
     def __init__(self, **files) -> object:
         _arg_nos = len(files.items())
         _initializing_path_lists = []
+        device_names = None
         for ftype, fpath in files.items():
             try:
                 if ftype == 'jsonpath' and _arg_nos == 1:
@@ -102,6 +126,7 @@ class PostProcessData():
                     par_f = path_dict["Test Name"]
                     config_f = path_dict["Config File"]
                     formula_f = path_dict["Formulae File"]
+                    device_names = [name for devices in path_dict.get("Devices", {}).values() for name in devices]  # noqa E501
                     _initializing_path_lists.append(par_f)
                     _initializing_path_lists.append(config_f)
                     if formula_f.strip() != '':
@@ -122,6 +147,7 @@ class PostProcessData():
 
         self._all_dicts = self._initialize_Data(_initializing_path_lists)
         self._initiateDicts()
+        self.device_names = device_names
         self.MergeConfig_Formulae()
 
     def _initialize_Data(self, *paths):
@@ -131,7 +157,7 @@ class PostProcessData():
         configpath = paths[0][1]
         if type(fpath) is str:
             self.fpathIsDf = False
-            df = pl.read_parquet(fpath)
+            df = self._ReadData(fpath)
             dfpath_dict = {'datapath': fpath, 'configpath': configpath}
         else:
             self.fpathIsDf = True
@@ -150,6 +176,12 @@ class PostProcessData():
 
         return (dfpath_dict, dfdata_dict)
 
+    def _ReadData(self, fpath, time_range=None):
+        '''
+        :meta private:
+        '''
+        return read_saved_data(fpath, time_range)
+
     def _initiateDicts(self):
         """
         Attributes
@@ -163,6 +195,7 @@ class PostProcessData():
         """
         self.Formulae_dict = Formulae_dict
         self.Errors = {}
+        self._aggregate_formulae = set()
 
         self.path_dict = self._all_dicts[0]
         self.data_dict = self._all_dicts[1]
@@ -183,6 +216,7 @@ class PostProcessData():
         :meta private:
         '''
         self.ScaleData()
+        self.JoinDeviceData()
         return
 
     def MergeConfig_Formulae(self):
@@ -221,7 +255,7 @@ class PostProcessData():
 
         return
 
-    def UpdateData(self, dump_output=True):
+    def UpdateData(self, dump_output=True, use_cache=True):
         """A method to update the processed data
         using the initiated path configs
 
@@ -230,6 +264,11 @@ class PostProcessData():
             If `dump_output = True` (Default), A new file having the name
             `self.path_dict['datapath'].split('.parquet')[0]+'_PostProcessed.parquet'` will be created.  # noqa E501
 
+        With `dump_output = True`, the processed file is reused
+        if the data, config and formulae files did not change since
+        it was saved, and only rows appended to the data since then
+        are processed and appended to it. See `_CachePath()`.
+
         Parameters
         ----------
         dump_output: bool, Optional
@@ -239,15 +278,338 @@ class PostProcessData():
             location where the data is read from.
 
             `False`: Processed data will not save the processed data
+        use_cache: bool, Optional
+            Default: True
+
+            `False`: All data is processed and saved again.
         """
         if not self.fpathIsDf:
+            if dump_output and use_cache and self._UpdateFromCache():
+                return
             # Used for authenticating formulae file using
             # random numbers before acquisition begins
-            self.data_dict['data'] = pl.read_parquet(self.path_dict['datapath'])  # noqa E501
+            self.data_dict['data'] = self._ReadData(self.path_dict['datapath'])  # noqa E501
         self._CallScaler()
         self._CallParser()
         if dump_output:
-            self.df_processed.write_parquet(self.path_dict['datapath'].split('.parquet')[0]+'_PostProcessed.parquet')  # noqa E501
+            self.df_processed.write_parquet(self._ProcessedPath())
+            if not self.fpathIsDf:
+                self._SaveCache()
+
+    def _CachePath(self):
+        '''Path to the cache file of the processed file,
+        `<test>_PostProcessed.cache.json`.
+
+        The cache file records the inputs of the processed file:
+        sizes, modification times and number of rows of the data files,
+        content hashes of the config and formulae files and of
+        the processed rows of the data, and values of
+        formulae giving a single value, along with the size and
+        modification time of the processed file itself.
+
+        :meta private:
+        '''
+        return self._ProcessedPath().split('.parquet')[0] + '.cache.json'
+
+    def _InputState(self):
+        '''
+        :meta private:
+        '''
+        data_files = saved_data_files(self.path_dict['datapath'])
+        device_files = []
+        for path in self._DeviceFiles().values():
+            device_files += saved_data_files(path) if path.endswith(".parquet") else [path]  # noqa E501
+        state = {"data_files": [], "rows": 0,
+                 "device_files": [[os.path.basename(f)] + self._FileStat(f) for f in device_files],  # noqa E501
+                 "interpolate_devices": self.interpolate_devices,
+                 "config": file_hash(self.path_dict['configpath']),
+                 "formulae": file_hash(self.path_dict['formulaepath']) if self.read_formulae else ""}  # noqa E501
+        for f in data_files:
+            stat = os.stat(f)
+            state["data_files"].append([os.path.basename(f), stat.st_size, stat.st_mtime_ns])  # noqa E501
+            state["rows"] += pq.ParquetFile(f).metadata.num_rows
+        return state
+
+    def _RowsHash(self, n_rows):
+        '''Hash of the content of the first `n_rows` rows of the data,
+        used to check that rows processed earlier did not change
+        when data files were rewritten, like when saving is finalized.
+
+        Files are read one at a time, and the hash does not depend
+        on how rows are split between files.
+
+        :meta private:
+        '''
+        sha = hashlib.sha256()
+        for f in saved_data_files(self.path_dict['datapath']):
+            if n_rows <= 0:
+                break
+            df = pl.read_parquet(f, n_rows=n_rows)
+            sha.update(df.hash_rows(seed=0).to_numpy().tobytes())
+            n_rows -= df.height
+        return sha.hexdigest()
+
+    def _FileStat(self, path):
+        '''
+        :meta private:
+        '''
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _SaveCache(self):
+        '''
+        :meta private:
+        '''
+        state = self._InputState()
+        if state["rows"] != self.df_processed.height:
+            # Data was saved while processing
+            return
+        values = {}
+        engine = getattr(self, "formulae_engine", None)
+        if engine is not None:
+            for label, value in engine.values.items():
+                if isinstance(value, (int, float, np.number, np.bool_)):
+                    values[label] = value.item() if isinstance(value, np.generic) else value  # noqa E501
+        state.update({"rows_hash": self._RowsHash(state["rows"]),
+                      "processed_file": self._FileStat(self._ProcessedPath()),  # noqa E501
+                      "values": values,
+                      "aggregates": sorted(self._aggregate_formulae),
+                      "errors": [[label, error, error_type] for (label, error), error_type in self.Errors.items()]})  # noqa E501
+        cache_path = self._CachePath()
+        with open(cache_path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(cache_path + ".tmp", cache_path)
+
+    def _UpdateFromCache(self):
+        '''Reuses the processed file if its inputs did not change,
+        processing only rows appended to the data since it was saved.
+
+        Returns
+        -------
+            `True` if the processed file was reused.
+
+        :meta private:
+        '''
+        processed_file = self._ProcessedPath()
+        try:
+            with open(self._CachePath()) as f:
+                cache = json.load(f)
+            if cache["processed_file"] != self._FileStat(processed_file):
+                return False
+            state = self._InputState()
+        except (OSError, ValueError, KeyError):
+            return False
+        for key in ["config", "formulae", "device_files", "interpolate_devices"]:  # noqa E501
+            if state[key] != cache.get(key):
+                # Device readings may change values of rows processed earlier
+                return False
+        if state["rows"] < cache["rows"]:
+            return False
+        data_files = {name: stat for name, *stat in state["data_files"]}
+        if any(data_files.get(name) != stat for name, *stat in cache["data_files"]):  # noqa E501
+            # Data files processed earlier were rewritten. Rows processed
+            # earlier are reused only if their content did not change,
+            # for example, when row group files were merged.
+            if self._RowsHash(cache["rows"]) != cache["rows_hash"]:
+                return False
+
+        self.df_processed = pl.read_parquet(processed_file)
+        self.Errors.update({(label, error): error_type for label, error, error_type in cache["errors"]})  # noqa E501
+        for label, value in cache["values"].items():
+            setattr(self, label, value)
+        self._aggregate_formulae = set(cache["aggregates"])
+        if state["rows"] > cache["rows"]:
+            # Rows appended to the data are processed as in ExtendData.
+            # All rows are processed again if single values
+            # like baselines changed.
+            self._data_reader = SavedDataReader(self.path_dict['datapath'], rows_read=cache["rows"])  # noqa E501
+            self._processed_writer = StreamingParquetWriter(processed_file, self.df_processed.schema)  # noqa E501
+            self.reprocess_count = 0
+            try:
+                self.ExtendData(dump_output=True)
+            finally:
+                self._processed_writer.close()
+                del self._data_reader, self._processed_writer
+            self._SaveCache()
+        if self.read_formulae:
+            self._SetFormulaeArrays()
+        return True
+
+    def _SetFormulaeArrays(self):
+        '''Sets formulae giving arrays as attributes, as `ParseFormulae()`
+        does, when processed data is reused from the processed file.
+
+        Arrays are taken from the columns of `df_processed`.
+        Formulae that are not columns, like `Intermediate` ones,
+        are evaluated on the columns they use,
+        with single values set earlier.
+
+        :meta private:
+        '''
+        columns = self.df_processed.columns
+        engine = CompiledFormulae(self.data_dict['formulae'], columns,
+                                  self.Formulae_dict)
+        for label in engine.labels:
+            value = getattr(self, label, None)
+            if label in columns:
+                engine.values[label] = self.df_processed[label].to_numpy()
+            elif value is not None and not isinstance(value, np.ndarray):
+                engine.values[label] = value
+        labels = [label for label in engine.labels if label not in engine.values]  # noqa E501
+        engine.evaluate(self.df_processed, labels)
+        for label, value in engine.values.items():
+            if isinstance(value, np.ndarray):
+                setattr(self, label, value)
+
+    def _ProcessedPath(self):
+        '''
+        :meta private:
+        '''
+        return self.path_dict['datapath'].split('.parquet')[0]+'_PostProcessed.parquet'  # noqa E501
+
+    def ExtendData(self, dump_output=True):
+        """A method to process only the data saved since the last call,
+        and append it to `df_processed`.
+
+        Used to refresh live data, for example in the dashboard.
+        The first call processes all data saved so far.
+        Following calls read, scale and parse formulae only for the new rows,
+        so the cost of a call does not grow with the test duration.
+
+        Formulae that give a single value from data columns
+        (for example, a baseline `mean(DuctO2[:500])`)
+        are evaluated on all rows processed so far.
+        If any of these values changes, all rows are processed again,
+        so that results are the same as with `UpdateData()`.
+
+        `data_dict['data']` only holds the rows read in the last call.
+        `reprocess_count` is the number of times all rows were processed
+        again, meaning rows in `df_processed` from earlier calls changed.
+
+        Parameters
+        ----------
+        dump_output: bool, Optional
+            Default `dump_outut = True`
+
+            `True`: New processed rows are appended to
+            `self.path_dict['datapath'].split('.parquet')[0]+'_PostProcessed.parquet'`
+            using a `StreamingParquetWriter`.
+
+            `False`: Processed data will not be saved.
+
+        Returns
+        -------
+            `True` if new rows were processed, `False` otherwise.
+        """
+        if not hasattr(self, "_data_reader"):
+            self._data_reader = SavedDataReader(self.path_dict['datapath'])
+            self._processed_writer = None
+            self.df_processed = pl.DataFrame()
+            self.reprocess_count = 0
+        new_data = self._data_reader.read_new()
+        if new_data.is_empty():
+            return False
+
+        processed = self.df_processed
+        self.data_dict['data'] = new_data
+        self._CallScaler()
+        reprocessed = False
+        if self.read_formulae and not processed.is_empty():
+            new_scaled = self.df_processed
+            all_scaled = pl.concat([processed.select(new_scaled.columns), new_scaled])  # noqa E501
+            if self._aggregate_formulae:
+                old_values = {lhs: getattr(self, lhs, None) for lhs in self._aggregate_formulae}  # noqa E501
+                self.df_processed = all_scaled
+                self.ParseFormulae(labels=self._aggregate_formulae)
+                reprocessed = any(getattr(self, lhs, None) != old_values[lhs] for lhs in old_values)  # noqa E501
+            if reprocessed:
+                # Rows processed earlier used different single values.
+                # Happens only until they settle, like a baseline
+                # that needs a number of rows to be acquired.
+                self.df_processed = all_scaled
+                self.ParseFormulae()
+            else:
+                self.df_processed = new_scaled
+                labels = [lhs.strip() for lhs in self.data_dict['formulae']["Label"] if lhs.strip() not in self._aggregate_formulae]  # noqa E501
+                self.ParseFormulae(labels=labels)
+        elif self.read_formulae:
+            self.ParseFormulae()
+        new_processed = self.df_processed
+        if not (processed.is_empty() or reprocessed):
+            self.df_processed = pl.concat([processed, new_processed], how="diagonal_relaxed")  # noqa E501
+
+        if reprocessed:
+            self.reprocess_count += 1
+        if dump_output:
+            if reprocessed:
+                self._processed_writer = None
+            self._DumpNewRows(new_processed)
+        return True
+
+    def _DumpNewRows(self, new_processed):
+        '''
+        :meta private:
+        '''
+        if self._processed_writer is None:
+            processed_file = self._ProcessedPath()
+            # Processed data from earlier runs is replaced.
+            if os.path.isfile(processed_file):
+                os.remove(processed_file)
+            shutil.rmtree(parts_path(processed_file), ignore_errors=True)
+            self._processed_writer = StreamingParquetWriter(processed_file, new_processed.schema)  # noqa E501
+        elif self._processed_writer.closed:
+            # Finalized by FinalizeData, kept as first part
+            self._processed_writer = StreamingParquetWriter(self._processed_writer.parquet_file, self._processed_writer.schema)  # noqa E501
+        schema = self._processed_writer.schema
+        new_processed = new_processed.select([pl.col(col) if col in new_processed.columns else pl.lit(None).alias(col) for col in schema])  # noqa E501
+        self._processed_writer.write(new_processed)
+
+    def FinalizeData(self):
+        """A method to finalize the `_PostProcessed.parquet` file
+        written by `ExtendData()`, merging its row group files.
+
+        Call it once no more data will be processed,
+        for example, when the dashboard is closed.
+        Rows processed by following calls to `ExtendData()`
+        are appended to the finalized file.
+        """
+        writer = getattr(self, "_processed_writer", None)
+        if writer is not None:
+            writer.close()
+
+    def GetAbsoluteTime(self, dt_format="%Y-%m-%d %H:%M:%S:%f"):
+        """Method that returns absolute time of the data
+        as a `polars.Series` of `polars.Datetime` type.
+
+        Absolute time can be saved either as a `polars.Datetime` column,
+        as epoch nanoseconds (integers),
+        or as strings formatted with `dt_format`.
+        All are converted to `polars.Datetime`.
+
+        Parameters
+        ----------
+        dt_format: str, Optional
+            Format of absolute time saved as strings.
+            Default: "%Y-%m-%d %H:%M:%S:%f".
+            String values that do not match this format are returned as null.
+
+        Returns
+        -------
+            `polars.Series`, or None if the data has no absolute time.
+        """
+        data = self.data_dict['data']
+        for col in ["AbsoluteTime", "Absolute_Time"]:
+            if col in data.collect_schema().names():
+                abs_time = data.select(col)
+                if isinstance(abs_time, pl.LazyFrame):
+                    abs_time = abs_time.collect()
+                abs_time = abs_time[col]
+                break
+        else:
+            return None
+        if abs_time.dtype == pl.String:
+            return abs_time.str.strptime(pl.Datetime("ns"), polars_dt_format(dt_format), strict=False)  # noqa E501
+        return abs_time.cast(pl.Datetime("ns"))
 
     def ScaleData(self):
         '''Method to scale the raw data.
@@ -268,47 +630,139 @@ class PostProcessData():
         Scaled data, scaled_data is then obtained as follows,
             `scaled_data` = (`raw_data` - `min_AI`)*`unit_per_V` + `ScaleMin`
 
+        Scale factors are computed once for all labels,
+        and all columns are scaled in a single `select`.
+        Labels with `Chart` "None" are dropped, while thermocouples
+        and labels that are not in the config file are kept as is.
         '''
-        self.df_processed = pl.DataFrame()
-        for col in self.data_dict['data'].columns:
-            crow_df = self.data_dict['config'].filter(pl.col("Label") == col)
-            if ("AbsoluteTime" not in col) and ("Absolute_Time" not in col):
-                # Checking for either these two strings in the data df
-                self.data_dict['data'] = self.data_dict['data'].cast({col: pl.Float32})  # noqa E501
-            if "Time" in col:
-                self.df_processed = self.df_processed.with_columns(pl.Series(self.data_dict['data'].select(col)).alias(col))  # noqa E501
-            elif "None" in crow_df.select("Chart").item().strip() == "None":
+        data = self.data_dict['data']
+        columns = data.collect_schema().names()
+        if getattr(self, "_scale_columns", None) != columns:
+            # Expressions depend only on config and data columns
+            self._scale_columns = columns
+            self._scale_exprs = self._ScaleExpressions(columns)
+        # Checking for either of the absolute time columns in the data df
+        self.data_dict['data'] = data.cast({col: pl.Float32 for col in columns if ("AbsoluteTime" not in col) and ("Absolute_Time" not in col)})  # noqa E501
+        self.df_processed = self.data_dict['data'].select(self._scale_exprs)
+
+    def _ScaleFactors(self):
+        '''Method that computes scale factors for all
+        labels of the config file at once.
+
+        Returns
+        -------
+            dict mapping each label to `None` if it is not plotted
+            (`Chart` is "None"), to `(min_AI, unit_per_V, ScaleMin)`
+            if it is scaled, or to `()` if the raw data is kept
+            (thermocouples and invalid scaling values).
+
+        :meta private:
+        '''
+        config = self.data_dict['config']
+        scale_cols = ["AIRangeMin", "AIRangeMax", "ScaleMin", "ScaleMax"]
+        values = config.select([pl.col(col).cast(pl.String).str.strip_chars().cast(pl.Float32, strict=False) for col in scale_cols]).to_numpy()  # noqa E501
+        min_AI, max_AI, min_Scale, max_Scale = values.T.astype(np.float32)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            unit_per_V = (max_Scale - min_Scale)/(max_AI - min_AI)
+        valid = ~np.isnan(values).any(axis=1)
+        charts = config["Chart"].cast(pl.String).str.strip_chars().to_list()
+        types = config["Type"].to_list()
+
+        factors = {}
+        for i, label in enumerate(config["Label"]):
+            if label in factors:
                 continue
-            elif not self.data_dict['config'].filter(pl.col("Type") == "Thermocouple").filter(pl.col("Label") == col).is_empty():  # noqa E501
-                self.df_processed = self.df_processed.with_columns(pl.Series(self.data_dict['data'].select(col)).alias(col))  # noqa E501
+            if charts[i] == "None":
+                factors[label] = None
+            elif types[i] == "Thermocouple" or not valid[i]:
+                factors[label] = ()
             else:
-                try:
-                    min_AI = np.float32(crow_df.select("AIRangeMin").item())
-                    max_AI = np.float32(crow_df.select("AIRangeMax").item())
-                    min_Scale = np.float32(crow_df.select("ScaleMin").item())
-                    max_Scale = np.float32(crow_df.select("ScaleMax").item())
-                    unit_per_V = (max_Scale - min_Scale)/(max_AI - min_AI)
-                    self.df_processed = self.df_processed.with_columns((pl.Series((self.data_dict['data'].select(pl.col(col))-min_AI)*unit_per_V+min_Scale)).alias(col))  # noqa E501
-                except ValueError:
-                    # Is there is any ValueError
-                    # no scaling will be done to the data
-                    self.df_processed = self.df_processed.with_columns(pl.Series(self.data_dict['data'].select(col)).alias(col))  # noqa E501
-
-    def _CheckVarMacthes(self, var, rhs, replacement):
-        # Look for variable with non alphanumeric, and
-        # underscore characters before or after the string.
-        # i.e. a-zA-Z0-9_
-        pattern = r"(?<![\w])"+var+r"(?![\w])"
-        matcher = re.finditer(pattern, rhs, re.IGNORECASE)
-        matchy_spans = [(re.findall(var, i.group())[0], i.span()) for i in matcher]  # noqa E501
-        for i in range(len(matchy_spans)):
-            matches = matchy_spans[i]
-            rhs = rhs[:matches[1][0]] + replacement + rhs[matches[1][1]:]
-            # Updating the variable match based on given replacement string
-            matcher = re.finditer(pattern, rhs, re.IGNORECASE)
-            matchy_spans = [(i.group(), i.span()) for i in matcher]
-
-        return rhs
+                factors[label] = (min_AI[i], unit_per_V[i], min_Scale[i])
+        return factors
+
+    def _ScaleExpressions(self, columns):
+        '''Method that returns the polars expressions
+        that scale the data `columns`.
+
+        :meta private:
+        '''
+        factors = self._ScaleFactors()
+        exprs = []
+        for col in columns:
+            factor = factors.get(col, ())
+            if "Time" in col or factor == ():
+                # Time, thermocouples, and labels that are not scaled
+                exprs.append(pl.col(col))
+            elif factor is not None:
+                min_AI, unit_per_V, min_Scale = [pl.lit(float(f), dtype=pl.Float32) for f in factor]  # noqa E501
+                exprs.append(((pl.col(col) - min_AI)*unit_per_V + min_Scale).alias(col))  # noqa E501
+        return exprs
+
+    def _DeviceFiles(self):
+        '''
+        :meta private:
+        '''
+        if self.fpathIsDf:
+            return {}
+        return device_data_files(self.path_dict['datapath'], self.device_names)  # noqa E501
+
+    def JoinDeviceData(self, interpolate=None):
+        '''Method that adds readings of user-added devices,
+        like Alicat MFCs, to the scaled data, at NI times.
+
+        Devices are found with `device_data_files()`.
+        Each reading is added as a column named `<device>_<reading>`,
+        where characters of the device name that are not letters,
+        digits or underscores are replaced by underscores,
+        so that formulae can use it.
+        Example, `MFC_Propane_mass_flow` for `mass_flow` of `MFC-Propane`.
+
+        Each NI row gets the last reading at or before its `Time`,
+        found with a sorted as-of join. Rows before the first reading
+        have missing values.
+
+        Called by `UpdateData()` and `ExtendData()` after `ScaleData()`.
+
+        Parameters
+        ----------
+        interpolate: bool, Optional
+            `True`: Numeric readings are interpolated linearly
+            between the readings before and after each NI row.
+            Default: None, uses `interpolate_devices`.
+        '''
+        device_files = self._DeviceFiles()
+        if not device_files:
+            return
+        if interpolate is None:
+            interpolate = self.interpolate_devices
+        is_lazy = isinstance(self.df_processed, pl.LazyFrame)
+        columns = self.df_processed.collect_schema().names()
+        df = self.df_processed.with_columns(pl.col("Time").cast(pl.Float64).alias("_t"))  # noqa E501
+        for name, path in device_files.items():
+            device = read_device_data(path).rename({"Time": "_t"}).sort("_t")  # noqa E501
+            prefix = re.sub(r"\W", "_", name) + "_"
+            readings = [col for col in device.columns if col != "_t" and prefix + col not in columns]  # noqa E501
+            numeric = [col for col in readings if device.schema[col].is_numeric()]  # noqa E501
+            device = device.select(["_t"] + readings).cast({col: pl.Float32 for col in numeric})  # noqa E501
+            before = device.rename({col: prefix + col for col in readings})
+            if is_lazy:
+                before = before.lazy()
+            df = df.join_asof(before, on="_t", strategy="backward")
+            if interpolate and numeric:
+                after = device.select(["_t"] + numeric).rename({col: "_next_" + col for col in numeric})  # noqa E501
+                after = after.with_columns(pl.col("_t").alias("_t1"))
+                before_t = device.select(pl.col("_t"), pl.col("_t").alias("_t0"))  # noqa E501
+                if is_lazy:
+                    after, before_t = after.lazy(), before_t.lazy()
+                df = df.join_asof(before_t, on="_t", strategy="backward").join_asof(after, on="_t", strategy="forward")  # noqa E501
+                weight = ((pl.col("_t") - pl.col("_t0"))/(pl.col("_t1") - pl.col("_t0"))).cast(pl.Float32)  # noqa E501
+                exprs = []
+                for col in numeric:
+                    v0, v1 = pl.col(prefix + col), pl.col("_next_" + col)
+                    exprs.append(pl.when(v1.is_null() | (pl.col("_t1") == pl.col("_t0"))).then(v0).otherwise(v0 + (v1 - v0)*weight).alias(prefix + col))  # noqa E501
+                df = df.with_columns(exprs).drop(["_t0", "_t1"] + ["_next_" + col for col in numeric])  # noqa E501
+            columns += [prefix + col for col in readings]
+        self.df_processed = df.drop("_t")
 
     def ExecEqn(self, lhs, rhs):
         """Method to execute an equation of the form lhs = rhs
@@ -340,85 +794,165 @@ class PostProcessData():
                 self.Errors[(lhs, err_val)] = str(the_type)
                 print(lhs, the_type, ': ', err_val.strip())
 
-    def ParseFormulae(self):
+    def CompileFormulae(self):
+        '''A method to parse and compile the formulae file once,
+        for the columns of the scaled data.
+
+        Creates the attribute `formulae_engine`:
+        :py:class:`firepydaq.utilities.FormulaeEngine.CompiledFormulae`.
+        Unknown variables, syntax errors and circular definitions
+        are added to `Errors` without evaluating any formula.
+
+        Called by `ParseFormulae()` when needed.
+        Needs to have scaled data before calling this method.
+        '''
+        self.formulae_engine = CompiledFormulae(self.data_dict['formulae'],
+                                                self.df_processed.collect_schema().names(),  # noqa E501
+                                                self.Formulae_dict)
+        self.Errors.update(self.formulae_engine.errors)
+
+    def ParseFormulae(self, labels=None):
         '''A method to parse the formulae listed in a csv file.
 
         This function can be used to test the formulae file for sanity
         before running the dash.
 
         Needs to have scaled data before calling this method.
+
+        Formulae are compiled once by `CompileFormulae()`, and compiled
+        again only if the columns of the scaled data change.
+        Repeated calls, like dashboard refreshes, only evaluate them.
+        The value of each formula is set as an attribute having
+        the formula label as name.
+
+        If `df_processed` is a `polars.LazyFrame`, formulae are added
+        to the query, and only formulae giving a single value
+        are set as attributes.
+
+        Parameters
+        ----------
+        labels: list, Optional
+            Labels (LHS) of the formulae to parse.
+            Other formulae keep values from the previous call.
+            Default: None, all formulae are parsed.
+            Ignored if `df_processed` is a `polars.LazyFrame`.
         '''
-        formulae_df = self.data_dict['formulae']
-        for row in formulae_df.iter_rows(named=True):
-            skip_processing = False
-            lhs = row["Label"].strip()
-            rhs = row["RHS"].strip()
-            eqn = lhs + '=' + rhs
-            if "Constant" in row["Chart"]:
-                self.ExecEqn(lhs, rhs)
-            else:
-                # vars = re.findall(r'[A-Za-z]+_?[A-Za-z0-9]+',rhs)
-                vars = re.findall(r'[a-zA-Z_][a-zA-Z0-9_]*', rhs)
-                if vars == []:  # Constant
-                    self.ExecEqn(lhs, rhs)
-                    continue
-                unique_vars = pl.Series(vars).unique()
-                dict_replacements = []
-                for var in unique_vars:
-                    if any([var in i for i in self.Formulae_dict.keys()]):
-                        dict_replacements.append(var)
-                        continue
-                    if var in locals():
-                        # Checking for Constants and Intermediates
-                        continue
-                    elif var not in locals() and hasattr(self, var):
-                        # Replace already used var with
-                        # corresponding object attribute
-                        rhs = self._CheckVarMacthes(var, rhs, 'getattr(self,\"' + var + '\")')  # noqa E501
-                        continue
-                    try:
-                        # Checking for variable in the processed_df
-                        if not self.df_processed.select(var).is_empty():
-                            setattr(self, var, self.df_processed.select(var).to_numpy().flatten())  # noqa E501
-                            rhs = self._CheckVarMacthes(var, rhs, 'getattr(self, \"'+var+'\")')  # noqa E501
-                        else:
-                            # "Variable " + var + ", does not exist in locals
-                            # or in collected/processed data.
-                            # Skipping the processing"
-                            skip_processing = True
-                    except Exception:
-                        the_type, the_value, _ = sys.exc_info()
-                        err_val = the_value.__str__()
-                        if not (lhs, err_val) in self.Errors:
-                            self.Errors[(lhs, err_val)] = str(the_type)
-                        skip_processing = True
-                for i in dict_replacements:
-                    # final replacement of formulae
-                    # to python parse-able functions
-                    if i in rhs:
-                        rhs = self._CheckVarMacthes(i, rhs, self.Formulae_dict[i])  # noqa E501
-                eqn = lhs + '=' + rhs
-
-            if not skip_processing:
-                try:
-                    exec('setattr(self,lhs,eval(rhs))')
-                    if (isinstance(getattr(self, lhs), np.ndarray) and
-                            (row["Chart"].strip() != "Intermediate") and
-                            (row["Chart"].strip() != "Constant") and
-                            (row["Chart"].strip() != "None")):
-                        self.df_processed = self.df_processed.with_columns(pl.Series(getattr(self,lhs)).alias(lhs))  # noqa E501
-                except Exception:
-                    the_type, the_value, _ = sys.exc_info()
-                    err_val = the_value
-                    if the_type == NameError:
-                        err_val = the_value.__str__()
-                    elif the_type == SyntaxError:
-                        err_val = the_value.text.split('=')[0]
-                    if not (lhs, err_val) in self.Errors:
-                        self.Errors[(lhs, err_val)] = str(the_type)
-                    skip_processing = True
+        engine = getattr(self, "formulae_engine", None)
+        if engine is None or engine.columns != self.df_processed.collect_schema().names():  # noqa E501
+            self.CompileFormulae()
+            engine = self.formulae_engine
+        if isinstance(self.df_processed, pl.LazyFrame):
+            self.df_processed = engine.evaluate_lazy(self.df_processed)
+        else:
+            self.df_processed = engine.evaluate(self.df_processed, labels)
+        for lhs, value in engine.values.items():
+            setattr(self, lhs, value)
+        self._aggregate_formulae = set(engine.aggregates)
+        self.Errors.update(engine.errors)
 
         if self.Errors:
             with open('FormulaeError.log', 'w') as f:
                 for key, error_item in self.Errors.items():
                     f.write(key[0] + " : " + key[1] + " :: " + error_item + '\n')  # noqa E501
+
+
+class LazyPostProcessData(PostProcessData):
+    """A `PostProcessData` that processes data out of core,
+    for tests too long to fit in memory.
+
+    Takes the same keyword arguments as `PostProcessData`.
+    Data is scanned with `polars.scan_parquet` instead of being read,
+    and scaling and formulae are built into a single lazy query.
+    `data_dict['data']` and `df_processed` are `polars.LazyFrame`.
+    The query only reads the columns and row groups it needs,
+    and `UpdateData` streams the processed data to the
+    `_PostProcessed.parquet` file with `sink_parquet`,
+    so memory use depends on the size of a row group
+    rather than on the size of the data file.
+
+    Formulae that give a single value from data columns, like
+    a baseline `mean(DuctO2[:500])`, are evaluated when the query
+    is built, reading only the columns they use, and always on all
+    the data, so results are the same as with `PostProcessData`.
+    See `evaluate_lazy` of
+    :py:class:`firepydaq.utilities.FormulaeEngine.CompiledFormulae`.
+
+    Example
+
+    ```
+    processed = LazyPostProcessData(jsonpath="Test.json")
+    processed.UpdateData(time_range=(600, 1200), columns=["HRR"])
+    # Or query the processed data
+    hrr = processed.df_processed.select("Time", "HRR").collect()
+    ```
+    """
+    def _ReadData(self, fpath, time_range=None):
+        '''
+        :meta private:
+        '''
+        return scan_saved_data(fpath, time_range)
+
+    def _initialize_Data(self, *paths):
+        dfpath_dict, dfdata_dict = super()._initialize_Data(*paths)
+        if isinstance(dfdata_dict['data'], pl.DataFrame):
+            dfdata_dict['data'] = dfdata_dict['data'].lazy()
+        return (dfpath_dict, dfdata_dict)
+
+    def UpdateData(self, dump_output=True, time_range=None, columns=None):
+        """A method to build the lazy query of the processed data,
+        and optionally run it.
+
+        Creates the attribute df_processed: `polars.LazyFrame`
+
+        Parameters
+        ----------
+        dump_output: bool, Optional
+            Default `dump_outut = True`
+
+            `True`: Processed data is streamed to
+            `self.path_dict['datapath'].split('.parquet')[0]+'_PostProcessed.parquet'`.
+
+            `False`: Only the query is built. Use `df_processed.collect()`
+            or `df_processed.sink_parquet()` to run it.
+        time_range: tuple, Optional
+            (start, end) relative times (s) of the rows to keep,
+            both included. Either can be None. Default: all rows.
+            For data saved by `PartitionedParquetWriter` without
+            a formulae file, only partitions in the range are read.
+        columns: list, Optional
+            Labels of the data or formulae columns to keep,
+            in addition to the time columns. Default: all columns.
+        """
+        if not self.fpathIsDf:
+            # Without formulae, that may need all rows for a single
+            # value, only partitions in the time range are scanned
+            scan_range = None if self.read_formulae else time_range
+            self.data_dict['data'] = self._ReadData(self.path_dict['datapath'], scan_range)  # noqa E501
+        self._CallScaler()
+        self._CallParser()
+        lf = self.df_processed
+        if time_range is not None:
+            t_start, t_end = time_range
+            if t_start is not None:
+                lf = lf.filter(pl.col("Time") >= t_start)
+            if t_end is not None:
+                lf = lf.filter(pl.col("Time") <= t_end)
+        if columns is not None:
+            time_cols = [col for col in lf.collect_schema().names() if "Time" in col and col not in columns]  # noqa E501
+            lf = lf.select(time_cols + list(columns))
+        self.df_processed = lf
+        if dump_output:
+            self._SinkProcessed()
+
+    def _SinkProcessed(self):
+        '''
+        :meta private:
+        '''
+        processed_file = self._ProcessedPath()
+        shutil.rmtree(parts_path(processed_file), ignore_errors=True)
+        try:
+            self.df_processed.sink_parquet(processed_file)
+        except (pl.exceptions.ComputeError, pl.exceptions.InvalidOperationError) as e:  # noqa E501
+            # Some formulae cannot run in the streaming engine
+            firepydaq_logger.warning("Processed data could not be streamed, it is collected in memory instead: " + str(e))  # noqa E501
+            self.df_processed.collect().write_parquet(processed_file)
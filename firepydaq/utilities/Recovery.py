@@ -0,0 +1,367 @@
+##########################################################################
+# FIREpyDAQ - Facilitated Interface for Recording Experiments,
+# a python-package for Data Acquisition.
+# Copyright (C) 2024  Dushyant M. Chaudhari
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#########################################################################
+
+"""Recovery of tests whose saving was interrupted, from the command line.
+
+Example, to recover all tests of a project::
+
+    firepydaq-recover "02_ExperimentData/2024Project/**/*.json"
+
+If acquisition is killed or the computer loses power while saving,
+the data of a test is left in row group files (`<test>_parts`),
+and, in staging mode, in a `<test>.staging` file.
+The longest valid prefix of the data found in them is rebuilt
+into `<test>.parquet`, one row group at a time,
+so tests of any duration are recovered without loading them in memory.
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import sys
+
+import polars as pl
+import pyarrow.parquet as pq
+
+from .DataWriter import (parts_path, part_file, parts_suffix, chunks_dataframe,
+                         partition_manifest, write_partition)
+from .StagingFile import StagingReader, staging_path
+from .BatchPostProcessing import inputs_of_test, discover_tests
+
+
+def _parquet_rows(path):
+    # Rows of a readable .parquet file, None if it is truncated or invalid
+    try:
+        return pq.ParquetFile(path).metadata.num_rows
+    except Exception:
+        return None
+
+
+def valid_parts(parquet_file, first_chunk=0):
+    """Function that returns the longest sequence of readable row group
+    files of `parquet_file`, starting from the one of `first_chunk`.
+
+    A missing, or unreadable, row group file ends the sequence,
+    so that no data after a gap is recovered out of order.
+
+    Returns
+    -------
+        (files, rows), the list of row group files and their total rows.
+    """
+    files = []
+    rows = 0
+    parts_dir = parts_path(parquet_file)
+    while True:
+        part = part_file(parts_dir, first_chunk + len(files))
+        part_rows = _parquet_rows(part) if os.path.isfile(part) else None
+        if part_rows is None:
+            return files, rows
+        files.append(part)
+        rows += part_rows
+
+
+def _staged_schema(reader):
+    # Schema of staged data, as saved by `application.save_data()`
+    schema = {column: pl.Float32 for column in reader.columns}
+    schema[reader.columns[0]] = pl.String if reader.dt_format else pl.Datetime("ns")  # noqa E501
+    return schema
+
+
+def _staged_tables(reader, skip_rows, schema, batch_chunks=100):
+    # Arrow tables of the rows staged after the first `skip_rows`
+    while True:
+        chunks = reader.read_chunks(batch_chunks)
+        if not chunks:
+            return
+        df = chunks_dataframe(chunks, schema, reader.dt_format)
+        if skip_rows >= df.height:
+            skip_rows -= df.height
+            continue
+        yield df.slice(skip_rows).to_arrow()
+        skip_rows = 0
+
+
+def _saved_tables(files):
+    # Arrow tables of .parquet files, one row group at a time
+    for path in files:
+        parquet = pq.ParquetFile(path)
+        for i in range(parquet.num_row_groups):
+            yield parquet.read_row_group(i)
+
+
+def _chain(*iterables):
+    for iterable in iterables:
+        yield from iterable
+
+
+def _remove_saving_files(parquet_file):
+    # Row group, staging and temporary files left by saving
+    shutil.rmtree(parts_path(parquet_file), ignore_errors=True)
+    for path in [staging_path(parquet_file), parquet_file + ".tmp"]:
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def _time_range(first, last):
+    # Relative and absolute time of the first row of `first`
+    # and the last row of `last` arrow tables
+    abs_col, time_col = first.column_names[:2]
+    return {"time_range": (float(first[time_col][0].as_py()), float(last[time_col][-1].as_py())),  # noqa E501
+            "absolute_time_range": (str(first[abs_col][0].as_py()), str(last[abs_col][-1].as_py()))}  # noqa E501
+
+
+def _partitions_time_range(partitions):
+    # Time range of the partitions of a `.parquet` directory
+    partitions = [p for p in partitions if p["time_min"] is not None]
+    if not partitions:
+        return {}
+    return {"time_range": (partitions[0]["time_min"], partitions[-1]["time_max"]),  # noqa E501
+            "absolute_time_range": (partitions[0]["absolute_time_start"], partitions[-1]["absolute_time_end"])}  # noqa E501
+
+
+def recover_partitions(parquet_file, clean=False):
+    """Function that recovers a `.parquet` directory saved by
+    `PartitionedParquetWriter`.
+
+    Partitions listed in the manifest are kept as they are.
+    The valid row group files not yet rolled into a partition,
+    then the staged chunks after them, are saved as a new partition,
+    and the row group directory is removed.
+
+    Parameters and returned report are as for `recover_data()`.
+    """
+    report = {"file": parquet_file, "status": "failed", "rows": 0,
+              "sources": {}, "time_range": None, "absolute_time_range": None}  # noqa E501
+    partitions = partition_manifest(parquet_file)
+    first_chunk = sum(p["chunks"] for p in partitions)
+    saved_rows = sum(p["rows"] for p in partitions)
+    parts, part_rows = valid_parts(parquet_file, first_chunk)
+    staging_file = staging_path(parquet_file)
+    reader = StagingReader(staging_file) if os.path.isfile(staging_file) else None  # noqa E501
+    schema_files = [os.path.join(parquet_file, p["file"]) for p in partitions[:1]] + parts[:1]  # noqa E501
+
+    tables = _saved_tables(parts)
+    if reader is not None:
+        schema = _staged_schema(reader)
+        if schema_files:
+            schema = pl.from_arrow(pq.read_schema(schema_files[0]).empty_table()).schema  # noqa E501
+        tables = _chain(tables, _staged_tables(reader, saved_rows + part_rows, schema))  # noqa E501
+    try:
+        arrow_schema = pq.read_schema(schema_files[0]) if schema_files else None  # noqa E501
+        entry = write_partition(parquet_file, partitions, tables, first_chunk, arrow_schema)  # noqa E501
+    finally:
+        if reader is not None:
+            reader.close()
+    if entry is not None:
+        # Rolled into the partition, like `PartitionedParquetWriter.close()`
+        shutil.rmtree(parts_path(parquet_file), ignore_errors=True)
+    rows = saved_rows + (entry["rows"] if entry else 0)
+    if rows == 0:
+        return report
+    report.update(_partitions_time_range(partitions))
+    report["rows"] = rows
+    report["status"] = "complete" if entry is None else "recovered"
+    report["sources"]["partitions"] = saved_rows
+    if parts:
+        report["sources"]["parts"] = part_rows
+    if reader is not None and entry is not None:
+        report["sources"]["staging"] = entry["rows"] - part_rows
+    if clean:
+        _remove_saving_files(parquet_file)
+    return report
+
+
+def recover_data(parquet_file, clean=False):
+    """Function that rebuilds `parquet_file` from the longest valid
+    prefix of its saved data.
+
+    `.parquet` directories are recovered by `recover_partitions()`.
+    Otherwise, data is taken, in order, from:
+
+    - `parquet_file`, if it is readable and holds at least
+      as many rows as the row group files,
+    - else, the valid row group files, see `valid_parts()`,
+    - then, the staged chunks after the rows already found,
+      up to the first incomplete chunk.
+
+    Parameters
+    ----------
+        parquet_file: str
+            Path to the `.parquet` data file of a test or a device.
+        clean: bool, optional
+            If `True`, row group files and the staging file are
+            removed once `parquet_file` is rebuilt. Default: False
+
+    Returns
+    -------
+        dict with `file`, `status` ("complete" if nothing needed
+        recovery, "recovered", or "failed" if no valid data was found),
+        `rows`, `sources` (number of rows taken from each source),
+        `time_range` (first and last `Time`, in s) and
+        `absolute_time_range`.
+    """
+    if os.path.isdir(parquet_file):
+        return recover_partitions(parquet_file, clean)
+    report = {"file": parquet_file, "status": "failed", "rows": 0,
+              "sources": {}, "time_range": None, "absolute_time_range": None}  # noqa E501
+    saved_rows = _parquet_rows(parquet_file) if os.path.isfile(parquet_file) else None  # noqa E501
+    parts, part_rows = valid_parts(parquet_file)
+    if saved_rows is not None and saved_rows >= part_rows:
+        base_files, base_rows, base_source = [parquet_file], saved_rows, "parquet"  # noqa E501
+    else:
+        base_files, base_rows, base_source = parts, part_rows, "parts"
+    staging_file = staging_path(parquet_file)
+    reader = StagingReader(staging_file) if os.path.isfile(staging_file) else None  # noqa E501
+
+    staged = iter(())
+    if reader is not None:
+        schema = _staged_schema(reader)
+        if base_files:
+            schema = pl.from_arrow(pq.read_schema(base_files[0]).empty_table()).schema  # noqa E501
+        staged = _staged_tables(reader, base_rows, schema)
+    first_staged = next(staged, None)
+
+    if base_source == "parquet" and first_staged is None:
+        # The saved file already holds all data
+        if reader is not None:
+            reader.close()
+        saved = pq.ParquetFile(parquet_file)
+        if saved.num_row_groups and base_rows:
+            report.update(_time_range(saved.read_row_group(0), saved.read_row_group(saved.num_row_groups - 1)))  # noqa E501
+            report.update(status="complete", rows=base_rows, sources={"parquet": base_rows})  # noqa E501
+            if clean:
+                _remove_saving_files(parquet_file)
+        return report
+
+    tmp_file = parquet_file + ".recovered.tmp"
+    writer = None
+    first = last = None
+    tables = _saved_tables(base_files)
+    if first_staged is not None:
+        tables = _chain(tables, [first_staged], staged)
+    try:
+        for table in tables:
+            if table.num_rows == 0:
+                continue
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_file, table.schema)
+            elif table.schema != writer.schema:
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+            if first is None:
+                first = table
+            last = table
+            report["rows"] += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+        if reader is not None:
+            reader.close()
+
+    if first is None:
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+        return report
+    os.replace(tmp_file, parquet_file)
+    report.update(_time_range(first, last))
+    report["status"] = "recovered"
+    report["sources"][base_source] = base_rows
+    if reader is not None:
+        report["sources"]["staging"] = report["rows"] - base_rows
+    if clean:
+        _remove_saving_files(parquet_file)
+    return report
+
+
+def device_data_parts(parquet_file):
+    """Function that returns the `.parquet` files of devices saved
+    along with `parquet_file` whose row group files are left.
+    """
+    stem = parquet_file.split(".parquet")[0]
+    device_files = []
+    for parts_dir in sorted(glob.glob(glob.escape(stem) + "_*" + parts_suffix)):  # noqa E501
+        if os.path.isdir(parts_dir):
+            device_files.append(parts_dir[:-len(parts_suffix)] + ".parquet")
+    return device_files
+
+
+def recover_test(path, clean=False):
+    """Function that recovers the data of a test, and of devices
+    saved along with it, see `recover_data()`.
+
+    Parameters
+    ----------
+        path: str
+            Path to the `.json` settings file,
+            or to the `.parquet` data file of the test.
+        clean: bool, optional
+            See `recover_data()`. Default: False
+
+    Returns
+    -------
+        List of the reports of the test data, then of each device.
+    """
+    if path.endswith(".json"):
+        parquet_file = inputs_of_test(path)["datapath"]
+    else:
+        parquet_file = path
+    reports = [recover_data(parquet_file, clean)]
+    for device_file in device_data_parts(parquet_file):
+        reports.append(recover_data(device_file, clean))
+    return reports
+
+
+def main(argv=None):
+    """Entry point of the `firepydaq-recover` command."""
+    parser = argparse.ArgumentParser(prog="firepydaq-recover",
+                                     description="Recover FIREpyDAQ tests whose saving was interrupted. The longest valid prefix of the data saved in row group files and staging files is rebuilt into the .parquet file of each test.")  # noqa E501
+    parser.add_argument("patterns", nargs="+",
+                        help="Glob patterns or folders of test .json files. Use ** to match any number of folders.")  # noqa E501
+    parser.add_argument("--clean", action="store_true",
+                        help="Remove row group and staging files of recovered tests.")  # noqa E501
+    args = parser.parse_args(argv)
+
+    json_paths = discover_tests(args.patterns)
+    if not json_paths:
+        print("No tests found for " + " ".join(args.patterns))
+        return 1
+    failed = 0
+    for json_path in json_paths:
+        try:
+            reports = recover_test(json_path, args.clean)
+        except Exception as e:
+            failed += 1
+            print("Failed: " + json_path + "\n    " + str(type(e).__name__) + ": " + str(e))  # noqa E501
+            continue
+        for report in reports:
+            if report["status"] == "failed":
+                failed += 1
+                print("Failed: " + report["file"] + "\n    No valid data found.")  # noqa E501
+                continue
+            t_first, t_last = report["time_range"]
+            sources = ", ".join(str(rows) + " rows from " + source for source, rows in report["sources"].items())  # noqa E501
+            print(report["status"].capitalize() + ": " + report["file"] + " (" +  # noqa E501
+                  str(report["rows"]) + " rows, Time " + str(round(t_first, 3)) + " to " + str(round(t_last, 3)) + " s, " +  # noqa E501
+                  " to ".join(report["absolute_time_range"]) + "; " + sources + ")")  # noqa E501
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+##########################################################################
+# FIREpyDAQ - Facilitated Interface for Recording Experiments,
+# a python-package for Data Acquisition.
+# Copyright (C) 2024  Dushyant M. Chaudhari
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#########################################################################
+
+import numpy as np
+
+
+class RingBuffer():
+    """A fixed-capacity, channel-major circular buffer
+    for the live history of acquired data.
+
+    The buffer is allocated once with shape
+    (`n_channels`, 2 x `capacity`). Every sample is written twice,
+    at index `i` and `i + capacity`, so that the latest `capacity`
+    samples are always contiguous in memory.
+    Writing a chunk is therefore O(chunk) and
+    `window()` returns a view without copying any data.
+
+    Parameters
+    ----------
+        n_channels: int
+            Number of channels (rows) in the buffer.
+        capacity: int
+            Maximum number of samples per channel held in the buffer.
+            Older samples are overwritten once the buffer is full.
+        dtype: numpy dtype, optional
+            Default: np.float64
+
+    Attributes
+    ----------
+        size: int
+            Number of samples per channel presently held in the buffer.
+        total_samples: int
+            Number of samples per channel appended since the
+            buffer was created or reset.
+    """
+    def __init__(self, n_channels, capacity, dtype=np.float64):
+        if capacity < 1:
+            raise ValueError("RingBuffer capacity must be at least 1.")
+        self.n_channels = n_channels
+        self.capacity = int(capacity)
+        self._data = np.zeros((n_channels, 2*self.capacity), dtype=dtype)
+        self.reset()
+
+    def reset(self):
+        """Method to empty the buffer without reallocating it.
+        """
+        self._head = 0  # index where the next sample will be written
+        self.size = 0
+        self.total_samples = 0
+
+    def append(self, chunk):
+        """Method to append a chunk of samples to the buffer.
+
+        Parameters
+        ----------
+            chunk: numpy array
+                Array of shape (`n_channels`, n).
+                A 1D array of shape (n,) is accepted
+                for a single channel buffer.
+        """
+        chunk = np.asarray(chunk)
+        if chunk.ndim == 1:
+            chunk = chunk.reshape(self.n_channels, -1)
+        n = chunk.shape[1]
+        if n >= self.capacity:
+            # Only the latest samples fit in the buffer
+            chunk = chunk[:, n-self.capacity:]
+            self._data[:, :self.capacity] = chunk
+            self._data[:, self.capacity:] = chunk
+            self._head = 0
+        else:
+            start = self._head
+            end = start + n
+            if end <= self.capacity:
+                self._data[:, start:end] = chunk
+                self._data[:, start+self.capacity:end+self.capacity] = chunk
+            else:
+                split = self.capacity - start
+                self._data[:, start:self.capacity] = chunk[:, :split]
+                self._data[:, start+self.capacity:] = chunk[:, :split]
+                self._data[:, :end-self.capacity] = chunk[:, split:]
+                self._data[:, self.capacity:end] = chunk[:, split:]
+            self._head = end % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        self.total_samples += n
+
+    def window(self, n_samples=None):
+        """Method that returns the latest samples as a view.
+
+        Parameters
+        ----------
+            n_samples: int, optional
+                Number of latest samples per channel to return.
+                Default: all samples held in the buffer.
+
+        Returns
+        -------
+            numpy array view of shape (`n_channels`, n_samples).
+            The view is only valid until the next `append()`.
+        """
+        if n_samples is None or n_samples > self.size:
+            n_samples = self.size
+        end = self._head + self.capacity
+        return self._data[:, end-n_samples:end]
+
+    def channel(self, index, n_samples=None):
+        """Method that returns the latest samples of one channel as a view.
+        """
+        return self.window(n_samples)[index]
+
+    def last(self):
+        """Method that returns the last sample of every channel.
+        """
+        if self.size == 0:
+            raise IndexError("RingBuffer is empty.")
+        return self._data[:, self._head + self.capacity - 1]
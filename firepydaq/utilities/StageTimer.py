@@ -0,0 +1,171 @@
+##########################################################################
+# FIREpyDAQ - Facilitated Interface for Recording Experiments,
+# a python-package for Data Acquisition.
+# Copyright (C) 2024  Dushyant M. Chaudhari
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#########################################################################
+
+# Lightweight timing of the stages of the acquisition loop
+import math
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
+
+
+class LatencyHistogram():
+    """Fixed-size histogram of durations, with log-spaced bins.
+
+    Recording a duration is a binary search and a counter increment,
+    so memory and cost do not grow with the number of recordings.
+    Percentiles are accurate to the bin width,
+    about 12% with the default 20 bins per decade.
+
+    Parameters
+    ----------
+        min_time: float, optional
+            Upper edge of the first bin, in seconds. Default: 1e-6
+        max_time: float, optional
+            Lower edge of the overflow bin, in seconds. Default: 100
+        bins_per_decade: int, optional
+            Default: 20
+
+    Attributes
+    ----------
+        count: int
+            Number of recorded durations.
+        total: float
+            Sum of recorded durations, in seconds.
+        max: float
+            Longest recorded duration, in seconds.
+        last: float
+            Last recorded duration, in seconds.
+    """
+    def __init__(self, min_time=1e-6, max_time=100, bins_per_decade=20):
+        n_bins = int(math.ceil(math.log10(max_time/min_time)*bins_per_decade))
+        self.edges = [min_time*10**(i/bins_per_decade) for i in range(n_bins + 1)]  # noqa E501
+        self.reset()
+
+    def reset(self):
+        """Method to discard all recorded durations."""
+        # One bin below the first edge and one above the last edge
+        self.counts = [0]*(len(self.edges) + 1)
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self.last = 0.
+
+    def record(self, seconds):
+        """Method to add a duration to the histogram."""
+        self.counts[bisect_right(self.edges, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Method that returns the `q` th percentile (0 to 100)
+        of recorded durations, in seconds, as the upper edge of
+        the bin containing it. Returns `None` if nothing is recorded.
+        """
+        counts = list(self.counts)
+        count = sum(counts)
+        if count == 0:
+            return None
+        rank = q/100*count
+        cumulative = 0
+        for i, n in enumerate(counts):
+            cumulative += n
+            if cumulative >= rank and n > 0:
+                break
+        if i >= len(self.edges):
+            return self.max
+        return min(self.edges[i], self.max)
+
+
+class StageTimer():
+    """Per-stage timings of a loop, for example the acquisition loop,
+    recorded in a `LatencyHistogram` for each stage.
+
+    Stages are recorded from any thread without locks.
+    The summary read from another thread, such as the GUI,
+    may therefore be off by the recordings made while reading it.
+
+    Example
+
+    ```
+    timer = StageTimer(["DAQ read", "Plot"])
+    with timer.time("DAQ read"):
+        data = task.read()
+    timer.set_gauge("Samples backlog", 10)
+    timer.summary()
+    ```
+
+    Parameters
+    ----------
+        stages: list, optional
+            Names of stages, in the order in which they are reported.
+            Other stages are added when first recorded.
+
+    Attributes
+    ----------
+        histograms: dict
+            Maps stage names to their `LatencyHistogram`.
+        gauges: dict
+            Maps names of instantaneous values,
+            for example, a backlog, to their last value.
+    """
+    def __init__(self, stages=()):
+        self.histograms = {stage: LatencyHistogram() for stage in stages}
+        self.gauges = {}
+
+    def record(self, stage, seconds):
+        """Method to record the duration of a stage, in seconds."""
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms.setdefault(stage, LatencyHistogram())  # noqa E501
+        histogram.record(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        """Context manager that records the duration of its block."""
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - t_start)
+
+    def set_gauge(self, name, value):
+        """Method to set the last value of an instantaneous quantity."""
+        self.gauges[name] = value
+
+    def reset(self):
+        """Method to discard all recorded durations and gauges."""
+        for histogram in list(self.histograms.values()):
+            histogram.reset()
+        self.gauges.clear()
+
+    def summary(self):
+        """Method that returns, for each stage, a dict with
+        `count`, `p50`, `p99`, `max` and `last` durations in seconds.
+        """
+        summary = {}
+        for stage, histogram in list(self.histograms.items()):
+            summary[stage] = {"count": histogram.count,
+                              "p50": histogram.percentile(50),
+                              "p99": histogram.percentile(99),
+                              "max": histogram.max,
+                              "last": histogram.last}
+        return summary
@@ -0,0 +1,298 @@
+##########################################################################
+# FIREpyDAQ - Facilitated Interface for Recording Experiments,
+# a python-package for Data Acquisition.
+# Copyright (C) 2024  Dushyant M. Chaudhari
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#########################################################################
+
+# Memory-mapped staging of acquired chunks
+import json
+import mmap
+import os
+import struct
+from datetime import datetime
+
+import numpy as np
+
+staging_suffix = ".staging"
+""" str
+    Extension of the staging file of a `.parquet` data file.
+
+    For example, chunks of data saved in `Exp1.parquet`
+    are staged in `Exp1.staging` until they are converted to Parquet.
+"""
+
+staging_magic = b"FPDQSTG1"
+block_magic = b"BLK1"
+header_size = 4096
+_header_struct = struct.Struct("<8sIII")  # magic, version, header size, channels  # noqa E501
+_block_struct = struct.Struct("<4sIq")  # magic, samples, block index
+
+
+def staging_path(parquet_file):
+    """Function that returns the staging file of `parquet_file`.
+    """
+    return parquet_file.split(".parquet")[0] + staging_suffix
+
+
+def _block_size(n_channels, n_samples):
+    # Header, absolute times, relative times and data,
+    # padded so that every block starts 8 bytes aligned.
+    size = _block_struct.size + 16*n_samples + 4*n_channels*n_samples
+    return size + (-size) % 8
+
+
+class StagingWriter():
+    """An append-only, memory-mapped binary file where acquired chunks
+    are staged before they are converted to Parquet.
+
+    The file is preallocated, so appending a chunk is a copy into
+    memory and no encoding happens in the acquisition thread.
+    Staged chunks are in the operating system page cache as soon as
+    they are appended, so they survive a crash of the program, and
+    can be read by a `StagingReader` while acquisition is running.
+
+    File layout:
+
+    - A header of `header_size` bytes: `staging_magic`, format version,
+      header size and number of channels (little endian uint32),
+      followed by a JSON object with the saved `columns` and `dt_format`.
+    - One block per chunk: block magic, number of samples (uint32) and
+      block index (int64), then the absolute times (int64 ns since epoch),
+      relative times (float64 s), and data (float32) one channel after
+      the other. The block header is written last, so a block is
+      only read once all its data is written.
+
+    Parameters
+    ----------
+        path: str
+            Path of the staging file, see `staging_path()`.
+        columns: list
+            Names of the saved columns: absolute time,
+            relative time and one per channel.
+        dt_format: str, optional
+            If given, absolute times are saved as strings in this
+            python `strftime` format when converted to Parquet.
+            Default: None, saved as `polars.Datetime`.
+        prealloc_bytes: int, optional
+            Size by which the file is allocated, and grown when full.
+            Default: 256 MiB
+
+    Attributes
+    ----------
+        blocks_written: int
+            Number of chunks staged so far.
+        rows_written: int
+            Number of rows staged so far.
+        size: int
+            Number of bytes used in the file.
+    """
+    def __init__(self, path, columns, dt_format=None, prealloc_bytes=2**28):
+        self.path = path
+        self.columns = list(columns)
+        self.n_channels = len(self.columns) - 2
+        self.prealloc_bytes = max(int(prealloc_bytes), header_size)
+        self.blocks_written = 0
+        self.rows_written = 0
+        self.size = header_size
+        self.closed = False
+
+        header = json.dumps({"columns": self.columns,
+                             "dt_format": dt_format,
+                             "created": datetime.now().isoformat()}).encode()  # noqa E501
+        if _header_struct.size + len(header) > header_size:
+            raise ValueError("Too many columns for a staging file header.")
+        self._file = open(path, "x+b")
+        self._allocate(self.prealloc_bytes)
+        self._mmap[:_header_struct.size] = _header_struct.pack(staging_magic, 1, header_size, self.n_channels)  # noqa E501
+        self._mmap[_header_struct.size:_header_struct.size + len(header)] = header  # noqa E501
+
+    def _allocate(self, length):
+        # Reserves disk space, so that a full disk fails here
+        # and not when a page of the mapping is written.
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(self._file.fileno(), 0, length)
+        else:
+            self._file.truncate(length)
+        self._mmap = mmap.mmap(self._file.fileno(), length)
+
+    def append(self, chunk):
+        """Method to stage a chunk acquired by `AcquisitionEngine`.
+
+        Parameters
+        ----------
+            chunk: dict
+                With `Time`, `AbsoluteTime` and `Data` arrays.
+        """
+        if self.closed:
+            raise ValueError("Cannot write to a closed file: " + self.path)
+        data = np.asarray(chunk["Data"]).reshape(self.n_channels, -1)
+        n = data.shape[1]
+        block_size = _block_size(self.n_channels, n)
+        if self.size + block_size > len(self._mmap):
+            length = len(self._mmap)
+            self._mmap.close()
+            self._allocate(length + max(self.prealloc_bytes, block_size))
+        start = self.size + _block_struct.size
+        buffer = self._mmap
+        np.frombuffer(buffer, np.int64, n, start)[:] = np.asarray(chunk["AbsoluteTime"], "datetime64[ns]").view(np.int64)  # noqa E501
+        np.frombuffer(buffer, np.float64, n, start + 8*n)[:] = chunk["Time"]
+        np.frombuffer(buffer, np.float32, self.n_channels*n, start + 16*n).reshape(self.n_channels, n)[:] = data  # noqa E501
+        # Committed once the data is written
+        _block_struct.pack_into(buffer, self.size, block_magic, n, self.blocks_written)  # noqa E501
+        self.size += block_size
+        self.blocks_written += 1
+        self.rows_written += n
+
+    def flush(self):
+        """Method to write staged chunks to disk.
+        """
+        if not self.closed:
+            self._mmap.flush()
+
+    def close(self):
+        """Method to flush the file and release the unused
+        preallocated space.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self._mmap.flush()
+        self._mmap.close()
+        self._file.truncate(self.size)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class StagingReader():
+    """A reader that returns the chunks staged in a staging
+    file since it was last read, while it is written or after
+    a crash. Only complete blocks are returned.
+
+    Parameters
+    ----------
+        path: str
+            Path of the staging file.
+
+    Attributes
+    ----------
+        columns: list
+            Names of the saved columns.
+        dt_format: str or None
+            See `StagingWriter`.
+        blocks_read: int
+            Number of chunks read so far.
+        offset: int
+            Position in the file of the next block.
+
+    Raises
+    ------
+        ValueError
+            If `path` is not a staging file.
+    """
+    def __init__(self, path):
+        self.path = path
+        # Unbuffered, so that blocks staged after a read are seen
+        self._file = open(path, "rb", buffering=0)
+        header = self._file.read(header_size)
+        if len(header) < _header_struct.size:
+            self._file.close()
+            raise ValueError(path + " is not a staging file.")
+        magic, version, size, self.n_channels = _header_struct.unpack_from(header)  # noqa E501
+        if magic != staging_magic or version != 1:
+            self._file.close()
+            raise ValueError(path + " is not a staging file.")
+        info = json.loads(header[_header_struct.size:size].rstrip(b"\x00"))
+        self.columns = info["columns"]
+        self.dt_format = info.get("dt_format")
+        self.offset = size
+        self.blocks_read = 0
+
+    def _read_block(self):
+        self._file.seek(self.offset)
+        block_header = self._file.read(_block_struct.size)
+        if len(block_header) < _block_struct.size:
+            return None
+        magic, n, index = _block_struct.unpack(block_header)
+        if magic != block_magic or index != self.blocks_read or n == 0:
+            # Not written yet, or not a valid block
+            return None
+        block_size = _block_size(self.n_channels, n)
+        payload = self._file.read(block_size - _block_struct.size)
+        if len(payload) < 16*n + 4*self.n_channels*n:
+            # Truncated block
+            return None
+        chunk = {"AbsoluteTime": np.frombuffer(payload, np.int64, n, 0).view("datetime64[ns]"),  # noqa E501
+                 "Time": np.frombuffer(payload, np.float64, n, 8*n),
+                 "Data": np.frombuffer(payload, np.float32, self.n_channels*n, 16*n).reshape(self.n_channels, n)}  # noqa E501
+        self.offset += block_size
+        self.blocks_read += 1
+        return chunk
+
+    def read_chunks(self, max_chunks=None):
+        """Method that returns the chunks staged since the last call.
+
+        Parameters
+        ----------
+            max_chunks: int, optional
+                Maximum number of chunks returned. Default: all
+
+        Returns
+        -------
+            List of chunk dicts with `Time`, `AbsoluteTime` and `Data`
+            arrays, in acquisition order, that can be saved
+            with `DataWriter.chunks_dataframe()`.
+        """
+        chunks = []
+        while max_chunks is None or len(chunks) < max_chunks:
+            chunk = self._read_block()
+            if chunk is None:
+                break
+            chunks.append(chunk)
+        return chunks
+
+    def has_new(self):
+        """Method that returns `True` if a chunk
+        was staged since the last read.
+        """
+        offset = self.offset
+        self._file.seek(offset)
+        block_header = self._file.read(_block_struct.size)
+        if len(block_header) < _block_struct.size:
+            return False
+        magic, n, index = _block_struct.unpack(block_header)
+        return magic == block_magic and index == self.blocks_read and n > 0
+
+    def sync(self):
+        """Method to write staged chunks to disk,
+        for example, from a thread other than the writer.
+        """
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """Method to close the file.
+        """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
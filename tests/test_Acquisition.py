@@ -215,3 +215,23 @@ def test_NotificationPanel(qtbot):
         main_app.notify(msg, type=type)
         assert color == main_app.panel.color.name(), False
         assert msg in main_app.panel.toPlainText(), False
+
+
+def test_history_memory_bounded(qtbot):
+    import numpy as np
+    from types import SimpleNamespace
+    main_app = application()
+    qtbot.addWidget(main_app)
+    main_app.settings["Sampling Rate"] = "50000"
+    main_app.NIDAQ_Device = SimpleNamespace(ai_counter=128, ailabel_map={i: "AI" + str(i) for i in range(128)})  # noqa: E501
+    main_app.initiate_dataArrays()
+    assert main_app.history_samples == main_app.history_window*50000
+    assert main_app.ydata.capacity < main_app.history_samples
+    assert main_app.ydata._data.dtype == np.float32
+    used = main_app.ydata._data.nbytes + main_app.xdata._data.nbytes
+    assert used <= main_app.history_max_mb*2**20, "History exceeds history_max_mb"  # noqa: E501
+
+    # Low rates keep all raw samples of the history window
+    main_app.settings["Sampling Rate"] = "10"
+    main_app.initiate_dataArrays()
+    assert main_app.ydata.capacity == main_app.history_samples == main_app.history_window*10  # noqa: E501
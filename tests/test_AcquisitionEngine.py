@@ -0,0 +1,151 @@
+from firepydaq.acquisition.AcquisitionEngine import AcquisitionEngine
+from firepydaq.utilities.RingBuffer import RingBuffer
+import numpy as np
+import time
+
+
+class FakeStream:
+    avail_samp_per_chan = 0
+
+
+class FakeTiming:
+    samp_clk_rate = 100.0
+
+
+class FakeAITask:
+    def __init__(self):
+        self._in_stream = FakeStream()
+        self.timing = FakeTiming()
+
+
+class FakeDAQTask:
+    """Returns a chunk of 100 samples on each read"""
+    def __init__(self, n_channels):
+        self.aitask = FakeAITask()
+        self.numberOfSamples = 100
+        self.ao_counter = 0
+        self.n_channels = n_channels
+        self.reads = 0
+
+    def threadaitask(self):
+        self.reads += 1
+        start = (self.reads-1)*self.numberOfSamples
+        samples = np.arange(start, start + self.numberOfSamples, dtype=float)
+        return [samples*(i+1) for i in range(self.n_channels)]
+
+
+def make_engine(n_channels=2):
+    daq = FakeDAQTask(n_channels)
+    engine = AcquisitionEngine(daq, RingBuffer(n_channels, 250), RingBuffer(1, 250))  # noqa E501
+    return daq, engine
+
+
+def test_engine_read_chunk():
+    daq, engine = make_engine()
+    display = engine.add_consumer("display", maxsize=1)
+    save = engine.add_consumer("save", maxsize=0, drop_oldest=False)
+    assert engine.read_chunk() is None, "Chunk read before samples available"
+    daq.aitask._in_stream.avail_samp_per_chan = 100
+    for i in range(3):
+        engine.read_chunk()
+    # Display only keeps the latest chunk, saving keeps all of them in order
+    assert display.qsize() == 1
+    assert display.get()["Time"][0] == 2.0
+    times = np.concatenate([save.get()["Time"] for i in range(3)])
+    assert np.allclose(times, np.arange(300)/100)
+    assert engine.ydata.size == 250
+    assert np.array_equal(engine.ydata.channel(1), 2*np.arange(50, 300))
+
+
+def test_engine_thread():
+    daq, engine = make_engine(1)
+    save = engine.add_consumer("save", maxsize=0, drop_oldest=False)
+    daq.aitask._in_stream.avail_samp_per_chan = 100
+    engine.start()
+    time.sleep(0.2)
+    engine.stop()
+    assert not engine.is_alive()
+    assert save.qsize() == daq.reads > 0
+    assert engine.error is None
+
+
+def test_engine_full_queue_releases_lock():
+    import threading
+    daq, engine = make_engine(1)
+    save = engine.add_consumer("save", maxsize=1, drop_oldest=False)
+    daq.aitask._in_stream.avail_samp_per_chan = 100
+    engine.read_chunk()
+    # Saving is behind, the next chunk waits for space in the queue
+    reader = threading.Thread(target=engine.read_chunk)
+    reader.start()
+    time.sleep(0.2)
+    t_bef_lock = time.perf_counter()
+    with engine.lock:
+        waited = time.perf_counter() - t_bef_lock
+    assert waited < 0.1, "Engine lock held while waiting for the queue"
+    save.get()
+    reader.join()
+    assert save.get()["Time"][0] == 1.0
+
+
+def test_engine_remove_consumer_waits_for_put():
+    import threading
+    daq, engine = make_engine(1)
+    save = engine.add_consumer("save", maxsize=1, drop_oldest=False)
+    daq.aitask._in_stream.avail_samp_per_chan = 100
+    engine.read_chunk()
+    reader = threading.Thread(target=engine.read_chunk)
+    reader.start()
+    time.sleep(0.2)
+    # Saving takes a chunk while the consumer is removed
+    threading.Timer(0.2, save.get).start()
+    engine.remove_consumer("save")
+    assert save.qsize() == 1, "Chunk published to a removed consumer after removal"  # noqa E501
+    assert save.get_nowait()["Time"][0] == 1.0
+    reader.join()
+    engine.read_chunk()
+    assert save.empty()
+
+
+def test_engine_timings():
+    daq, engine = make_engine()
+    daq.aitask._in_stream.avail_samp_per_chan = 350
+    for i in range(2):
+        engine.read_chunk()
+    summary = engine.timings.summary()
+    for stage in ["DAQ read", "Buffer append", "Queue put"]:
+        assert summary[stage]["count"] == 2
+        assert summary[stage]["p99"] >= summary[stage]["p50"] > 0
+    # No MFCs to poll
+    assert summary["Alicat poll"]["count"] == 0
+    assert engine.timings.gauges == {"Samples backlog": 250, "Cycles behind": 2}  # noqa E501
+
+
+def test_engine_alicat_snapshot():
+    class FakePoller:
+        snapshot = {"MFC": {"mass_flow": 1.0}}
+
+    daq = FakeDAQTask(1)
+    engine = AcquisitionEngine(daq, RingBuffer(1, 250), RingBuffer(1, 250), alicat_poller=FakePoller())  # noqa E501
+    daq.aitask._in_stream.avail_samp_per_chan = 100
+    chunk = engine.read_chunk()
+    assert chunk["MFC"] == {"MFC": {"mass_flow": 1.0}}
+    assert engine.timings.summary()["Alicat poll"]["count"] == 1
+
+
+def test_engine_staging(tmp_path):
+    from firepydaq.utilities.StagingFile import StagingWriter, StagingReader
+    daq, engine = make_engine()
+    path = str(tmp_path / "Exp1.staging")
+    engine.set_staging(StagingWriter(path, ["AbsoluteTime", "Time", "AI1", "AI2"]))  # noqa E501
+    daq.aitask._in_stream.avail_samp_per_chan = 100
+    for i in range(3):
+        engine.read_chunk()
+    engine.staging.close()
+    engine.set_staging(None)
+    engine.read_chunk()
+    with StagingReader(path) as reader:
+        staged = reader.read_chunks()
+    assert len(staged) == 3
+    assert np.array_equal(staged[2]["Data"][1], 2*np.arange(200, 300))
+    assert engine.timings.summary()["Stage write"]["count"] == 3
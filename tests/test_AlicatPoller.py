@@ -0,0 +1,66 @@
+from firepydaq.api.AlicatPoller import AlicatPoller, device_loop
+import asyncio
+import time
+
+
+class FakeAlicat:
+    """Answers like an Alicat device after `delay` seconds"""
+    def __init__(self, delay, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.reads = 0
+
+    async def get(self):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("No answer")
+        self.reads += 1
+        return {"mass_flow": float(self.reads), "gas": "N2"}
+
+
+def test_poll_concurrently():
+    devices = {"MFC" + str(i): FakeAlicat(0.05) for i in range(5)}
+    devices["Broken"] = FakeAlicat(0.01, fail=True)
+    poller = AlicatPoller({name: dev.get for name, dev in devices.items()})
+    t_start = time.perf_counter()
+    device_loop().run(poller.poll_once())
+    # Devices are read together, not one after the other
+    assert time.perf_counter() - t_start < 0.2
+    assert sorted(poller.snapshot) == ["MFC" + str(i) for i in range(5)]
+    assert poller.snapshot["MFC0"]["mass_flow"] == 1.0
+    assert "Timestamp" in poller.snapshot["MFC0"]
+    assert "ConnectionError" in poller.errors["Broken"]
+
+
+def test_poller_thread():
+    device = FakeAlicat(0.001)
+    poller = AlicatPoller({"MFC": device.get}, interval=0.01)
+    poller.start()
+    time.sleep(0.2)
+    assert poller.is_running()
+    snapshot = poller.snapshot
+    poller.stop()
+    assert not poller.is_running()
+    cycles = poller.cycles
+    assert cycles > 5
+    # Published snapshots are replaced, never changed
+    assert snapshot["MFC"]["mass_flow"] <= poller.snapshot["MFC"]["mass_flow"]  # noqa E501
+    time.sleep(0.05)
+    assert poller.cycles == cycles, "Polling after stop"
+
+
+def test_poller_recording():
+    device = FakeAlicat(0)
+    poller = AlicatPoller({"MFC": device.get, "MFM": FakeAlicat(0).get})
+    device_loop().run(poller.poll_once())
+    assert poller.drain()["MFC"] == ([], {}), "Buffered before recording"
+    poller.start_recording()
+    for i in range(3):
+        device_loop().run(poller.poll_once())
+    poller.stop_recording()
+    device_loop().run(poller.poll_once())
+    times, columns = poller.drain()["MFC"]
+    assert len(times) == 3
+    assert times == sorted(times)
+    assert columns == {"mass_flow": [2.0, 3.0, 4.0], "gas": ["N2"]*3}
+    assert poller.buffers["MFC"].size == 0
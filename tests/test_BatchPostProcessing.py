@@ -0,0 +1,84 @@
+from firepydaq.utilities.BatchPostProcessing import (main, discover_tests,
+                                                     load_manifest)
+from firepydaq.utilities import BatchPostProcessing
+import numpy as np
+import polars as pl
+import json
+import os
+import shutil
+import pytest
+
+
+def make_test(folder, name):
+    os.makedirs(folder, exist_ok=True)
+    datapath = os.path.join(folder, name + ".parquet")
+    shutil.copy(pytest.datapath, datapath)
+    settings = {"Test Name": datapath, "Config File": pytest.configpath,
+                "Formulae File": pytest.formulaepath}
+    json_path = os.path.join(folder, name + ".json")
+    with open(json_path, "w") as f:
+        json.dump(settings, f)
+    return json_path
+
+
+def test_batch_postprocess(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for repo_path in ["datapath", "configpath", "formulaepath"]:
+        monkeypatch.setattr(pytest, repo_path, os.path.join(os.path.dirname(os.path.dirname(__file__)), getattr(pytest, repo_path)))  # noqa E501
+    formulaepath = str(tmp_path / "Formulae.csv")
+    shutil.copy(pytest.formulaepath, formulaepath)
+    monkeypatch.setattr(pytest, "formulaepath", formulaepath)
+    tests = [make_test(str(tmp_path / "Data" / "Project1"), "Test1"),
+             make_test(str(tmp_path / "Data" / "Project2"), "Test2")]
+    # Not a test
+    with open(tmp_path / "Data" / "other.json", "w") as f:
+        json.dump({"a": 1}, f)
+    assert discover_tests([str(tmp_path / "Data" / "**" / "*.json")]) == sorted(tests)  # noqa E501
+
+    manifest_path = str(tmp_path / "manifest.json")
+    args = [str(tmp_path / "Data"), "--manifest", manifest_path, "--workers", "2"]  # noqa E501
+    assert main(args) == 0
+    manifest = load_manifest(manifest_path)
+    assert manifest["summary"]["processed"] == 2
+    for json_path in tests:
+        result = manifest["tests"][json_path]
+        assert result["rows"] == 8590
+        assert os.path.isfile(result["output"])
+        assert result["duration_s"] > 0
+
+    # Unchanged tests are skipped, without reading their files
+    with monkeypatch.context() as m:
+        m.setattr(BatchPostProcessing, "input_hashes", lambda inputs: pytest.fail("Data hashed"))  # noqa E501
+        assert main(args) == 0
+    assert load_manifest(manifest_path)["summary"]["skipped"] == 2
+
+    # Files copied again, with the same content, are skipped
+    shutil.copy(pytest.datapath, tmp_path / "Data" / "Project1" / "Test1.parquet")  # noqa E501
+    assert main(args) == 0
+    assert load_manifest(manifest_path)["summary"]["skipped"] == 2
+
+    # Changed readings of a user-added device are processed again
+    t = np.arange(0.05, 200, 0.5)
+    device_data = pl.DataFrame({"AbsoluteTime": np.zeros(len(t), dtype="datetime64[ns]"), "Time": t, "mass_flow": 2*t})  # noqa E501
+    device_path = str(tmp_path / "Data" / "Project2" / "Test2_MFC.parquet")
+    device_data.write_parquet(device_path)
+    assert main(args) == 0
+    assert load_manifest(manifest_path)["summary"]["processed"] == 1
+    assert main(args) == 0
+    assert load_manifest(manifest_path)["summary"]["skipped"] == 2
+    device_data.with_columns(pl.col("mass_flow")*2).write_parquet(device_path)
+    assert main(args) == 0
+    assert load_manifest(manifest_path)["summary"]["processed"] == 1
+
+    # A changed formulae file is processed again
+    with open(formulaepath, "a") as f:
+        f.write("\nExtra,DuctO2*2,Extra,Extra,1,1,-")
+    assert main(args + ["--lazy"]) == 0
+    assert load_manifest(manifest_path)["summary"]["processed"] == 2
+
+    # Missing data fails without stopping other tests
+    os.remove(tmp_path / "Data" / "Project1" / "Test1.parquet")
+    assert main(args + ["--force"]) == 1
+    manifest = load_manifest(manifest_path)
+    assert manifest["summary"]["failed"] == 1
+    assert "FileNotFoundError" in manifest["tests"][tests[0]]["error"]
@@ -0,0 +1,42 @@
+from firepydaq.dashboard.app import stop_on_event
+from firepydaq.utilities.PostProcessing import PostProcessData
+from firepydaq.utilities.DataWriter import parts_path
+from threading import Thread, Lock
+import multiprocessing as mp
+import polars as pl
+import pytest
+import shutil
+import time
+import os
+
+
+def run_dashboard(stop_event, **paths):
+    # Refreshes of the dashboard, until it is stopped
+    processed_obj = PostProcessData(**paths)
+    refresh_lock = Lock()
+    Thread(target=stop_on_event, args=(processed_obj, stop_event, refresh_lock), daemon=True).start()  # noqa E501
+    while True:
+        with refresh_lock:
+            processed_obj.ExtendData()
+        time.sleep(0.1)
+
+
+def test_dashboard_stop(tmp_path):
+    datapath = str(tmp_path / "Test.parquet")
+    shutil.copy(pytest.datapath, datapath)
+    processed_file = str(tmp_path / "Test_PostProcessed.parquet")
+    # Spawned like on Windows, polars threads are not safe to fork
+    context = mp.get_context("spawn")
+    stop_event = context.Event()
+    dashboard = context.Process(target=run_dashboard, args=(stop_event,),
+                                kwargs=dict(datapath=datapath, configpath=pytest.configpath, formulaepath=pytest.formulaepath))  # noqa E501
+    dashboard.start()
+    for i in range(300):
+        if os.path.isdir(parts_path(processed_file)):
+            break
+        time.sleep(0.1)
+    stop_event.set()
+    dashboard.join(30)
+    assert dashboard.exitcode == 0
+    assert not os.path.exists(parts_path(processed_file))
+    assert pl.read_parquet(processed_file).height == pl.read_parquet(datapath).height  # noqa E501
@@ -0,0 +1,69 @@
+from firepydaq.acquisition.DataSaver import DataSaver
+import queue
+import time
+
+
+def test_saver_batches_in_order():
+    chunk_queue = queue.Queue(maxsize=10)
+    saved = []
+
+    def slow_write(chunks):
+        time.sleep(0.05)
+        saved.append([c["Time"] for c in chunks])
+
+    saver = DataSaver(chunk_queue, slow_write, max_batch=4)
+    saver.start()
+    for i in range(12):
+        chunk_queue.put({"Time": i}, timeout=1)
+    saver.stop()
+
+    assert not saver.is_alive()
+    assert [t for batch in saved for t in batch] == list(range(12))
+    assert max(len(batch) for batch in saved) > 1, "Chunks were not batched"
+    assert max(len(batch) for batch in saved) <= 4
+    assert saver.chunks_saved == 12
+    assert saver.batches_saved == len(saved)
+
+
+def test_saver_reports_errors():
+    chunk_queue = queue.Queue(maxsize=2)
+    events = queue.Queue()
+
+    def failing_write(chunks):
+        raise OSError("Disk full")
+
+    saver = DataSaver(chunk_queue, failing_write, events=events)
+    saver.start()
+    chunk_queue.put({"Time": 0})
+    saver.stop()
+
+    messages = []
+    while not events.empty():
+        messages.append(events.get_nowait())
+    assert any(type == "error" and "Disk full" in text for type, text in messages)  # noqa E501
+    # Metrics are reported once saving stops
+    assert any(text.startswith("Saving:") for type, text in messages)
+
+
+def test_staging_compactor(tmp_path):
+    import numpy as np
+    from firepydaq.acquisition.DataSaver import StagingCompactor
+    from firepydaq.utilities.StagingFile import StagingWriter
+
+    path = str(tmp_path / "Exp1.staging")
+    writer = StagingWriter(path, ["AbsoluteTime", "Time", "AI1"])
+    saved = []
+    compactor = StagingCompactor(path, lambda chunks: saved.extend(chunks), max_batch=4)  # noqa E501
+    compactor.start()
+    for i in range(12):
+        times = np.arange(10) + 10*i
+        writer.append({"Time": times,
+                       "AbsoluteTime": times.astype("datetime64[s]"),
+                       "Data": times[np.newaxis, :]})
+        time.sleep(0.005)
+    writer.close()
+    compactor.stop()
+
+    assert not compactor.is_alive()
+    assert np.array_equal(np.concatenate([c["Time"] for c in saved]), np.arange(120))  # noqa E501
+    assert compactor.chunks_saved == 12
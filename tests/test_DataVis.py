@@ -0,0 +1,150 @@
+from firepydaq.acquisition.acquisition import application
+from firepydaq.utilities.RingBuffer import RingBuffer
+from firepydaq.utilities.StageTimer import StageTimer
+from firepydaq.utilities.Decimation import MinMaxHistory
+from PySide6.QtGui import QAction
+import numpy as np
+import threading
+
+
+def show_data_vis(qtbot, config_file):
+    main_app = application()
+    qtbot.addWidget(main_app)
+    main_app.findChild(QAction, "DispTab").trigger()
+    vis = main_app.data_vis_tab
+    vis.set_labels(config_file)
+    main_app.show()
+    main_app.input_tab_widget.setCurrentWidget(vis.content)
+    qtbot.waitExposed(main_app)
+    # Every refresh draws a frame
+    vis.cpu_budget = float("inf")
+    return main_app, vis
+
+
+def test_frame_feed(qtbot):
+    main_app, vis = show_data_vis(qtbot, "tests/Example_Config_Formulae/Config_Testing.csv")  # noqa E501
+    vis.dev_edit.setCurrentIndex(1)
+
+    xdata = RingBuffer(1, 1000)
+    ydata = RingBuffer(vis.dev_edit.count(), 1000)
+    lock = threading.RLock()
+    timings = StageTimer()
+    xdata.append(np.arange(500)/100)
+    ydata.append(np.vstack([np.arange(500)*(i+1) for i in range(ydata.n_channels)]))  # noqa E501
+
+    curve = vis.curve
+    vis.start(xdata, ydata, lock, timings)
+    assert vis.is_feeding()
+    vis.refresh()
+    x, y = vis.curve.getData()
+    assert vis.curve is curve, "Curve not reused."
+    assert x[-1] == 4.99 and y[-1] == 499*2, "Selected channel not plotted."
+    assert timings.histograms["Plot"].count == 1
+
+    # Unchanged data is not drawn again
+    vis.refresh()
+    assert timings.histograms["Plot"].count == 1
+
+    # A busy acquisition lock skips the frame instead of waiting
+    xdata.append(np.arange(500, 600)/100)
+    ydata.append(np.vstack([np.arange(500, 600)*(i+1) for i in range(ydata.n_channels)]))  # noqa E501
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold_lock():
+        with lock:
+            held.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    held.wait(5)
+    vis.refresh()
+    assert vis.curve.getData()[0][-1] == 4.99, "Frame drawn with a busy lock."  # noqa E501
+    release.set()
+    holder.join()
+    vis.refresh()
+    assert vis.curve.getData()[0][-1] == 5.99
+    assert len(vis.plot_graph.getPlotItem().listDataItems()) == 1
+
+    # Frames are skipped right after a frame, within the CPU budget
+    vis.cpu_budget = 0.2
+    for n in range(2):
+        xdata.append(np.array([6 + n/100]))
+        ydata.append(np.zeros((ydata.n_channels, 1)))
+        vis.refresh()
+    assert vis.curve.getData()[0][-1] == 6, "Frame drawn over CPU budget."  # noqa E501
+
+    vis.stop()
+    assert not vis.is_feeding()
+
+
+def test_minmax_history():
+    history = MinMaxHistory(2, 100, 10)
+    x = np.arange(1005)/10
+    y = np.vstack([np.sin(x), np.cos(x)])
+    y[0, 503] = 9
+    for i in range(0, 1005, 37):
+        history.append(x[i:i+37], y[:, i:i+37])
+    hx, hy = history.channel(0)
+    assert history.total_samples == 1005
+    # 100 buckets of min and max, then 5 samples of the incomplete bucket
+    assert len(hx) == 205 and hx[-1] == x[-1]
+    assert hy.max() == 9, "Peak lost"
+    assert np.all(np.diff(hx) >= 0), "Points out of order"
+
+
+def test_chart_grid(qtbot):
+    main_app, vis = show_data_vis(qtbot, "tests/Example_Config_Formulae/20240329_1354_CalorimetryWLaser_Dushyant.csv")  # noqa E501
+    n_channels = vis.dev_edit.count()
+    assert len(vis.grid_curves) == n_channels
+    # Ambient humidity, temperature and pressure in separate plots
+    assert len({id(plot) for index, plot, curve in vis.grid_curves[:3]}) == 3  # noqa E501
+    # Duct thermocouples in the same plot
+    assert len({id(plot) for index, plot, curve in vis.grid_curves[3:6]}) == 1  # noqa E501
+
+    vis.grid_check.setChecked(True)
+    assert vis.grid_graph.isVisible() and not vis.plot_graph.isVisible()
+    capacity = 100000
+    xdata = RingBuffer(1, capacity)
+    ydata = RingBuffer(n_channels, capacity)
+    vis.start(xdata, ydata, threading.RLock())
+    assert vis.history.bucket_size > 1
+    curves = [curve for index, plot, curve in vis.grid_curves]
+    for n in range(5):
+        x = np.arange(n*30000, (n+1)*30000)/1000
+        xdata.append(x)
+        ydata.append(np.vstack([np.sin(x) + i for i in range(n_channels)]))  # noqa E501
+        vis.refresh()
+    assert [curve for index, plot, curve in vis.grid_curves] == curves
+    for index, plot, curve in vis.grid_curves:
+        x, y = curve.getData()
+        assert len(x) <= 2*plot.getViewBox().width() + 2
+        assert x[-1] == 149.999 and abs(y.max() - (1 + index)) < 1e-3
+
+    # A zoomed in plot shows the raw samples of its range
+    index, plot, curve = vis.grid_curves[0]
+    plot.setXRange(140, 140.1, padding=0)
+    vis.refresh()
+    x, y = curve.getData()
+    assert np.allclose(np.diff(x), 0.001), "Zoomed plot not raw"
+    assert x[0] <= 140 and x[-1] >= 140.1
+
+    vis.stop()
+
+    # A history longer than the raw samples held in the buffers
+    xdata = RingBuffer(1, 10000)
+    ydata = RingBuffer(n_channels, 10000)
+    vis.start(xdata, ydata, threading.RLock(), history_samples=capacity)
+    for n in range(5):
+        x = np.arange(n*30000, (n+1)*30000)/1000
+        xdata.append(x)
+        ydata.append(np.vstack([np.sin(x) + i for i in range(n_channels)]))  # noqa E501
+        vis.refresh()
+    # Zoomed in before the raw samples, the history is plotted
+    plot.setXRange(100, 100.1, padding=0)
+    vis.refresh()
+    x, y = curve.getData()
+    assert x[0] <= 100 and x[-1] >= 100.1
+    assert not np.allclose(np.diff(x), 0.001), "Plotted raw samples that are no longer held"
+    vis.stop()
@@ -0,0 +1,148 @@
+from firepydaq.utilities.DataWriter import (StreamingParquetWriter,
+                                            PartitionedParquetWriter,
+                                            SavedDataReader,
+                                            partition_manifest,
+                                            saved_data_files,
+                                            scan_saved_data,
+                                            read_saved_data, parts_path,
+                                            absolute_timestamps,
+                                            chunks_dataframe, time_zero,
+                                            readings_dataframe,
+                                            device_data_files,
+                                            read_device_data)
+from datetime import datetime
+import time
+import polars as pl
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+import numpy as np
+import os
+
+
+schema = {"AbsoluteTime": pl.String, "Time": pl.Float32, "TC1": pl.Float32}
+
+
+def make_chunk(n, t0):
+    time_data = np.arange(t0, t0 + n, dtype=np.float32)
+    return pl.DataFrame({"AbsoluteTime": [str(t) for t in time_data],
+                         "Time": time_data,
+                         "TC1": time_data*2}, schema=schema)
+
+
+def test_streaming_writer(tmp_path):
+    parquet_file = str(tmp_path / "Test1.parquet")
+    writer = StreamingParquetWriter(parquet_file, schema)
+    for i in range(5):
+        writer.write(make_chunk(10, i*10))
+        # Saved data must be readable while saving is in progress
+        assert read_saved_data(parquet_file).height == (i+1)*10
+    assert not os.path.isfile(parquet_file)
+    writer.close()
+
+    assert os.path.isfile(parquet_file)
+    assert not os.path.exists(parts_path(parquet_file))
+    assert pq.ParquetFile(parquet_file).metadata.num_row_groups == 5
+    df = pl.read_parquet(parquet_file)
+    assert df.schema == pl.Schema(schema)
+    assert df["Time"].to_list() == list(range(50)), "Chunks out of order"
+
+
+def test_streaming_writer_existing_file(tmp_path):
+    parquet_file = str(tmp_path / "Test2.parquet")
+    make_chunk(10, 0).write_parquet(parquet_file)
+    with StreamingParquetWriter(parquet_file, schema) as writer:
+        assert writer.rows_written == 10
+        writer.write(make_chunk(10, 10))
+    assert pl.read_parquet(parquet_file).height == 20
+
+
+def test_partitioned_writer(tmp_path):
+    parquet_file = str(tmp_path / "Test3.parquet")
+    reader = SavedDataReader(parquet_file)
+    read = []
+    writer = PartitionedParquetWriter(parquet_file, schema, partition_seconds=30)  # noqa E501
+    for i in range(10):
+        writer.write(make_chunk(10, i*10))
+        read += reader.read_new()["Time"].to_list()
+        assert read_saved_data(parquet_file).height == (i+1)*10
+    assert [p["chunks"] for p in writer.partitions] == [4, 4]
+    writer.close()
+    assert reader.read_new().is_empty()
+    assert read == list(range(100)), "Rows lost or repeated across partitions"  # noqa E501
+    assert not os.path.exists(parts_path(parquet_file))
+
+    partitions = partition_manifest(parquet_file)
+    assert [(p["time_min"], p["time_max"], p["rows"]) for p in partitions] == [(0, 39, 40), (40, 79, 40), (80, 99, 20)]  # noqa E501
+    assert (partitions[0]["absolute_time_start"], partitions[0]["absolute_time_end"]) == ("0.0", "39.0")  # noqa E501
+    assert pl.scan_parquet(parquet_file + "/*.parquet").collect()["Time"].to_list() == list(range(100))  # noqa E501
+    assert ds.dataset(parquet_file).count_rows() == 100
+    # A time window only opens the partitions it overlaps
+    files = saved_data_files(parquet_file, time_range=(45, 85))
+    assert [os.path.basename(f) for f in files] == [p["file"] for p in partitions[1:]]  # noqa E501
+    assert scan_saved_data(parquet_file, (45, 85)).collect()["Time"].to_list() == list(range(45, 86))  # noqa E501
+    # Rows already read are skipped, in and after partitions
+    assert SavedDataReader(parquet_file, rows_read=55).read_new()["Time"].to_list() == list(range(55, 100))  # noqa E501
+
+    # Saving again in the same test adds partitions
+    with PartitionedParquetWriter(parquet_file, schema, partition_bytes=1) as writer:  # noqa E501
+        assert writer.rows_written == 100 and writer.chunks_written == 10
+        writer.write(make_chunk(10, 100))
+        assert len(writer.partitions) == 4
+    assert read_saved_data(parquet_file)["Time"].to_list() == list(range(110))  # noqa E501
+
+
+def test_chunks_dataframe():
+    t_now = datetime(2024, 1, 2, 3, 4, 5, 600000)
+    chunks = []
+    for i in range(3):
+        time_data = np.arange(i*4, (i+1)*4)/10
+        chunks.append({"Time": time_data,
+                       "AbsoluteTime": absolute_timestamps(t_now, time_data),
+                       "Data": time_data*2})
+    df = chunks_dataframe(chunks, schema, "%Y-%m-%d %H:%M:%S:%f")
+    assert df.schema == schema
+    assert df.height == 12
+    assert df["AbsoluteTime"][1] == "2024-01-02 03:04:05:700000"
+    assert np.allclose(df["TC1"].to_numpy(), df["Time"].to_numpy()*2)
+
+
+def test_readings_dataframe():
+    # NI time is 1.5 s at the first sample of a chunk read now
+    t_now = datetime.now()
+    chunk = {"Time": np.array([1.5, 1.6]),
+             "AbsoluteTime": absolute_timestamps(t_now, [0, 0.1])}
+    t_zero = time_zero(chunk)
+    t_ns = time.time_ns()
+    times = [t_ns, t_ns + 250_000_000]
+    df = readings_dataframe(times, {"mass_flow": [1, 2.5], "gas": ["N2", None]}, t_zero)  # noqa E501
+    assert df.columns == ["AbsoluteTime", "Time", "mass_flow", "gas"]
+    assert df.schema["AbsoluteTime"] == pl.Datetime("ns")
+    assert df.schema["mass_flow"] == pl.Float64
+    # Readings are on the NI time axis, to the nanosecond
+    assert abs(df["Time"][0] - 1.5) < 0.05
+    assert abs(df["Time"][1] - df["Time"][0] - 0.25) < 1e-9
+
+
+def test_device_data_files(tmp_path):
+    stem = str(tmp_path / "Exp1")
+    readings = pl.DataFrame({"AbsoluteTime": [datetime.now()], "Time": [0.5], "mass_flow": [1.0]})  # noqa E501
+    readings.write_parquet(stem + "_MFC-1.parquet")
+    # Saving in progress
+    writer = StreamingParquetWriter(stem + "_MFC-2.parquet", readings.schema)
+    writer.write(readings)
+    # Saved by earlier versions
+    with open(stem + "_MFC-3.csv", "w") as f:
+        f.write(",mass_flow,gas\n0.5,1.0,N2\n")
+    # Not device files
+    readings.write_parquet(stem + "_PostProcessed.parquet")
+    readings.write_parquet(stem + "_01.parquet")
+    open(stem + "_01.json", "w").close()
+
+    files = device_data_files(stem + ".parquet")
+    assert list(files) == ["MFC-1", "MFC-2", "MFC-3"]
+    assert list(device_data_files(stem + ".parquet", ["MFC-2", "MFC-4"])) == ["MFC-2"]  # noqa E501
+    for name, path in files.items():
+        df = read_device_data(path)
+        assert df.columns[:2] == ["Time", "mass_flow"], name
+        assert df.schema["Time"] == pl.Float64
+        assert df["Time"][0] == 0.5
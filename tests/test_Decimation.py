@@ -0,0 +1,39 @@
+from firepydaq.utilities.Decimation import (minmax_decimate, lttb_decimate,
+                                            decimate)
+import numpy as np
+import pytest
+
+
+def make_series(n=100003):
+    x = np.arange(n)/1000
+    y = np.sin(x)
+    y[54321] = 10  # peak
+    y[777] = -10  # dip
+    return x, y
+
+
+def test_minmax_decimate():
+    x, y = make_series()
+    x_out, y_out = minmax_decimate(x, y, 2000)
+    assert len(y_out) <= 2000
+    assert y_out.max() == 10 and y_out.min() == -10, "Peaks lost"
+    assert np.all(np.diff(x_out) >= 0), "Points out of order"
+    assert x_out[0] == x[0] and x_out[-1] == x[-1]
+    # Short series are not decimated
+    x_short, y_short = minmax_decimate(x[:100], y[:100], 2000)
+    assert len(y_short) == 100
+
+
+def test_lttb_decimate():
+    x, y = make_series()
+    x_out, y_out = lttb_decimate(x, y, 1000)
+    assert len(y_out) == 1000
+    assert y_out.max() == 10 and y_out.min() == -10, "Peaks lost"
+    assert x_out[0] == x[0] and x_out[-1] == x[-1]
+    assert np.all(np.diff(x_out) > 0), "Points out of order"
+
+
+def test_decimate_method():
+    x, y = make_series()
+    with pytest.raises(ValueError):
+        decimate(x, y, 10, method="mean")
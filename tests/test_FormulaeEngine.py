@@ -0,0 +1,79 @@
+from firepydaq.utilities.FormulaeEngine import CompiledFormulae
+import polars as pl
+import numpy as np
+
+
+def make_formulae(rows):
+    return pl.DataFrame(rows, schema=["Label", "RHS", "Chart"], orient="row")
+
+
+def test_compiled_formulae():
+    formulae = make_formulae([["T_F", "T_C*mult + 32", "Temperature"],
+                              ["mult", "9/5", "Constant"],
+                              ["T_base", "mean(T_C[:2])", "Intermediate"],
+                              ["dT", "abs(T_C - T_base)", "Delta"]])
+    df = pl.DataFrame({"Time": [0., 1., 2.], "T_C": [10., 20., 40.]})
+    engine = CompiledFormulae(formulae, df.columns)
+    assert engine.errors == {}
+    assert engine.labels.index("mult") < engine.labels.index("T_F"), "Dependencies not ordered"  # noqa E501
+    result = engine.evaluate(df)
+    assert result.columns == ["Time", "T_C", "T_F", "dT"]
+    assert np.allclose(result["T_F"], [50, 68, 104])
+    assert np.allclose(result["dT"], [5, 5, 25])
+    assert engine.aggregates == {"T_base"}
+
+    # Formulae not evaluated keep their previous values
+    tail = pl.DataFrame({"Time": [3.], "T_C": [100.]})
+    result = engine.evaluate(tail, labels=["T_F", "dT"])
+    assert np.allclose(result["dT"], [85])
+
+
+def test_compile_errors():
+    formulae = make_formulae([["a", "T_C*", "Test"],
+                              ["b", "unknown + T_C", "Test"],
+                              ["c", "d + 1", "Test"],
+                              ["d", "c + 1", "Test"],
+                              ["e", "b*2", "Test"],
+                              ["f", "sqrt(T_C)", "Test"]])
+    df = pl.DataFrame({"T_C": [4., 9.]})
+    engine = CompiledFormulae(formulae, df.columns)
+    failed = {label for label, error in engine.errors}
+    assert failed == {"a", "b", "c", "d", "e"}
+    assert engine.labels == ["f"]
+    assert engine.evaluate(df)["f"].to_list() == [2., 3.]
+
+
+def test_evaluate_lazy():
+    formulae = make_formulae([["T_F", "T_C*mult + 32", "Temperature"],
+                              ["mult", "9/5", "Constant"],
+                              ["T_base", "mean(T_C[:2])", "Intermediate"],
+                              ["dT", "sqrt(abs(T_C - T_base))", "Delta"],
+                              ["dT_max", "np.maximum(dT, 3)", "Delta"]])
+    df = pl.DataFrame({"Time": [0., 1., 2.], "T_C": [10., 20., 40.]},
+                      schema={"Time": pl.Float32, "T_C": pl.Float32})
+    engine = CompiledFormulae(formulae, df.columns)
+    lf = engine.evaluate_lazy(df.lazy())
+    assert isinstance(lf, pl.LazyFrame)
+    assert engine.values == {"mult": 9/5, "T_base": 15}
+    assert engine.aggregates == {"T_base"}
+    result = lf.collect()
+    assert result.equals(CompiledFormulae(formulae, df.columns).evaluate(df))
+    assert result["dT_max"].dtype == pl.Float32
+    assert np.allclose(result["dT_max"], [3, 3, 5])
+
+
+def test_evaluate_lazy_native(caplog):
+    formulae = make_formulae([["T_pos", "np.where(T_C > 15, T_C, 0)", "Test"],
+                              ["T_clip", "np.clip(np.minimum(T_C, 30), 12, 25)", "Test"],  # noqa E501
+                              ["T_sq", "np.power(T_C, 2)", "Test"],
+                              ["T_sum", "np.cumsum(T_C)", "Test"]])
+    df = pl.DataFrame({"Time": [0., 1., 2.], "T_C": [10., 20., 40.]},
+                      schema={"Time": pl.Float32, "T_C": pl.Float32})
+    engine = CompiledFormulae(formulae, df.columns)
+    with caplog.at_level("WARNING", logger="firepydaq_logger"):
+        lf = engine.evaluate_lazy(df.lazy())
+    # Only the formula that is not element-wise is held in memory
+    warnings = [record.getMessage() for record in caplog.records]
+    assert len(warnings) == 1 and "T_sum" in warnings[0]
+    result = lf.collect()
+    assert result.equals(CompiledFormulae(formulae, df.columns).evaluate(df))
@@ -48,6 +48,15 @@ def test_MiscButtons(qtbot):
     main_app.findChild(QAction, "DispAll").trigger()
     assert (main_app.display and main_app.dashboard and main_app.tab), "No display error."  # noqa E501
 
+    # Performance tab is added next to the Data Visualizer
+    main_app.findChild(QAction, "DispPerf").trigger()
+    tabs = main_app.input_tab_widget
+    assert tabs.indexOf(main_app.perf_tab.content) == tabs.indexOf(main_app.data_vis_tab.content) + 1, "Performance tab error."  # noqa E501
+    main_app.findChild(QAction, "NoDisp").trigger()
+    assert tabs.indexOf(main_app.perf_tab.content) > 0, "Performance tab removed."  # noqa E501
+    main_app.findChild(QAction, "DispPerf").trigger()
+    assert not hasattr(main_app, "perf_tab"), "Performance tab not removed."  # noqa E501
+
 
 def test_Loadjson(qtbot):
     time_out = 5
@@ -1,6 +1,7 @@
 from firepydaq.utilities.PostProcessing import PostProcessData
 import matplotlib.pyplot as plt
 import numpy as np
+import os
 import sys
 import pytest
 
@@ -67,8 +68,218 @@ def test_formulae_parser():
     formulae_parser_check(datapath=pytest.datapath, configpath=pytest.configpath, formulaepath=pytest.formulaepath)
 
 
+# Testing absolute time saved as strings or as datetimes
+def test_absolute_time_layouts():
+    from firepydaq.utilities.DataWriter import absolute_timestamps
+    from datetime import datetime
+    import polars as pl
+    rel_times = np.linspace(0.1, 1, 10)
+    abs_time = absolute_timestamps(datetime(2024, 6, 12, 17, 17, 33), rel_times)  # noqa E501
+    abs_series = pl.Series("AbsoluteTime", abs_time)
+    str_series = abs_series.dt.strftime("%Y-%m-%d %H:%M:%S:%6f")
+    for series in [abs_series, str_series, abs_series.cast(pl.Int64)]:
+        data = pl.DataFrame([series, pl.Series("Time", rel_times)])
+        testing = PostProcessData(datapath=data, configpath=pytest.configpath)  # noqa E501
+        assert (testing.GetAbsoluteTime() == abs_series).all(), "Absolute time mismatch"  # noqa E501
+
+
+# Testing scaling rules of the config file
+def test_scale_data(tmp_path):
+    import polars as pl
+    config = pl.DataFrame({"Label": ["TC1", "V1", "V2", "V3"],
+                           "Type": ["Thermocouple", "Voltage", "Voltage", "Voltage"],  # noqa E501
+                           "Chart": ["Temp", "Volt", " None", "Volt"],
+                           "AIRangeMin": ["0", "1", "1", "x"],
+                           "AIRangeMax": ["1", "5", "5", "1"],
+                           "ScaleMin": [0, -20, 0, 0],
+                           "ScaleMax": [1, 120, 1, 1],
+                           "Layout": [1, 1, 1, 1], "Position": [1, 1, 1, 1],  # noqa E501
+                           "Processed_Unit": ["C", "C", "V", "V"],
+                           "Legend": ["TC1", "V1", "V2", "V3"]})
+    configpath = str(tmp_path / "config.csv")
+    config.write_csv(configpath)
+    raw = np.linspace(1, 5, 9)
+    data = pl.DataFrame({"Time": raw, "TC1": raw, "V1": raw, "V2": raw, "V3": raw})  # noqa E501
+    testing = PostProcessData(datapath=data, configpath=configpath)
+    testing.ScaleData()
+    assert testing.df_processed.columns == ["Time", "TC1", "V1", "V3"], "Chart None not dropped"  # noqa E501
+    assert testing.df_processed.schema["V1"] == pl.Float32
+    assert np.allclose(testing.df_processed["V1"], (raw - 1)*140/4 - 20)
+    # Thermocouples and invalid scaling values are kept as is
+    assert np.allclose(testing.df_processed["TC1"], raw)
+    assert np.allclose(testing.df_processed["V3"], raw)
+
+
+# Testing live processing of only the rows saved since the last update
+def test_extend_data(tmp_path):
+    from firepydaq.utilities.DataWriter import (StreamingParquetWriter,
+                                                read_saved_data)
+    import polars as pl
+    data = pl.read_parquet(pytest.datapath)
+    live_path = str(tmp_path / "Live.parquet")
+    writer = StreamingParquetWriter(live_path, data.schema)
+    writer.write(data[:300])
+    live = PostProcessData(datapath=live_path, configpath=pytest.configpath, formulaepath=pytest.formulaepath)  # noqa E501
+    assert live.ExtendData()
+    for i in range(300, data.height, 1000):
+        writer.write(data[i:i+1000])
+        assert live.ExtendData()
+    assert not live.ExtendData(), "Rows processed twice"
+    writer.close()
+    assert not live.ExtendData(), "Rows processed twice after saving stopped"
+
+    # Data passed as a DataFrame, since the example test also has MFC readings
+    full = PostProcessData(datapath=data, configpath=pytest.configpath, formulaepath=pytest.formulaepath)  # noqa E501
+    full.UpdateData(dump_output=False)
+    assert live.df_processed.columns == full.df_processed.columns
+    assert live.df_processed.equals(full.df_processed), "Incremental processing differs"  # noqa E501
+    processed = read_saved_data(str(tmp_path / "Live_PostProcessed.parquet"))
+    assert processed.height == data.height
+
+
+def test_lazy_update_data(tmp_path):
+    from firepydaq.utilities.PostProcessing import LazyPostProcessData
+    import polars as pl
+    import shutil
+    datapath = str(tmp_path / "Test.parquet")
+    shutil.copy(pytest.datapath, datapath)
+    full = PostProcessData(datapath=datapath, configpath=pytest.configpath, formulaepath=pytest.formulaepath)  # noqa E501
+    full.UpdateData(dump_output=False)
+    lazy = LazyPostProcessData(datapath=datapath, configpath=pytest.configpath, formulaepath=pytest.formulaepath)  # noqa E501
+    assert isinstance(lazy.data_dict['data'], pl.LazyFrame)
+    lazy.UpdateData()
+    assert lazy.Errors == full.Errors
+    assert lazy.O2Base == pytest.approx(full.O2Base)
+    processed = pl.read_parquet(str(tmp_path / "Test_PostProcessed.parquet"))
+    assert processed.schema == full.df_processed.schema
+    for col in processed.columns[1:]:
+        assert np.allclose(processed[col].to_numpy(), full.df_processed[col].to_numpy(), rtol=1e-6, equal_nan=True), col  # noqa E501
+
+    # Baselines are from all data, whichever the time range
+    lazy.UpdateData(time_range=(100, 200), columns=["HRR"])
+    processed = pl.read_parquet(str(tmp_path / "Test_PostProcessed.parquet"))
+    assert processed.columns == ["Absolute_Time", "Time", "HRR"]
+    expected = full.df_processed.filter(pl.col("Time").is_between(100, 200))
+    assert processed.height == expected.height
+    assert np.allclose(processed["HRR"].to_numpy(), expected["HRR"].to_numpy(), rtol=1e-6)  # noqa E501
+
+
+def test_lazy_partitioned_data(tmp_path):
+    from firepydaq.utilities.PostProcessing import LazyPostProcessData
+    from firepydaq.utilities.DataWriter import (PartitionedParquetWriter,
+                                                saved_data_files)
+    import polars as pl
+    data = pl.read_parquet(pytest.datapath)
+    data = data.cast({col: pl.Float32 for col in data.columns[1:]})
+    single_path = str(tmp_path / "Single.parquet")
+    data.write_parquet(single_path)
+    datapath = str(tmp_path / "Test.parquet")
+    with PartitionedParquetWriter(datapath, data.schema, partition_seconds=60) as writer:  # noqa E501
+        for chunk in data.iter_slices(100):
+            writer.write(chunk)
+    assert len(writer.partitions) > 10
+    assert len(saved_data_files(datapath, (100, 150))) <= 2
+
+    full = PostProcessData(datapath=single_path, configpath=pytest.configpath)  # noqa E501
+    full.UpdateData(dump_output=False)
+    lazy = LazyPostProcessData(datapath=datapath, configpath=pytest.configpath)  # noqa E501
+    lazy.UpdateData(dump_output=False, time_range=(100, 150))
+    expected = full.df_processed.filter(pl.col("Time").is_between(100, 150))
+    assert lazy.df_processed.collect().equals(expected)
+
+
+# Testing reuse of the processed file when inputs did not change
+def test_update_data_cache(tmp_path, monkeypatch):
+    import polars as pl
+    import shutil
+    data = pl.read_parquet(pytest.datapath)
+    datapath = str(tmp_path / "Test.parquet")
+    processed_path = str(tmp_path / "Test_PostProcessed.parquet")
+    formulaepath = str(tmp_path / "formulae.csv")
+    shutil.copy(pytest.formulaepath, formulaepath)
+    data[:3000].write_parquet(datapath)
+    files = dict(datapath=datapath, configpath=pytest.configpath, formulaepath=formulaepath)  # noqa E501
+    PostProcessData(**files).UpdateData()
+    mtime = os.stat(processed_path).st_mtime_ns
+
+    # Unchanged inputs: nothing is processed again
+    cached = PostProcessData(**files)
+    monkeypatch.setattr(cached, "ScaleData", lambda: pytest.fail("Processed again"))  # noqa E501
+    cached.UpdateData()
+    monkeypatch.undo()
+    assert os.stat(processed_path).st_mtime_ns == mtime
+    assert cached.df_processed.height == 3000
+    full = PostProcessData(**files)
+    full.UpdateData(dump_output=False)
+    assert cached.df_processed.equals(full.df_processed)
+    assert cached.O2Base == pytest.approx(full.O2Base)
+    for label in ["Tmean", "rho_e", "vel_e", "m_e", "vel_dwyer", "m_dwyer"]:
+        assert isinstance(getattr(cached, label), np.ndarray)
+        assert np.allclose(getattr(cached, label), getattr(full, label), equal_nan=True), label + " differs from processing"  # noqa E501
+
+    # Appended rows only are processed and appended
+    data.write_parquet(datapath)
+    extended = PostProcessData(**files)
+    extended.UpdateData()
+    assert extended.reprocess_count == 0, "Rows processed earlier processed again"  # noqa E501
+    full = PostProcessData(**files)
+    full.UpdateData(dump_output=False)
+    processed = pl.read_parquet(processed_path)
+    assert processed.height == data.height
+    assert processed.equals(full.df_processed), "Extended processing differs"  # noqa E501
+    assert extended.df_processed.equals(full.df_processed)
+    assert np.allclose(extended.m_e, full.m_e, equal_nan=True)
+
+    # Rows processed earlier changed, with the same number of rows
+    data.with_columns(pl.when(pl.int_range(pl.len()) == 5000).then(pl.lit("100")).otherwise(pl.col("DuctTC1")).alias("DuctTC1")).write_parquet(datapath)  # noqa E501
+    rewritten = PostProcessData(**files)
+    rewritten.UpdateData()
+    full = PostProcessData(**files)
+    full.UpdateData(dump_output=False)
+    assert rewritten.df_processed["DuctTC1"][5000] == 100
+    assert pl.read_parquet(processed_path).equals(full.df_processed), "Stale processed data reused"  # noqa E501
+
+    # A changed formulae file processes all rows again
+    with open(formulaepath, "a") as f:
+        f.write("\n")
+    changed = PostProcessData(**files)
+    monkeypatch.setattr(changed, "ScaleData", lambda: pytest.fail("Processed again"))  # noqa E501
+    with pytest.raises(pytest.fail.Exception):
+        changed.UpdateData()
+
+
+# Testing the as-of join of device readings on NI times
+def test_join_device_data(tmp_path):
+    import polars as pl
+    import shutil
+    datapath = str(tmp_path / "Test.parquet")
+    shutil.copy(pytest.datapath, datapath)
+    t = np.arange(0.05, 200, 0.5)
+    pl.DataFrame({"AbsoluteTime": np.zeros(len(t), dtype="datetime64[ns]"),
+                  "Time": t, "mass_flow": 2*t, "gas": ["N2"]*len(t)}).write_parquet(str(tmp_path / "Test_MFC-Propane.parquet"))  # noqa E501
+    formulaepath = str(tmp_path / "formulae.csv")
+    shutil.copy(pytest.formulaepath, formulaepath)
+    with open(formulaepath, "a") as f:
+        f.write("\nPropaneFlow,MFC_Propane_mass_flow*2, Flow, Propane,1,1,-\n")  # noqa E501
+
+    testing = PostProcessData(datapath=datapath, configpath=pytest.configpath, formulaepath=formulaepath)  # noqa E501
+    testing.UpdateData(dump_output=False)
+    assert not testing.Errors
+    df = testing.df_processed.filter(pl.col("Time").is_between(1, 190))
+    # Last reading at or before each NI time
+    expected = 2*(np.floor((df["Time"].to_numpy() - 0.05)/0.5)*0.5 + 0.05)
+    assert np.allclose(df["MFC_Propane_mass_flow"].to_numpy(), expected, rtol=1e-5)  # noqa E501
+    assert np.allclose(df["PropaneFlow"].to_numpy(), 2*expected, rtol=1e-5)
+    assert (df["MFC_Propane_gas"] == "N2").all()
+    assert testing.df_processed["MFC_Propane_mass_flow"][0] is None
+
+    testing.interpolate_devices = True
+    testing.UpdateData(dump_output=False)
+    df = testing.df_processed.filter(pl.col("Time").is_between(1, 190))
+    assert np.allclose(df["MFC_Propane_mass_flow"].to_numpy(), 2*df["Time"].to_numpy(), rtol=1e-5)  # noqa E501
+
+
 if __name__ == "__main__":
-    import os
     user_specific_path = os.getcwd()
     jsonpath = 'tests/Example_ExpData/20240612_1717_ExampleFireData_Testing_Dushyant.json'  # noqa E501
     single_json_check(user_specific_path + os.sep + jsonpath)
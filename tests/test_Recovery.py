@@ -0,0 +1,125 @@
+from firepydaq.utilities.Recovery import recover_data, recover_test, main
+from firepydaq.utilities.DataWriter import (StreamingParquetWriter,
+                                            PartitionedParquetWriter,
+                                            read_saved_data,
+                                            absolute_timestamps,
+                                            chunks_dataframe, part_file,
+                                            parts_path, device_data_path)
+from firepydaq.utilities.StagingFile import StagingWriter, staging_path
+from datetime import datetime
+import numpy as np
+import polars as pl
+import json
+import os
+import pytest
+
+schema = {"AbsoluteTime": pl.Datetime("ns"), "Time": pl.Float32,
+          "AI1": pl.Float32, "AI2": pl.Float32}
+
+
+def make_chunks(n_chunks, n_samples=100):
+    t_start = datetime.now()
+    chunks = []
+    for i in range(n_chunks):
+        times = (np.arange(n_samples) + i*n_samples)/100
+        chunks.append({"Time": times,
+                       "AbsoluteTime": absolute_timestamps(t_start, times),
+                       "Data": np.random.rand(2, n_samples)})
+    return chunks
+
+
+def test_recover_parts(tmp_path):
+    parquet_file = str(tmp_path / "Exp1.parquet")
+    chunks = make_chunks(5)
+    writer = StreamingParquetWriter(parquet_file, schema)
+    for chunk in chunks:
+        writer.write(chunks_dataframe([chunk], schema))
+    # Killed while writing the 4th row group, the 5th is after the gap
+    with open(part_file(writer.parts_dir, 3), "wb") as f:
+        f.write(b"PAR1 truncated")
+
+    report = recover_data(parquet_file)
+    assert report["status"] == "recovered"
+    assert report["rows"] == 300 and report["sources"] == {"parts": 300}
+    assert report["time_range"] == pytest.approx((0, 2.99))
+    assert pl.read_parquet(parquet_file).equals(chunks_dataframe(chunks[:3], schema))  # noqa E501
+    assert os.path.isdir(parts_path(parquet_file))
+
+    # Saved file already complete
+    mtime = os.path.getmtime(parquet_file)
+    report = recover_data(parquet_file, clean=True)
+    assert report["status"] == "complete" and report["rows"] == 300
+    assert os.path.getmtime(parquet_file) == mtime
+    assert not os.path.isdir(parts_path(parquet_file))
+
+
+def test_recover_staging(tmp_path):
+    parquet_file = str(tmp_path / "Exp1.parquet")
+    chunks = make_chunks(6)
+    staging = StagingWriter(staging_path(parquet_file), list(schema), prealloc_bytes=10000)  # noqa E501
+    writer = StreamingParquetWriter(parquet_file, schema)
+    for i, chunk in enumerate(chunks):
+        staging.append(chunk)
+        if i < 2:
+            writer.write(chunks_dataframe([chunk], schema))
+    staging.flush()
+    # Crash: the staging file is neither closed nor converted
+
+    report = recover_data(parquet_file, clean=True)
+    assert report["status"] == "recovered" and report["rows"] == 600
+    assert report["sources"] == {"parts": 200, "staging": 400}
+    assert report["time_range"] == pytest.approx((0, 5.99))
+    assert report["absolute_time_range"][0] == str(chunks[0]["AbsoluteTime"][0].astype("datetime64[us]").item())  # noqa E501
+    assert pl.read_parquet(parquet_file).equals(chunks_dataframe(chunks, schema))  # noqa E501
+    assert not os.path.exists(staging_path(parquet_file))
+    assert not os.path.isdir(parts_path(parquet_file))
+
+
+def test_recover_partitions(tmp_path):
+    parquet_file = str(tmp_path / "Exp1.parquet")
+    chunks = make_chunks(6)
+    staging = StagingWriter(staging_path(parquet_file), list(schema), prealloc_bytes=10000)  # noqa E501
+    writer = PartitionedParquetWriter(parquet_file, schema, partition_seconds=2.5)  # noqa E501
+    for i, chunk in enumerate(chunks):
+        staging.append(chunk)
+        if i < 5:
+            writer.write(chunks_dataframe([chunk], schema))
+    staging.flush()
+    assert len(writer.partitions) == 1
+    # Killed while writing the 5th row group
+    with open(part_file(writer.parts_dir, 4), "wb") as f:
+        f.write(b"PAR1 truncated")
+
+    report = recover_data(parquet_file, clean=True)
+    assert report["status"] == "recovered" and report["rows"] == 600
+    assert report["sources"] == {"partitions": 300, "parts": 100, "staging": 200}  # noqa E501
+    assert report["time_range"] == pytest.approx((0, 5.99))
+    assert read_saved_data(parquet_file).equals(chunks_dataframe(chunks, schema))  # noqa E501
+    assert not os.path.isdir(parts_path(parquet_file))
+    assert not os.path.exists(staging_path(parquet_file))
+
+    report = recover_data(parquet_file)
+    assert report["status"] == "complete" and report["rows"] == 600
+
+
+def test_recover_cli(tmp_path, capsys):
+    parquet_file = str(tmp_path / "Exp1.parquet")
+    json_path = str(tmp_path / "Exp1.json")
+    with open(json_path, "w") as f:
+        json.dump({"Test Name": parquet_file, "Config File": "config.csv"}, f)  # noqa E501
+    chunks = make_chunks(2)
+    writer = StreamingParquetWriter(parquet_file, schema)
+    writer.write(chunks_dataframe(chunks, schema))
+    device_df = pl.DataFrame({"AbsoluteTime": [datetime.now()], "Time": [0.5], "mass_flow": [1.0]})  # noqa E501
+    device_writer = StreamingParquetWriter(device_data_path(parquet_file, "MFC1"), device_df.schema)  # noqa E501
+    device_writer.write(device_df)
+
+    reports = recover_test(json_path)
+    assert [report["file"] for report in reports] == [parquet_file, device_data_path(parquet_file, "MFC1")]  # noqa E501
+    assert [report["rows"] for report in reports] == [200, 1]
+
+    assert main([str(tmp_path), "--clean"]) == 0
+    assert "Complete: " + parquet_file in capsys.readouterr().out
+    with open(parquet_file, "wb") as f:
+        f.write(b"truncated")
+    assert main([str(tmp_path)]) == 1
@@ -0,0 +1,32 @@
+from firepydaq.utilities.RingBuffer import RingBuffer
+import numpy as np
+import pytest
+
+
+def test_ringbuffer_wraps():
+    buffer = RingBuffer(3, 10)
+    all_data = np.arange(3*37, dtype=np.float64).reshape(3, 37)
+    for start in range(0, 37, 4):
+        buffer.append(all_data[:, start:start+4])
+        n = min(start+4, 37)
+        expected = all_data[:, max(0, n-10):n]
+        assert np.array_equal(buffer.window(), expected), "Wrong window"
+        assert np.array_equal(buffer.last(), all_data[:, n-1])
+    assert buffer.size == 10
+    assert buffer.total_samples == 37
+    assert np.array_equal(buffer.channel(1, 3), all_data[1, -3:])
+
+
+def test_ringbuffer_zero_copy():
+    buffer = RingBuffer(2, 5)
+    buffer.append(np.ones((2, 3)))
+    assert np.shares_memory(buffer.window(), buffer._data)
+
+
+def test_ringbuffer_large_chunk_and_single_channel():
+    buffer = RingBuffer(1, 4)
+    buffer.append(np.arange(10))
+    assert np.array_equal(buffer.channel(0), [6, 7, 8, 9])
+    buffer.reset()
+    with pytest.raises(IndexError):
+        buffer.last()
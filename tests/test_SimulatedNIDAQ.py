@@ -0,0 +1,64 @@
+from firepydaq.api.EchoNIDAQTask import CreateDAQTask
+from firepydaq.api.SimulatedNIDAQ import SimulatedTask, SimulatedDAQError
+from functools import partial
+import numpy as np
+import pytest
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.
+
+    def __call__(self):
+        return self.t
+
+
+def make_task(clock, rate=100, samples=10):
+    daq = CreateDAQTask(None, "Sim", partial(SimulatedTask, clock=clock))
+    daq.CreateFromConfig(pytest.configpath)
+    daq.StartAIContinuousTask(rate, samples)
+    return daq
+
+
+def test_simulated_task():
+    clock = FakeClock()
+    daq = make_task(clock)
+    n_channels = daq.ai_counter
+    assert daq.aitask.number_of_channels == n_channels
+    assert daq.GetActualSamplingRate() == 100
+    assert daq.aitask._in_stream.avail_samp_per_chan == 0
+
+    clock.t = 0.25
+    assert daq.aitask._in_stream.avail_samp_per_chan == 25
+    data = np.array(daq.threadaitask())
+    assert data.shape == (n_channels, 10)
+    assert daq.aitask._in_stream.avail_samp_per_chan == 15
+    assert daq.aitask.in_stream.total_samp_per_chan_acquired == 25
+
+    # Waveforms are deterministic
+    data_next = np.array(daq.threadaitask())
+    assert np.array_equal(data_next, daq.aitask.waveforms(10, 10))
+    assert not np.array_equal(data_next, data)
+
+
+def test_simulated_overflow():
+    clock = FakeClock()
+    daq = make_task(clock)
+    clock.t = daq.aitask.buffer_size/100 + 1
+    with pytest.raises(SimulatedDAQError):
+        daq.threadaitask()
+
+
+def test_read_in_buffer():
+    clock = FakeClock()
+    daq = make_task(clock)
+    clock.t = 0.25
+    data = daq.threadaitask()
+    assert data is daq.ai_buffer
+    assert data.dtype == np.float64
+    assert np.array_equal(data, daq.aitask.waveforms(0, 10))
+    # Next read is done in the same array
+    assert daq.threadaitask() is data
+    assert np.array_equal(data, daq.aitask.waveforms(10, 10))
+    with pytest.raises(SimulatedDAQError):
+        daq.ai_reader.read_many_sample(np.zeros((1, 10)), 10)
@@ -0,0 +1,44 @@
+from firepydaq.utilities.StageTimer import LatencyHistogram, StageTimer
+import numpy as np
+import time
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) is None
+    durations = np.random.default_rng(0).lognormal(np.log(1e-3), 1, 10000)
+    for d in durations:
+        histogram.record(d)
+    assert histogram.count == 10000
+    assert histogram.max == durations.max()
+    # Percentiles are accurate to the bin width
+    for q in [50, 90, 99]:
+        exact = np.percentile(durations, q)
+        assert exact <= histogram.percentile(q) <= exact*10**(1/20)*1.001
+    assert histogram.percentile(100) == durations.max()
+
+    # Fixed size, out of range durations are kept
+    n_bins = len(histogram.counts)
+    histogram.record(1e-9)
+    histogram.record(1000)
+    assert len(histogram.counts) == n_bins
+    assert histogram.percentile(100) == 1000
+    histogram.reset()
+    assert histogram.count == 0 and sum(histogram.counts) == 0
+
+
+def test_stage_timer():
+    timer = StageTimer(["Read", "Plot"])
+    with timer.time("Plot"):
+        time.sleep(0.01)
+    timer.record("Save", 0.5)
+    timer.set_gauge("Samples backlog", 10)
+    summary = timer.summary()
+    assert list(summary) == ["Read", "Plot", "Save"]
+    assert summary["Read"]["count"] == 0
+    assert summary["Plot"]["count"] == 1
+    assert 0.01 <= summary["Plot"]["max"] < 1
+    assert summary["Save"]["p50"] == 0.5
+    assert timer.gauges["Samples backlog"] == 10
+    timer.reset()
+    assert timer.summary()["Save"]["count"] == 0 and timer.gauges == {}
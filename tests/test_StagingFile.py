@@ -0,0 +1,76 @@
+from firepydaq.utilities.StagingFile import (StagingWriter, StagingReader,
+                                             staging_path)
+from firepydaq.utilities.DataWriter import (absolute_timestamps,
+                                            chunks_dataframe)
+from datetime import datetime
+import numpy as np
+import polars as pl
+import pytest
+
+columns = ["AbsoluteTime", "Time", "AI1", "AI2", "AI3"]
+
+
+def make_chunks(n_chunks, n_samples=100):
+    t_start = datetime.now()
+    chunks = []
+    for i in range(n_chunks):
+        times = (np.arange(n_samples) + i*n_samples)/1000
+        chunks.append({"Time": times,
+                       "AbsoluteTime": absolute_timestamps(t_start, times),
+                       "Data": np.random.rand(3, n_samples)})
+    return chunks
+
+
+def test_staging_roundtrip(tmp_path):
+    path = staging_path(str(tmp_path / "Exp1.parquet"))
+    assert path.endswith("Exp1.staging")
+    chunks = make_chunks(30)
+    # Small preallocation, so that the file is grown while writing
+    writer = StagingWriter(path, columns, prealloc_bytes=10000)
+    reader = StagingReader(path)
+    for chunk in chunks[:10]:
+        writer.append(chunk)
+    assert not reader.read_chunks(0)
+    staged = reader.read_chunks()
+    assert len(staged) == 10 and not reader.has_new()
+    for chunk in chunks[10:]:
+        writer.append(chunk)
+    assert reader.has_new()
+    staged += reader.read_chunks(5)
+    staged += reader.read_chunks()
+    writer.close()
+    assert reader.read_chunks() == []
+    reader.close()
+    assert writer.rows_written == 3000 and len(staged) == 30
+
+    schema = {col: pl.Float32 for col in columns}
+    schema["AbsoluteTime"] = pl.Datetime("ns")
+    assert chunks_dataframe(staged, schema).equals(chunks_dataframe(chunks, schema))  # noqa E501
+    with StagingReader(path) as reader:
+        assert reader.columns == columns and reader.dt_format is None
+        assert np.array_equal(reader.read_chunks()[-1]["Time"], chunks[-1]["Time"])  # noqa E501
+
+
+def test_staging_crash(tmp_path):
+    path = str(tmp_path / "Exp1.staging")
+    chunks = make_chunks(5)
+    writer = StagingWriter(path, columns, dt_format="%H:%M:%S")
+    for chunk in chunks:
+        writer.append(chunk)
+    writer.flush()
+    # Not closed, as after a crash: the rest of the file is preallocated
+    with StagingReader(path) as reader:
+        assert len(reader.read_chunks()) == 5
+        assert reader.dt_format == "%H:%M:%S"
+    # Power cut while the last chunk was written
+    with open(path, "rb") as f:
+        content = f.read(writer.size - 100)
+    with open(path, "wb") as f:
+        f.write(content)
+    with StagingReader(path) as reader:
+        assert len(reader.read_chunks()) == 4
+
+    with open(str(tmp_path / "not_staging.staging"), "wb") as f:
+        f.write(b"PAR1")
+    with pytest.raises(ValueError):
+        StagingReader(str(tmp_path / "not_staging.staging"))